@@ -0,0 +1,37 @@
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+def alert_group(hospital_id):
+    # Each stream connection joins its user's hospital group, whichever process serves it.
+    return f'alerts.{hospital_id if hospital_id is not None else "none"}'
+
+
+def publish_alerts(events):
+    """Fan ``(hospital_id, event)`` pairs out to that hospital's stream connections.
+
+    Safe to call from any synchronous code, including Celery workers, so alerts
+    raised by the expiry sweep or low-stock recompute reach live clients too.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for hospital_id, event in events:
+        async_to_sync(layer.group_send)(alert_group(hospital_id), {'type': 'alert.event', 'event': event})
+
+
+def serialize_alert(alert, item_name=None):
+    return {
+        'id': alert.pk,
+        'type': alert.type,
+        'itemName': item_name if item_name is not None else (alert.related_item.name if alert.related_item_id else ''),
+        'message': alert.message,
+        'severity': alert.severity,
+        'timestamp': alert.created_at.isoformat(),
+    }
+
+
+def format_event(event, name=None):
+    prefix = f'event: {name}\n' if name else f"id: {event['id']}\n"
+    return f'{prefix}data: {json.dumps(event)}\n\n'
@@ -0,0 +1,105 @@
+import asyncio
+from urllib.parse import parse_qs
+
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from django.conf import settings
+
+from .broadcast import alert_group, format_event
+from .services import alerts_since
+
+
+class AlertStreamConsumer(AsyncConsumer):
+    """Server-sent event stream of alerts.
+
+    Runs as a plain ASGI consumer rather than a Django view so it skips the
+    sync middleware stack and sees ``http.disconnect`` while streaming. Alerts
+    arrive through the channel layer, so ones raised in another worker or in
+    Celery reach this connection as well. Only signed-in users are served,
+    and only their hospital's alerts.
+    """
+    heartbeat_seconds = 15
+    retry_ms = 3000
+    queue_size = 256
+    replay_limit = 500
+
+    async def http_request(self, message):
+        if message.get('more_body'):
+            return
+        self.group = None
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.send({'type': 'http.response.start', 'status': 401, 'headers': self.response_headers(b'text/plain')})
+            await self.send_chunk('Authentication required', more_body=False)
+            return
+        self.hospital_id = user.hospital_id
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.dropped = False
+        # Join before replaying so nothing raised in between is missed.
+        self.group = alert_group(self.hospital_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        self.pump = asyncio.create_task(self.stream(self.last_event_id()))
+
+    async def http_disconnect(self, message):
+        if getattr(self, 'group', None):
+            self.pump.cancel()
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+        raise StopConsumer()
+
+    async def alert_event(self, message):
+        # A connection that has fallen this far behind is ended rather than allowed to buffer without bound.
+        try:
+            self.queue.put_nowait(message['event'])
+        except asyncio.QueueFull:
+            self.dropped = True
+
+    def last_event_id(self):
+        headers = dict(self.scope.get('headers', []))
+        value = headers.get(b'last-event-id', b'').decode('latin1')
+        if not value:
+            value = parse_qs(self.scope.get('query_string', b'').decode()).get('last_event_id', [''])[0]
+        return int(value) if value.isdigit() else 0
+
+    def response_headers(self, content_type=b'text/event-stream'):
+        headers = [
+            (b'content-type', content_type),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]
+        # This bypasses Django's middleware, so CorsMiddleware never sees it.
+        if getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+            headers.append((b'access-control-allow-origin', b'*'))
+        return headers
+
+    async def send_chunk(self, text, more_body=True):
+        await self.send({'type': 'http.response.body', 'body': text.encode(), 'more_body': more_body})
+
+    async def stream(self, last_id):
+        await self.send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': self.response_headers(),
+        })
+        await self.send_chunk(f'retry: {self.retry_ms}\n\n')
+        if last_id:
+            events, truncated = await database_sync_to_async(alerts_since)(last_id, self.replay_limit, self.hospital_id)
+            for event in events:
+                last_id = event['id']
+                await self.send_chunk(format_event(event))
+            if truncated:
+                # Alerts past the replay limit are not sent; tell the client its list has a gap.
+                await self.send_chunk(format_event({'lastId': last_id, 'limit': self.replay_limit}, 'truncated'))
+
+        while not self.dropped:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout=self.heartbeat_seconds)
+            except asyncio.TimeoutError:
+                await self.send_chunk(': heartbeat\n\n')
+                continue
+            if event['id'] > last_id:
+                last_id = event['id']
+                await self.send_chunk(format_event(event))
+
+        # Dropped for falling behind: end the response so the client reconnects and resumes.
+        await self.send_chunk('', more_body=False)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services import sweep_expiry
+
+
+class Command(BaseCommand):
+    help = 'Update expiry buckets, write off newly expired stock and raise expiry alerts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--no-write-off', action='store_true', help='Only reclassify and alert; leave quantities alone.')
+
+    def handle(self, chunk_size, no_write_off, **options):
+        stats = sweep_expiry(chunk_size=chunk_size, write_off=not no_write_off)
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in sorted(stats.items())))
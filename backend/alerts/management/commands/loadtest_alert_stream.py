@@ -0,0 +1,77 @@
+import asyncio
+import resource
+import time
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold many concurrent SSE connections open against a running server, e.g. '
+        '`uvicorn core.asgi:application --workers 1`, and report connect latency and events received.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/alerts/stream/')
+        parser.add_argument('--user', required=True, help='Username whose hospital the connections stream.')
+        parser.add_argument('--connections', type=int, default=5000)
+        parser.add_argument('--duration', type=float, default=30.0)
+        parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which to open the connections.')
+
+    def handle(self, url, user, connections, duration, ramp, **options):
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < connections + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, connections + 100), hard))
+        token = str(AccessToken.for_user(User.objects.get(username=user)))
+        stats = asyncio.run(self.run(urlsplit(url), token, connections, duration, ramp))
+
+        connected = sorted(stats['connect'])
+        self.stdout.write(f"connected: {len(connected)}/{connections}, errors: {stats['errors']}")
+        if connected:
+            self.stdout.write(
+                f'time to headers: p50={connected[len(connected) // 2] * 1000:.1f} ms '
+                f'p99={connected[int(len(connected) * 0.99)] * 1000:.1f} ms'
+            )
+        self.stdout.write(f"events: {stats['events']}, heartbeats: {stats['heartbeats']}, still open at end: {stats['open']}")
+
+    async def run(self, url, token, connections, duration, ramp):
+        stats = {'connect': [], 'errors': 0, 'events': 0, 'heartbeats': 0, 'open': 0}
+        deadline = time.monotonic() + ramp + duration
+        host, port = url.hostname, url.port or 80
+        request = (
+            f'GET {url.path or "/"}?{urlencode({"token": token})} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+            'Accept: text/event-stream\r\nCache-Control: no-cache\r\n\r\n'
+        ).encode()
+
+        async def client(delay):
+            await asyncio.sleep(delay)
+            started = time.monotonic()
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                writer.write(request)
+                await reader.readuntil(b'\r\n\r\n')
+                stats['connect'].append(time.monotonic() - started)
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stats['open'] += 1
+                        break
+                    line = await asyncio.wait_for(reader.readline(), timeout=remaining)
+                    if not line:
+                        break
+                    if line.startswith(b'id:'):
+                        stats['events'] += 1
+                    elif line.startswith(b': heartbeat'):
+                        stats['heartbeats'] += 1
+                writer.close()
+            except asyncio.TimeoutError:
+                stats['open'] += 1
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                stats['errors'] += 1
+
+        await asyncio.gather(*(client(ramp * i / connections) for i in range(connections)))
+        return stats
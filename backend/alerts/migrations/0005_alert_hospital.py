@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def adopt_sole_hospital(apps, schema_editor):
+    # Existing rows predate tenancy. With one hospital they are its rows; with several they
+    # stay unattached until assigned in the admin.
+    hospitals = list(apps.get_model('users', 'Hospital').objects.values_list('pk', flat=True)[:2])
+    if len(hospitals) == 1:
+        apps.get_model('alerts', 'Alert').objects.update(hospital_id=hospitals[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_hospital'),
+        ('alerts', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_type_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_unread_idx',
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='alerts', to='users.hospital'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['hospital', 'type', '-created_at'], name='alert_tenant_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['hospital', '-created_at'], name='alert_tenant_unread_idx'),
+        ),
+        migrations.RunPython(adopt_sole_hospital, migrations.RunPython.noop),
+    ]
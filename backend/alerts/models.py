@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from core.tenancy import hospital_field
 from inventory.models import InventoryItem
 
 class Alert(models.Model):
@@ -15,6 +16,7 @@ class Alert(models.Model):
         ('high', 'High'),
         ('critical', 'Critical'),
     ]
+    hospital = hospital_field('alerts')
     type = models.CharField(max_length=50, choices=TYPE_CHOICES)
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='medium')
     message = models.TextField()
@@ -24,5 +26,11 @@ class Alert(models.Model):
     resolved_at = models.DateTimeField(null=True, blank=True)
     resolved_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'type', '-created_at'], name='alert_tenant_type_created_idx'),
+            models.Index(fields=['hospital', '-created_at'], condition=models.Q(is_read=False), name='alert_tenant_unread_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type} - {self.severity}: {self.message[:50]}"
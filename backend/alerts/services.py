@@ -0,0 +1,43 @@
+from collections import Counter
+
+from django.db import transaction
+
+from core import metrics
+from core.tenancy import for_tenant
+
+from .broadcast import publish_alerts, serialize_alert
+from .models import Alert
+
+
+def raise_alerts(alerts, item_names):
+    """Insert alerts in one query and push them to live subscribers after commit."""
+    created = Alert.objects.bulk_create(alerts)
+    events = [(alert.hospital_id, serialize_alert(alert, item_names.get(alert.related_item_id, ''))) for alert in created]
+    if events:
+        transaction.on_commit(lambda: publish_alerts(events))
+        transaction.on_commit(lambda: count_alerts([(alert.hospital_id, alert.type) for alert in created]))
+    return created
+
+
+def count_alerts(alerts):
+    """Count ``(hospital_id, type)`` alerts per hospital and type, e.g. ``expiry_alerts``, towards the live metrics."""
+    for (hospital_id, alert_type), count in Counter(alerts).items():
+        metrics.record(f'{alert_type}_alerts', count, hospital_id=hospital_id)
+
+
+def expiry_alert(item_id, name, expiry_date, today, hospital_id=None):
+    remaining = (expiry_date - today).days
+    if remaining < 0:
+        severity, message = 'critical', f'{name} expired on {expiry_date:%Y-%m-%d}'
+    else:
+        severity = 'high' if remaining <= 7 else 'medium'
+        message = f'{name} expires in {remaining} days ({expiry_date:%Y-%m-%d})'
+    return Alert(type='expiry', severity=severity, message=message, related_item_id=item_id, hospital_id=hospital_id)
+
+
+def alerts_since(last_id, limit=500, hospital_id=None):
+    """``hospital_id``'s alerts after ``last_id``, oldest first, and whether more than ``limit`` were waiting."""
+    alerts = list(
+        for_tenant(Alert.objects, hospital_id).filter(pk__gt=last_id).select_related('related_item').order_by('pk')[:limit + 1]
+    )
+    return [serialize_alert(alert) for alert in alerts[:limit]], len(alerts) > limit
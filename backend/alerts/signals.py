@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from inventory.models import EXPIRY_WARNING_DAYS, InventoryItem
+from inventory.signals import expiry_swept, stock_threshold_crossed
+from .broadcast import publish_alerts, serialize_alert
+from .models import Alert
+from .services import count_alerts, expiry_alert, raise_alerts
+
+
+@receiver(stock_threshold_crossed)
+def raise_low_stock_alerts(sender, crossings, **kwargs):
+    dropped = {c.item_id: c for c in crossings if c.below}
+    recovered = [c.item_id for c in crossings if not c.below]
+
+    if recovered:
+        Alert.objects.filter(type='low_stock', related_item_id__in=recovered, resolved_at__isnull=True).update(
+            resolved_at=timezone.now()
+        )
+
+    if dropped:
+        already_open = set(
+            Alert.objects.filter(type='low_stock', related_item_id__in=dropped, resolved_at__isnull=True)
+            .values_list('related_item_id', flat=True)
+        )
+        items = InventoryItem.objects.filter(pk__in=dropped.keys() - already_open).values_list('pk', 'name', 'hospital_id')
+        names, hospitals = {}, {}
+        for pk, name, hospital_id in items:
+            names[pk], hospitals[pk] = name, hospital_id
+        raise_alerts(
+            [
+                Alert(
+                    type='low_stock',
+                    severity='critical' if dropped[pk].quantity <= 0 else 'high',
+                    message=f'{name} is below minimum stock ({dropped[pk].quantity} left, minimum {dropped[pk].minimum_stock})',
+                    related_item_id=pk,
+                    hospital_id=hospitals[pk],
+                )
+                for pk, name in names.items()
+            ],
+            names,
+        )
+
+
+@receiver(expiry_swept)
+def raise_expiry_alerts(sender, items, today, **kwargs):
+    """Raise one expiry alert each time an item enters a bucket.
+
+    An item has been alerted for its bucket if any expiry alert, resolved or
+    not, was raised since the bucket began, so a resolved alert is not raised
+    again the next night. Entering a new bucket resolves alerts left open from
+    the previous one, which escalates an expiring item to critical once it has
+    actually expired.
+    """
+    if not items:
+        return
+    entered = {i.item_id: bucket_start(i.status, i.expiry_date) for i in items}
+    alerted = set()
+    open_alerts = set()
+    for item_id, created_at, resolved_at in Alert.objects.filter(
+        Q(created_at__date__gte=min(entered.values())) | Q(resolved_at__isnull=True),
+        type='expiry', related_item_id__in=entered,
+    ).values_list('related_item_id', 'created_at', 'resolved_at'):
+        if timezone.localdate(created_at) >= entered[item_id]:
+            alerted.add(item_id)
+        elif resolved_at is None:
+            open_alerts.add(item_id)
+
+    due = [i for i in items if i.item_id not in alerted]
+    superseded = [i.item_id for i in due if i.item_id in open_alerts]
+    if superseded:
+        Alert.objects.filter(type='expiry', related_item_id__in=superseded, resolved_at__isnull=True).update(resolved_at=timezone.now())
+    raise_alerts(
+        [expiry_alert(i.item_id, i.name, i.expiry_date, today, i.hospital_id) for i in due],
+        {i.item_id: i.name for i in due},
+    )
+
+
+def bucket_start(status, expiry_date):
+    """The first day an item with ``expiry_date`` belonged to the ``status`` bucket."""
+    if status == 'expired':
+        return expiry_date + timedelta(days=1)
+    return expiry_date - timedelta(days=EXPIRY_WARNING_DAYS)
+
+
+@receiver(post_save, sender=Alert)
+def publish_saved_alert(sender, instance, created, **kwargs):
+    # bulk_create skips post_save; raise_alerts publishes those itself.
+    if created:
+        event = serialize_alert(instance)
+        transaction.on_commit(lambda: publish_alerts([(instance.hospital_id, event)]))
+        transaction.on_commit(lambda: count_alerts([(instance.hospital_id, instance.type)]))
@@ -1,3 +1,177 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import AnonymousUser
 from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import InventoryItem, StockTransaction
+from inventory.services import adjust_stock, bulk_adjust_stock, sweep_expiry
+from users.models import Hospital, User
+from .broadcast import alert_group, publish_alerts
+from .consumers import AlertStreamConsumer
+from .models import Alert
+
+
+class LowStockAlertTests(TestCase):
+    def setUp(self):
+        self.item = InventoryItem.objects.create(
+            name='Insulin', sku='INS-001', category='medicine', unit='vial', quantity=12, minimum_stock=10
+        )
+
+    def test_crossing_below_raises_one_alert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(self.item.pk, -5)
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(self.item.pk, -1)
+
+        alert = Alert.objects.get()
+        self.assertEqual((alert.type, alert.severity, alert.related_item_id), ('low_stock', 'high', self.item.pk))
+        self.assertIn('Insulin', alert.message)
+
+    def test_alerts_belong_to_the_items_hospital(self):
+        hospital = Hospital.objects.create(name='St. Mary')
+        InventoryItem.objects.filter(pk=self.item.pk).update(hospital=hospital, expiry_date=timezone.localdate() - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(self.item.pk, -5)
+        with self.captureOnCommitCallbacks(execute=True):
+            sweep_expiry()
+        self.assertEqual(sorted(Alert.objects.values_list('type', 'hospital')), [('expiry', hospital.pk), ('low_stock', hospital.pk)])
+
+    def test_recovery_resolves_alert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_adjust_stock([{'item': self.item.pk, 'quantity_change': -12}])
+        self.assertEqual(Alert.objects.get().severity, 'critical')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(self.item.pk, 20, transaction_type='restock')
+        self.assertIsNotNone(Alert.objects.get().resolved_at)
+
+
+class AlertStreamTests(TestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name='St. Mary')
+        self.user = User.objects.create_user(username='nurse', password='pw', hospital=self.hospital)
+
+    async def read_event(self, communicator):
+        while True:
+            message = await communicator.receive_output(timeout=2)
+            body = message.get('body', b'').decode()
+            if body.startswith(('id:', 'event:')):
+                return json.loads(body.split('data: ', 1)[1])
+
+    def connect(self, last_event_id, replay_limit=AlertStreamConsumer.replay_limit, user=None):
+        consumer = AlertStreamConsumer()
+        consumer.replay_limit = replay_limit
+        return ApplicationCommunicator(consumer, {
+            'type': 'http', 'method': 'GET', 'path': '/api/alerts/stream/', 'query_string': b'',
+            'headers': [(b'last-event-id', str(last_event_id).encode())],
+            'user': user or self.user,
+        })
+
+    async def test_resumes_from_last_event_id_then_streams_live(self):
+        item = await InventoryItem.objects.acreate(name='Insulin', sku='INS-001', category='medicine', unit='vial', hospital=self.hospital)
+        first = await Alert.objects.acreate(type='system', message='first', hospital=self.hospital)
+        second = await Alert.objects.acreate(type='expiry', message='second', related_item=item, hospital=self.hospital)
+
+        communicator = self.connect(first.pk)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(timeout=2)
+        self.assertEqual(dict(start['headers'])[b'content-type'], b'text/event-stream')
+
+        replayed = await self.read_event(communicator)
+        self.assertEqual((replayed['id'], replayed['itemName']), (second.pk, 'Insulin'))
+
+        # Published the way a Celery task would: synchronously, through the channel layer.
+        await sync_to_async(publish_alerts)([(self.hospital.pk, {'id': second.pk + 1, 'message': 'live'})])
+        self.assertEqual((await self.read_event(communicator))['message'], 'live')
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=2)
+        self.assertFalse(get_channel_layer().groups.get(alert_group(self.hospital.pk)))
+
+    async def test_tells_the_client_when_replay_is_truncated(self):
+        first = await Alert.objects.acreate(type='system', message='first', hospital=self.hospital)
+        for message in ('second', 'third'):
+            await Alert.objects.acreate(type='system', message=message, hospital=self.hospital)
+
+        communicator = self.connect(first.pk, replay_limit=1)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await self.read_event(communicator))['message'], 'second')
+        self.assertEqual(await self.read_event(communicator), {'lastId': first.pk + 1, 'limit': 1})
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=2)
+
+    async def test_anonymous_streams_are_refused(self):
+        communicator = self.connect(0, user=AnonymousUser())
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await communicator.receive_output(timeout=2))['status'], 401)
+        self.assertFalse((await communicator.receive_output(timeout=2))['more_body'])
+
+    async def test_streams_only_the_users_hospital(self):
+        general = await Hospital.objects.acreate(name='General')
+        first = await Alert.objects.acreate(type='system', message='first', hospital=self.hospital)
+        await Alert.objects.acreate(type='system', message='theirs', hospital=general)
+        await Alert.objects.acreate(type='system', message='ours', hospital=self.hospital)
+
+        communicator = self.connect(first.pk)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await self.read_event(communicator))['message'], 'ours')
+
+        await sync_to_async(publish_alerts)([(general.pk, {'id': 10**6, 'message': 'theirs live'}), (self.hospital.pk, {'id': 10**6 + 1, 'message': 'ours live'})])
+        self.assertEqual((await self.read_event(communicator))['message'], 'ours live')
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=2)
+
+
+class ExpiryAlertTests(TestCase):
+    def sweep(self, today=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return sweep_expiry(today=today)
+
+    def test_raises_once_per_item(self):
+        today = timezone.localdate()
+        InventoryItem.objects.create(name='Amoxicillin', sku='AMX-001', category='medicine', unit='box', expiry_date=today - timedelta(days=1))
+        InventoryItem.objects.create(name='Saline', sku='SAL-001', category='consumable', unit='bag', expiry_date=today + timedelta(days=5))
+        InventoryItem.objects.create(name='Gauze', sku='GAU-001', category='consumable', unit='box', expiry_date=today + timedelta(days=90))
+
+        self.sweep()
+        self.sweep()
+        self.assertEqual(
+            sorted(Alert.objects.values_list('severity', flat=True)), ['critical', 'high'],
+        )
+
+    def test_expiry_writes_off_stock_and_escalates(self):
+        today = timezone.localdate()
+        item = InventoryItem.objects.create(name='Insulin', sku='INS-001', category='medicine', unit='vial', quantity=5, expiry_date=today + timedelta(days=1))
+        self.sweep()
+        self.assertEqual(list(Alert.objects.values_list('severity', flat=True)), ['high'])
+
+        stats = self.sweep(today=today + timedelta(days=2))
+        self.assertEqual((stats['expired'], stats['written_off']), (1, 1))
+        item.refresh_from_db()
+        self.assertEqual((item.quantity, item.expiry_status), (0, 'expired'))
+        self.assertEqual(StockTransaction.objects.get().transaction_type, 'expired')
+        self.assertEqual(
+            list(Alert.objects.filter(resolved_at__isnull=True).values_list('severity', flat=True)), ['critical'],
+        )
+
+    def test_resolved_alert_is_not_raised_again(self):
+        today = timezone.localdate()
+        InventoryItem.objects.create(name='Amoxicillin', sku='AMX-001', category='medicine', unit='box', expiry_date=today - timedelta(days=1))
+        self.sweep()
+        Alert.objects.update(resolved_at=timezone.now())
+
+        self.sweep()
+        self.assertEqual(Alert.objects.count(), 1)
 
-# Create your tests here.
+    def test_long_expired_items_are_not_rescanned(self):
+        today = timezone.localdate()
+        InventoryItem.objects.create(name='Amoxicillin', sku='AMX-001', category='medicine', unit='box', expiry_date=today - timedelta(days=40))
+        InventoryItem.objects.create(name='Saline', sku='SAL-001', category='consumable', unit='bag', expiry_date=today - timedelta(days=2))
+        self.assertEqual(self.sweep()['scanned'], 1)
@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from inventory.views import InventoryItemViewSet, SupplierViewSet, StockTransactionViewSet
+from inventory.views import InventoryItemViewSet, SupplierViewSet, StockTransactionViewSet, warehouses_live
 from orders.views import PurchaseOrderViewSet
 from users.views import RegisterView, UserProfileView, StaffListView
+from reports.views import ai_query, consumption_report, inventory_summary, stock_forecast, supplier_spend_report, valuation_report
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -14,7 +15,7 @@ router.register(r'suppliers', SupplierViewSet)
 router.register(r'transactions', StockTransactionViewSet)
 router.register(r'orders', PurchaseOrderViewSet)
 
-from .views import alert_stream, warehouses_live, ai_query, stock_forecast, metrics_live
+from .views import metrics_live, cache_stats, job_stats
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -23,9 +24,14 @@ urlpatterns = [
     path('staff-list/', StaffListView.as_view(), name='staff-list'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('alerts/stream/', alert_stream, name='alerts-stream'),
     path('warehouses/live/', warehouses_live, name='warehouses-live'),
     path('ai/query/', ai_query, name='ai-query'),
     path('predictions/stock-forecast/', stock_forecast, name='stock-forecast'),
     path('metrics/live/', metrics_live, name='metrics-live'),
+    path('cache/stats/', cache_stats, name='cache-stats'),
+    path('jobs/stats/', job_stats, name='job-stats'),
+    path('reports/inventory-summary/', inventory_summary, name='inventory-summary'),
+    path('reports/consumption/', consumption_report, name='consumption-report'),
+    path('reports/valuation/', valuation_report, name='valuation-report'),
+    path('reports/supplier-spend/', supplier_spend_report, name='supplier-spend-report'),
 ]
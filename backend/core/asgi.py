@@ -1,15 +1,22 @@
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from django.urls import path
-from .consumers import InventoryConsumer
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from django.urls import path, re_path
+from alerts.consumers import AlertStreamConsumer
+from .consumers import InventoryConsumer
+from .socket_auth import TokenAuthMiddlewareStack
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": URLRouter([
+        # EventSource cannot set headers either, so the stream takes ``?token=`` like the sockets.
+        path("api/alerts/stream/", TokenAuthMiddlewareStack(AlertStreamConsumer.as_asgi())),
+        re_path(r"", django_asgi_app),
+    ]),
+    "websocket": TokenAuthMiddlewareStack(
         URLRouter([
             path("ws/live/", InventoryConsumer.as_asgi()),
         ])
@@ -0,0 +1,76 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+class BenchmarkCommand(BaseCommand):
+    """Base class for benchmark commands.
+
+    Benchmarks run against a throwaway test database so they never touch real
+    data. SQLite gets a file-backed database so worker threads can share it.
+    """
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            tmpdir = tempfile.mkdtemp(prefix='bench-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run_benchmark(**options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def run_benchmark(self, **options):
+        raise NotImplementedError
+
+    @contextmanager
+    def timer(self, label, rows=None):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        line = f'{label}: {elapsed * 1000:.1f} ms'
+        if rows:
+            line += f' ({rows / elapsed:,.0f} rows/s)'
+        self.stdout.write(line)
+
+    def report_latencies(self, label, samples):
+        samples = sorted(samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(
+            f'{label}: n={len(samples)} p50={statistics.median(samples) * 1000:.2f} ms '
+            f'p99={p99 * 1000:.2f} ms max={samples[-1] * 1000:.2f} ms'
+        )
+
+    def seed_ledger(self, item_ids, count, first, last, batch=100000):
+        """Insert ``count`` stock transactions spread evenly from ``first`` to ``last`` with raw SQL."""
+        from inventory.models import StockTransaction
+
+        table = connection.ops.quote_name(StockTransaction._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} (inventory_item_id, transaction_type, quantity_change, previous_quantity, '
+            'new_quantity, notes, performed_at) VALUES (%s, %s, %s, 0, 0, NULL, %s)'
+        )
+        step = (last - first) / count
+        kinds = [('consume', -3), ('consume', -1), ('restock', 20), ('adjust', 2), ('consume', -2), ('expired', -1)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            for offset in range(0, count, batch):
+                rows = []
+                for i in range(offset, min(offset + batch, count)):
+                    kind, change = kinds[i % len(kinds)]
+                    at = connection.ops.adapt_datetimefield_value(first + step * i)
+                    rows.append((item_ids[i * 7919 % len(item_ids)], kind, change, at))
+                cursor.executemany(sql, rows)
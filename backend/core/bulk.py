@@ -0,0 +1,144 @@
+from django.db import connection
+from django.db.models import F
+
+
+def update_rows(model, objs, fields):
+    """Write per-row values for ``fields`` with one ``UPDATE ... FROM (VALUES ...)`` per batch.
+
+    ``bulk_update`` builds a CASE expression per field and row, and for
+    thousand-row batches the ORM spends far longer constructing it than the
+    database spends running it. Backends without ``UPDATE ... FROM`` use
+    ``bulk_update``.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        model.objects.bulk_update(objs, fields, batch_size=500)
+        return
+
+    qn = connection.ops.quote_name
+    columns = [model._meta.get_field(name) for name in fields]
+    if connection.vendor == 'postgresql':
+        # VALUES columns are untyped there; NULL-only columns would default to text.
+        refs = [f'CAST(v.column{i} AS {field.db_type(connection)})' for i, field in enumerate(columns, start=2)]
+    else:
+        refs = [f'v.column{i}' for i in range(2, len(columns) + 2)]
+    assignments = ', '.join(f'{qn(field.column)} = {ref}' for field, ref in zip(columns, refs))
+    row = '(' + ', '.join(['%s'] * (len(columns) + 1)) + ')'
+    batch_size = (connection.features.max_query_params or 30000) // (len(columns) + 1)
+
+    objs = list(objs)
+    with connection.cursor() as cursor:
+        # The real connection: every attribute read through the ``connection``
+        # proxy is another thread-local lookup, and values are prepared in bulk.
+        db = cursor.db
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            params = []
+            for obj in batch:
+                params.append(obj.pk)
+                params.extend(field.get_db_prep_save(getattr(obj, field.attname), db) for field in columns)
+            cursor.execute(
+                f'UPDATE {qn(model._meta.db_table)} SET {assignments} '
+                f'FROM (VALUES {", ".join([row] * len(batch))}) AS v WHERE {qn(model._meta.pk.column)} = v.column1',
+                params,
+            )
+
+
+def _conflict_target(model, unique_fields):
+    # A nullable key is matched as COALESCE(column, 0), the form ``core.tenancy.tenant_unique`` indexes it in.
+    qn = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in unique_fields]
+    return ', '.join(f'COALESCE({qn(field.column)}, 0)' if field.null else qn(field.column) for field in fields)
+
+
+def accumulate_rows(model, queryset, unique_fields, add_fields):
+    """Fold the rows selected by ``queryset`` into ``model`` with one ``INSERT ... SELECT``.
+
+    The queryset's ``values()`` names must be field names (or attnames) of
+    ``model``. A row whose ``unique_fields`` already exist adds its
+    ``add_fields`` to the stored totals and overwrites the other fields, so the
+    database does the whole merge without rows coming back to Python.
+    """
+    query = queryset.query
+    names = [*query.values_select, *query.annotation_select]
+    fields = [model._meta.get_field(name) for name in names]
+    unique = {model._meta.get_field(name).column for name in unique_fields}
+    added = {model._meta.get_field(name).column for name in add_fields}
+
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        for row in queryset:
+            values = {field.attname: row[name] for field, name in zip(fields, names)}
+            lookup = {name: values.pop(name) for name in [f.attname for f in fields if f.column in unique]}
+            updated = model.objects.filter(**lookup).update(**{
+                name: F(name) + value if model._meta.get_field(name).column in added else value
+                for name, value in values.items()
+            })
+            if not updated:
+                model.objects.create(**lookup, **values)
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = [field.column for field in fields]
+    assignments = ', '.join(
+        f'{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}' if column in added else f'{qn(column)} = excluded.{qn(column)}'
+        for column in columns if column not in unique
+    )
+    select, params = query.sql_with_params()
+    with connection.cursor() as cursor:
+        # The outer WHERE stops SQLite from reading ON CONFLICT as a join constraint.
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(qn(c) for c in columns)}) SELECT * FROM ({select}) AS source WHERE 1 = 1 '
+            f'ON CONFLICT ({_conflict_target(model, unique_fields)}) DO UPDATE SET {assignments}',
+            params,
+        )
+
+
+def upsert_rows(model, fields, rows, unique_fields, add_fields=()):
+    """Insert ``rows`` of values for ``fields``, overwriting rows whose ``unique_fields`` already exist.
+
+    Values go to the database as they are, so they must already be in a form
+    the driver accepts: numbers, strings, and dates or datetimes adapted with
+    the connection's ``ops``. This skips building and preparing a model
+    instance per row, which is most of the cost of ``bulk_create`` for large
+    batches of plain numbers. ``add_fields`` are added to the stored values
+    instead of overwriting them. Backends without ``ON CONFLICT`` use
+    ``bulk_create(update_conflicts=True)``, or an update per row when adding.
+    """
+    update_fields = [name for name in fields if name not in unique_fields]
+    if connection.vendor not in ('postgresql', 'sqlite') and add_fields:
+        for row in rows:
+            values = dict(zip(fields, row))
+            lookup = {name: values.pop(name) for name in unique_fields}
+            updated = model.objects.filter(**lookup).update(**{
+                name: F(name) + value if name in add_fields else value for name, value in values.items()
+            })
+            if not updated:
+                model.objects.create(**lookup, **values)
+        return
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        model.objects.bulk_create(
+            [model(**dict(zip(fields, row))) for row in rows], batch_size=500,
+            update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields,
+        )
+        return
+
+    qn = connection.ops.quote_name
+    columns = [qn(model._meta.get_field(name).column) for name in fields]
+    conflict = _conflict_target(model, unique_fields)
+    table = qn(model._meta.db_table)
+    assignments = ', '.join(
+        f'{column} = {table}.{column} + excluded.{column}' if name in add_fields else f'{column} = excluded.{column}'
+        for name, column in ((name, qn(model._meta.get_field(name).column)) for name in update_fields)
+    )
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    batch_size = (connection.features.max_query_params or 30000) // len(fields)
+
+    rows = list(rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row] * len(batch))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {assignments}',
+                [value for values in batch for value in values],
+            )
@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .tenancy import tenant_of
+
+GENERATION_PREFIX = 'respcache:gen:'
+ENTRY_PREFIX = 'respcache:entry:'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+def generations(models):
+    """Current generation token for each model, creating missing ones.
+
+    A missing token (never set, or evicted) is recreated from the clock rather
+    than from zero, so entries cached under an earlier token can never match again.
+    """
+    cache = get_cache()
+    keys = [GENERATION_PREFIX + _label(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate(*models):
+    """Expire every cached response that depends on ``models``.
+
+    Bumps now, so the writer's own follow-up reads are fresh, and again on
+    commit, so a response rendered from pre-commit data by a concurrent
+    reader is never served afterwards.
+    """
+    keys = [GENERATION_PREFIX + _label(model) for model in models]
+    _bump(keys)
+    transaction.on_commit(partial(_bump, keys))
+
+
+def _invalidate_sender(sender, **kwargs):
+    invalidate(sender)
+
+
+def invalidate_on_change(*models):
+    """Invalidate cached responses whenever an instance of ``models`` is saved or deleted.
+
+    Writes that bypass signals (``QuerySet.update``, ``bulk_update``, raw SQL)
+    must call ``invalidate`` themselves.
+    """
+    for model in models:
+        uid = f'response-cache:{_label(model)}'
+        post_save.connect(_invalidate_sender, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_sender, sender=model, dispatch_uid=uid)
+
+
+def record(view, outcome):
+    with _stats_lock:
+        _stats[view, outcome] += 1
+
+
+def stats():
+    with _stats_lock:
+        counts = dict(_stats)
+    views = {}
+    for (view, outcome), count in counts.items():
+        views.setdefault(view, {'hit': 0, 'miss': 0, 'not_modified': 0})[outcome] += count
+    totals = {outcome: sum(v[outcome] for v in views.values()) for outcome in ('hit', 'miss', 'not_modified')}
+    served = totals['hit'] + totals['not_modified']
+    lookups = served + totals['miss']
+    return {**totals, 'hit_ratio': round(served / lookups, 4) if lookups else None, 'views': views}
+
+
+def cached_action(method):
+    """Serve an extra viewset action through ``CachedResponseMixin``."""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return self.cached_response(partial(method, self), request, *args, **kwargs)
+    return wrapper
+
+
+class CachedResponseMixin:
+    """Cache rendered GET responses for list/retrieve (and ``cached_action``s).
+
+    Entries are keyed by view, path, query string, renderer, tenant and the
+    generation of every model in ``cache_dependencies``; saving or deleting any
+    of those models bumps its generation, which orphans the old entries. Responses
+    carry an ETag and honour ``If-None-Match`` with a 304, and a request with
+    ``Cache-Control: no-cache`` is rendered afresh.
+    """
+    cache_dependencies = ()
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_scope(self, request):
+        return tenant_of(request.user)
+
+    def get_cache_key(self, request):
+        parts = (
+            type(self).__name__, request.path, sorted(request.query_params.lists()),
+            request.accepted_renderer.format, self.get_cache_scope(request),
+            generations(self.cache_dependencies or [self.queryset.model]),
+        )
+        return ENTRY_PREFIX + hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        entry = None
+        if 'no-cache' not in request.headers.get('Cache-Control', ''):
+            entry = get_cache().get(key)
+        if entry is None:
+            record(type(self).__name__, 'miss')
+            self._response_cache_key = key
+            return handler(request, *args, **kwargs)
+
+        if self._not_modified(request, entry['etag']):
+            record(type(self).__name__, 'not_modified')
+            response = HttpResponseNotModified()
+        else:
+            record(type(self).__name__, 'hit')
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        return self._tag(response, entry['etag'], 'HIT')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if key is None or response.status_code != 200:
+            return response
+
+        response.render()
+        etag = getattr(self, 'response_etag', None) or f'"{hashlib.md5(response.content).hexdigest()}"'
+        timeout = self.cache_timeout if self.cache_timeout is not None else getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+        get_cache().set(key, {'content': response.content, 'content_type': response['Content-Type'], 'etag': etag}, timeout)
+        if self._not_modified(request, etag):
+            response = HttpResponseNotModified()
+        return self._tag(response, etag, 'MISS')
+
+    @staticmethod
+    def _not_modified(request, etag):
+        return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+
+    @staticmethod
+    def _tag(response, etag, outcome):
+        response['ETag'] = etag
+        response['X-Cache'] = outcome
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
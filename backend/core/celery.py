@@ -0,0 +1,67 @@
+import logging
+import os
+import time
+
+from celery import Celery, Task
+from django.db import OperationalError
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+logger = logging.getLogger(__name__)
+
+TIMING_PREFIX = 'jobs:timing:'
+
+
+class TimedTask(Task):
+    """Base task: retries on transient database errors and records how long each run took.
+
+    Timings are kept per task in the default cache (shared between worker and
+    web processes when it is Redis) and read back by ``job_stats``.
+    """
+    autoretry_for = (OperationalError,)
+    retry_backoff = True
+    retry_backoff_max = 300
+    max_retries = 3
+    acks_late = True
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = 'failed'
+        try:
+            result = super().__call__(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            record_timing(self.name, time.perf_counter() - started, outcome)
+
+
+def record_timing(name, seconds, outcome):
+    from django.core.cache import cache
+
+    logger.info('job %s %s in %.1f ms', name, outcome, seconds * 1000)
+    key = TIMING_PREFIX + name
+    stats = cache.get(key) or {'runs': 0, 'failures': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+    ms = seconds * 1000
+    stats.update(
+        runs=stats['runs'] + 1,
+        failures=stats['failures'] + (outcome != 'ok'),
+        total_ms=stats['total_ms'] + ms,
+        max_ms=max(stats['max_ms'], ms),
+        last_ms=ms,
+        last_outcome=outcome,
+        last_finished=time.time(),
+    )
+    cache.set(key, stats, None)
+
+
+def job_stats():
+    from django.core.cache import cache
+
+    names = sorted(name for name in app.tasks if not name.startswith('celery.'))
+    found = cache.get_many([TIMING_PREFIX + name for name in names])
+    return {name: found.get(TIMING_PREFIX + name) for name in names}
+
+
+app = Celery('core', task_cls=TimedTask)
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
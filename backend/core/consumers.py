@@ -1,48 +1,67 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.core.serializers.json import DjangoJSONEncoder
+from inventory.realtime import hospital_group, location_group, warehouse_group
 
 class InventoryConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.room_group_name = "inventory_updates"
+    """Push inventory diffs to clients.
 
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+    Messages only originate on the server (model hooks and the stock ledger).
+    Only signed-in users may connect, and they receive their hospital's rows.
+    Clients may narrow that by subscribing to locations, and opt in to their
+    hospital's warehouse totals; anything else they send is ignored.
+    """
 
+    async def connect(self):
+        self.groups_joined = set()
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.hospital_id = user.hospital_id
+        self.feed = hospital_group(self.hospital_id)
+        await self._join(self.feed)
         await self.accept()
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
 
     # Receive message from WebSocket
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json.get('message')
-        type = text_data_json.get('type')
-
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'inventory_message',
-                'message': message,
-                'msg_type': type
-            }
-        )
-
-    # Receive message from room group
-    async def inventory_message(self, event):
-        message = event['message']
-        msg_type = event['msg_type']
-
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'message': message,
-            'type': msg_type
-        }))
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+
+        action = data.get('action')
+        locations = data.get('locations') or []
+        if action == 'subscribe' and isinstance(locations, list):
+            # Location subscribers receive their locations' rows instead of everything.
+            await self._leave(self.feed)
+            for location in locations[:50]:
+                await self._join(location_group(self.hospital_id, str(location)))
+        elif action == 'unsubscribe':
+            for group in [g for g in self.groups_joined if g.startswith(f'{self.feed}.location.')]:
+                await self._leave(group)
+            await self._join(self.feed)
+        elif action == 'watch_warehouses':
+            await self._join(warehouse_group(self.hospital_id))
+        elif action == 'unwatch_warehouses':
+            await self._leave(warehouse_group(self.hospital_id))
+
+    async def _join(self, group):
+        if group not in self.groups_joined:
+            self.groups_joined.add(group)
+            await self.channel_layer.group_add(group, self.channel_name)
+
+    async def _leave(self, group):
+        if group in self.groups_joined:
+            self.groups_joined.discard(group)
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    # Receive message from group
+    async def inventory_diff(self, event):
+        await self.send(text_data=json.dumps(event['payload'], cls=DjangoJSONEncoder))
@@ -0,0 +1,172 @@
+"""Sliding-window event counts for the live metrics endpoint.
+
+Events are counted in memory in time-bucketed rings: sixty one-second slots
+for the last minute and sixty one-minute slots for the last hour. Each ring
+keeps a running total, so recording an event and reading a window are both
+constant time. With ``METRICS_REDIS_URL`` set, every process also flushes its
+counts to shared Redis buckets once a second from a background thread, and
+reads sum those instead, so all workers report the same totals.
+
+Events are counted per hospital, like the rows they come from, and a read
+only sees its own hospital's counts.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Window name -> (seconds per slot, slots).
+WINDOWS = {'minute': (1, 60), 'hour': (60, 60)}
+REDIS_PREFIX = 'metrics:'
+FLUSH_INTERVAL = 1.0
+
+
+class Ring:
+    """Counts in ``slots`` buckets of ``width`` seconds, with a running total of all of them."""
+    __slots__ = ('width', 'slots', 'counts', 'total', 'head')
+
+    def __init__(self, width, slots):
+        self.width = width
+        self.slots = slots
+        self.counts = [0] * slots
+        self.total = 0
+        self.head = 0
+
+    def advance(self, tick):
+        """Move the newest slot to ``tick``, emptying the slots that fall out of the window."""
+        if tick <= self.head:
+            return
+        if tick - self.head >= self.slots:
+            self.counts = [0] * self.slots
+            self.total = 0
+        else:
+            for expired in range(self.head + 1, tick + 1):
+                index = expired % self.slots
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.head = tick
+
+    def add(self, tick, count):
+        if tick > self.head:
+            self.advance(tick)
+        # A tick from a clock that stepped back counts towards the newest slot.
+        self.counts[min(tick, self.head) % self.slots] += count
+        self.total += count
+
+
+class EventCounter:
+    def __init__(self, redis_url=None):
+        self._rings = {}
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._redis = None
+        self._flusher_pid = None
+        if redis_url:
+            import redis
+
+            self._redis = redis.Redis.from_url(redis_url)
+
+    def record(self, event, count=1, now=None, hospital_id=None):
+        now = time.time() if now is None else now
+        second = int(now)
+        with self._lock:
+            rings = self._rings.get((hospital_id, event))
+            if rings is None:
+                rings = self._rings[hospital_id, event] = [Ring(width, slots) for width, slots in WINDOWS.values()]
+            rings[0].add(second, count)
+            rings[1].add(second // 60, count)
+            if self._redis is not None:
+                if not self._pending:
+                    self._ensure_flusher()
+                self._pending[second, hospital_id, event] += count
+
+    def windows(self, now=None, hospital_id=None):
+        """``{window: {event: count}}`` for every event seen in ``hospital_id``'s tenant, over the last minute and hour."""
+        now = time.time() if now is None else now
+        if self._redis is not None:
+            try:
+                return self._shared_windows(now, hospital_id)
+            except Exception:
+                logger.exception('Reading shared metrics failed; reporting this process only')
+        second = int(now)
+        totals = {name: {} for name in WINDOWS}
+        with self._lock:
+            for (tenant, event), (minute, hour) in self._rings.items():
+                if tenant != hospital_id:
+                    continue
+                minute.advance(second)
+                hour.advance(second // 60)
+                totals['minute'][event] = minute.total
+                totals['hour'][event] = hour.total
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._rings.clear()
+            self._pending.clear()
+
+    def _key(self, hospital_id, window, tick):
+        # One hash per tenant and slot, so a read fetches its own tenant's slots only.
+        return f'{REDIS_PREFIX}{hospital_id if hospital_id is not None else "none"}:{window}:{tick}'
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        keys = set()
+        for (second, hospital_id, event), count in pending.items():
+            for window, (width, slots) in WINDOWS.items():
+                key = self._key(hospital_id, window, second // width)
+                pipe.hincrby(key, event, count)
+                keys.add((key, width * slots * 2))
+        for key, ttl in keys:
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def _ensure_flusher(self):
+        # Started lazily, and again in a forked worker, which does not inherit threads.
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing metrics to Redis failed')
+
+    def _shared_windows(self, now, hospital_id):
+        pipe = self._redis.pipeline(transaction=False)
+        for window, (width, slots) in WINDOWS.items():
+            newest = int(now) // width
+            for tick in range(newest - slots + 1, newest + 1):
+                pipe.hgetall(self._key(hospital_id, window, tick))
+        buckets = iter(pipe.execute())
+        totals = {}
+        for window, (_, slots) in WINDOWS.items():
+            counts = totals[window] = Counter()
+            for _ in range(slots):
+                for event, count in next(buckets).items():
+                    counts[event.decode()] += int(count)
+            totals[window] = dict(counts)
+        return totals
+
+
+counter = EventCounter(getattr(settings, 'METRICS_REDIS_URL', None))
+
+
+def record(event, count=1, hospital_id=None):
+    counter.record(event, count, hospital_id=hospital_id)
+
+
+def windows(hospital_id=None):
+    return counter.windows(hospital_id=hospital_id)
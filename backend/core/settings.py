@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -87,9 +88,123 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 ASGI_APPLICATION = 'core.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+# Channel layer: in-memory by default (single process only). Set CHANNEL_REDIS_URL
+# so several uvicorn workers share groups; CHANNEL_LAYER=redis selects the
+# list-based layer instead of the pub/sub one, which is cheaper for group fan-out.
+CHANNEL_REDIS_URL = os.environ.get('CHANNEL_REDIS_URL') or os.environ.get('REDIS_URL')
+CHANNEL_LAYER = os.environ.get('CHANNEL_LAYER', 'redis-pubsub' if CHANNEL_REDIS_URL else 'memory')
+
+if CHANNEL_LAYER == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': {
+                'redis': 'channels_redis.core.RedisChannelLayer',
+                'redis-pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            }[CHANNEL_LAYER],
+            'CONFIG': {
+                'hosts': [CHANNEL_REDIS_URL or 'redis://localhost:6379/1'],
+            },
+        },
+    }
+
+# Cache: a process-local LRU by default. Set CACHE_REDIS_URL so every worker
+# shares cached responses and sees the same invalidations.
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or os.environ.get('REDIS_URL')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 5000))},
+        },
+    }
+
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+# Live metrics count events per process; set METRICS_REDIS_URL so every worker
+# adds its counts to shared Redis buckets and reports the same totals.
+METRICS_REDIS_URL = os.environ.get('METRICS_REDIS_URL') or os.environ.get('REDIS_URL')
+# Longest an assistant question may spend in the database before it is cut off.
+ASSISTANT_QUERY_TIMEOUT = float(os.environ.get('ASSISTANT_QUERY_TIMEOUT', 2))
+
+# Closed ledger months older than LEDGER_HOT_MONTHS move to column files in
+# LEDGER_COLD_DIR (reports.tasks.archive_ledger); the ledger API reads them transparently.
+# The archive is the only copy of those months: point it at persistent storage
+# shared by the web and worker processes, not at the checkout.
+LEDGER_COLD_DIR = os.environ.get('LEDGER_COLD_DIR', str(BASE_DIR / 'ledger-cold'))
+LEDGER_HOT_MONTHS = int(os.environ.get('LEDGER_HOT_MONTHS', 12))
+
+# Celery: without a broker URL tasks go to an in-process memory broker, and
+# CELERY_TASK_ALWAYS_EAGER=True runs them inline (handy for local development).
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'memory://')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'cache+memory://')
+CELERY_RESULT_EXPIRES = int(os.environ.get('CELERY_RESULT_EXPIRES', 3600))
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60
+CELERY_TIMEZONE = 'UTC'
+# Long sweeps and report builds get their own queue so they never hold up short tasks.
+CELERY_TASK_ROUTES = {
+    'inventory.tasks.*': {'queue': 'maintenance'},
+    'reports.tasks.*': {'queue': 'maintenance'},
+    'orders.tasks.*': {'queue': 'maintenance'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'nightly-expiry-sweep': {
+        # Just after midnight, so expiry buckets roll over with the date.
+        'task': 'inventory.tasks.sweep_expiry',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'recompute-low-stock': {
+        'task': 'inventory.tasks.recompute_low_stock',
+        'schedule': crontab(minute=15),
+    },
+    'rebuild-warehouse-totals': {
+        # The ledger keeps the totals current; this only repairs writes that bypassed it.
+        'task': 'inventory.tasks.rebuild_warehouse_totals',
+        'schedule': crontab(hour=0, minute=45),
+    },
+    'ensure-ledger-partitions': {
+        # Keeps monthly ledger partitions created ahead; a no-op unless the ledger is partitioned.
+        'task': 'inventory.tasks.ensure_ledger_partitions',
+        'schedule': crontab(hour=1, minute=10),
+    },
+    'build-inventory-summary': {
+        'task': 'reports.tasks.build_inventory_summary',
+        'schedule': crontab(minute='*/10'),
+    },
+    'refresh-report-rollups': {
+        'task': 'reports.tasks.refresh_rollups',
+        'schedule': crontab(minute='*/5'),
+    },
+    'archive-cold-ledger': {
+        # Early on the 1st, once the month before the audit window has closed.
+        'task': 'reports.tasks.archive_ledger',
+        'schedule': crontab(day_of_month=1, hour=2, minute=30),
+    },
+    'refresh-forecasts': {
+        # Folds in each day once the rollups hold all of it; otherwise a no-op.
+        'task': 'reports.tasks.refresh_forecasts',
+        'schedule': crontab(minute=20),
+    },
+    'generate-reorders': {
+        # After the overnight forecast fold, ready for the morning's review.
+        'task': 'orders.tasks.generate_reorders',
+        'schedule': crontab(hour=5, minute=30),
     },
 }
 
@@ -0,0 +1,96 @@
+"""Hospital tenancy.
+
+Inventory items, suppliers, purchase orders, stock transactions and alerts
+carry a ``hospital``; users see the rows of their own hospital only. Rows and
+users not attached to any hospital form one more tenant of their own, which
+is what a single-hospital install runs as.
+"""
+from django.db import models
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+
+
+def hospital_field(related_name):
+    """The ``hospital`` key of a tenant-owned model.
+
+    Not indexed on its own: the model's indexes lead with it instead.
+    """
+    return models.ForeignKey(
+        'users.Hospital', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name=related_name,
+    )
+
+
+class TenantKey(Coalesce):
+    """``COALESCE(hospital_id, 0)``: the hospital as a key the unattached tenant also has."""
+    output_field = models.BigIntegerField()
+
+    def __init__(self):
+        super().__init__('hospital', 0)
+
+
+def tenant_unique(*fields, name):
+    """A unique constraint on ``fields`` within each tenant, the unattached tenant included.
+
+    NULLs never conflict, so the hospital is compared as ``TenantKey()``;
+    upserts in ``core.bulk`` name the same expression as their conflict target.
+    """
+    return models.UniqueConstraint(TenantKey(), *fields, name=name)
+
+
+def tenant_of(user):
+    """The hospital id ``user``'s requests are scoped to, ``None`` for the unattached tenant."""
+    return getattr(user, 'hospital_id', None)
+
+
+def for_tenant(queryset, hospital_id, through=None):
+    """Rows of ``hospital_id``'s tenant; ``through`` names the relation that carries the hospital, if not the model."""
+    # ``hospital_id=None`` compiles to IS NULL, so the unattached tenant needs no special case.
+    return queryset.filter(**{f'{through}__hospital_id' if through else 'hospital_id': hospital_id})
+
+
+class TenantScopedMixin:
+    """Limit a viewset to the requesting user's hospital, and stamp that hospital on rows it creates.
+
+    Goes first in the bases so list, detail and watermark lookups all see the
+    scoped queryset. With the indexes led by ``hospital``, a tenant's list
+    costs the same however many tenants share the tables.
+    """
+
+    @property
+    def tenant_id(self):
+        return tenant_of(self.request.user)
+
+    def get_queryset(self):
+        return for_tenant(super().get_queryset(), self.tenant_id)
+
+    def filter_tombstones(self, tombstones):
+        return for_tenant(super().filter_tombstones(tombstones), self.tenant_id)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'tenant_id': self.tenant_id}
+
+    def perform_create(self, serializer):
+        serializer.save(hospital_id=self.tenant_id)
+
+
+class TenantRelatedMixin:
+    """Serializer mixin rejecting related rows, named in ``tenant_related_fields``, of another hospital.
+
+    Reported as DRF reports a missing primary key, so other hospitals' ids are
+    indistinguishable from ids that do not exist.
+    """
+    tenant_related_fields = ()
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if 'tenant_id' not in self.context:
+            return attrs
+        tenant_id = self.context['tenant_id']
+        errors = {}
+        for name in self.tenant_related_fields:
+            related = attrs.get(name)
+            if related is not None and related.hospital_id != tenant_id:
+                errors[name] = [f'Invalid pk "{related.pk}" - object does not exist.']
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
@@ -0,0 +1,36 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Assert that an endpoint's query count does not grow with the number of rows.
+
+    Requests bypass the response cache so every size is actually rendered.
+    """
+
+    def assertConstantQueries(self, url, seed, sizes=(3, 30)):
+        counts = []
+        for size in sizes:
+            seed(size)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, HTTP_CACHE_CONTROL='no-cache')
+            self.assertEqual(response.status_code, 200, response.content[:200])
+            counts.append(len(ctx))
+        if len(set(counts)) != 1:
+            queries = '\n'.join(q['sql'] for q in ctx.captured_queries)
+            self.fail(f'{url} query count grew with row count {dict(zip(sizes, counts))}:\n{queries}')
+        return counts[0]
+
+
+class EagerTasksMixin:
+    """Run ``.delay()``/``.apply_async()`` inline so tests need no broker or worker."""
+
+    def setUp(self):
+        super().setUp()
+        from core.celery import app
+
+        # Settings come from Django with the CELERY_ namespace, so override the namespaced keys.
+        overrides = {'CELERY_TASK_ALWAYS_EAGER': True, 'CELERY_TASK_EAGER_PROPAGATES': True}
+        previous = {key: app.conf.get(key) for key in overrides}
+        app.conf.update(overrides)
+        self.addCleanup(app.conf.update, previous)
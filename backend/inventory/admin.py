@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Warehouse
+
+
+@admin.register(Warehouse)
+class WarehouseAdmin(admin.ModelAdmin):
+    list_display = ('name', 'hospital', 'item_count', 'units', 'critical_items', 'updated_at')
+    readonly_fields = ('item_count', 'units', 'critical_items')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Items reference warehouses by hospital and name, so a saved warehouse keeps both.
+        return (*self.readonly_fields, 'hospital', 'name') if obj else self.readonly_fields
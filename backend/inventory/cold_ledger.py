@@ -0,0 +1,384 @@
+"""Closed months of the stock ledger, kept as memory-mapped column files.
+
+Months older than ``LEDGER_HOT_MONTHS`` move out of the ledger table into
+``LEDGER_COLD_DIR``: one directory per month with a ``.npy`` file per column
+and a ``manifest.json``. Rows are sorted by ``(performed_at, id)`` and cut
+into blocks of ``BLOCK_ROWS`` whose ``performed_at`` and ``id`` ranges are in
+the manifest, so a read skips every block its bounds rule out and scans the
+rest in place through the page cache. Numbers are stored in the narrowest
+integer type the month's values fit and transaction types as one-byte codes,
+which keeps the columns small without giving up memory-mapping; notes, the
+one free-text column, are gzipped per block.
+
+The table holds the rows from ``horizon()`` on and the files the rows before
+it, so a newest-first read takes the table's rows and then the files'.
+"""
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .models import InventoryItem, StockTransaction
+from .partitions import add_months, month_start, partitions as ledger_partitions
+
+BLOCK_ROWS = 65536
+# Rows turned into model instances per item and user lookup.
+MATERIALIZE_ROWS = 1000
+MANIFEST = 'manifest.json'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Rows without a hospital or user store 0 there, which no primary key takes.
+NULL_KEY = 0
+KEYS = ('id', 'hospital_id', 'inventory_item_id', 'performed_by_id')
+QUANTITIES = ('quantity_change', 'previous_quantity', 'new_quantity')
+# In the order of the model's concrete fields, as ``Model.from_db`` takes them.
+FIELDS = [field.attname for field in StockTransaction._meta.concrete_fields]
+QUARTER_HOUR = 15 * 60 * 10**6
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _micros(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _moment(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def _narrowest(low, high):
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+@lru_cache(maxsize=64)
+def _block_notes(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as notes:
+        return json.load(notes)
+
+
+def _ruled_out(first, last, low, high, key, descending):
+    """Whether rows timed ``first`` to ``last`` all fall outside ``[low, high)`` or before the seek key."""
+    if (high is not None and first >= high) or (low is not None and last < low):
+        return True
+    if key is not None:
+        return first > key[0] if descending else last < key[0]
+    return False
+
+
+class Segment:
+    """One archived month; its columns are memory-mapped on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as manifest:
+            meta = json.load(manifest)
+        self.month = datetime.strptime(meta['month'], '%Y-%m').date()
+        self.rows = meta['rows']
+        self.types = meta['types']
+        self.blocks = meta['blocks']
+        self.start, self.end = month_start(self.month), month_start(add_months(self.month, 1))
+        self._columns = {}
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.path))
+
+    def match(self, number, hospital_id, item_id=None, transaction_type=None, low=None, high=None, key=None, descending=True):
+        """Positions of block ``number``'s rows matching the filters, in ascending order.
+
+        ``low``, ``high`` and the ``(performed_at, id)`` seek ``key`` are in
+        microseconds; the block's sort order turns them into a row range by
+        binary search, and only that range is compared against the rest.
+        """
+        block = self.blocks[number]
+        if _ruled_out(block['min_at'], block['max_at'], low, high, key, descending):
+            return _EMPTY
+        first = block['start']
+        at = self.column('performed_at')[first:block['stop']]
+        lo = 0 if low is None else int(np.searchsorted(at, low))
+        hi = len(at) if high is None else int(np.searchsorted(at, high))
+        if key is not None:
+            # Rows sharing the key's timestamp are ordered by id.
+            tie, past = int(np.searchsorted(at, key[0])), int(np.searchsorted(at, key[0], 'right'))
+            ids = self.column('id')[first + tie:first + past]
+            if descending:
+                hi = min(hi, tie + int(np.searchsorted(ids, key[1])))
+            else:
+                lo = max(lo, tie + int(np.searchsorted(ids, key[1], 'right')))
+        if lo >= hi:
+            return _EMPTY
+        window = slice(first + lo, first + hi)
+        mask = self.column('hospital_id')[window] == (hospital_id or NULL_KEY)
+        if item_id is not None:
+            mask &= self.column('inventory_item_id')[window] == item_id
+        if transaction_type:
+            if transaction_type not in self.types:
+                return _EMPTY
+            mask &= self.column('transaction_type')[window] == self.types.index(transaction_type)
+        return np.flatnonzero(mask) + window.start
+
+    def read(self, number, positions):
+        """Block ``number``'s rows at ``positions`` as dicts of field values."""
+        start = self.blocks[number]['start']
+        notes = _block_notes(os.path.join(self.path, f'notes-{number}.json.gz'))
+        columns = {name: self.column(name)[positions].tolist() for name in (*KEYS, *QUANTITIES, 'performed_at', 'transaction_type')}
+        found = []
+        for n, position in enumerate(positions.tolist()):
+            row = {name: columns[name][n] for name in (*KEYS, *QUANTITIES)}
+            row.update(
+                hospital_id=row['hospital_id'] or None, performed_by_id=row['performed_by_id'] or None,
+                transaction_type=self.types[columns['transaction_type'][n]],
+                notes=notes[position - start], performed_at=_moment(columns['performed_at'][n]),
+            )
+            found.append(row)
+        return found
+
+    def daily_totals(self):
+        """``(item_ids, days, totals)`` per item and local day, ``totals`` holding the row count and each type's net change.
+
+        Reads the whole month, for folding it into the report rollups.
+        """
+        at = np.asarray(self.column('performed_at'))
+        # Local dates looked up per quarter hour, which every time zone offset is a multiple of.
+        quarters, where = np.unique(at // QUARTER_HOUR, return_inverse=True)
+        days = np.array([timezone.localdate(_moment(int(q) * QUARTER_HOUR)).toordinal() for q in quarters])[where]
+        groups, group = np.unique(self.column('inventory_item_id').astype(np.int64) << 20 | days, return_inverse=True)
+        change, kinds = self.column('quantity_change').astype(np.int64), self.column('transaction_type')
+        totals = {'transactions': np.bincount(group, minlength=len(groups))}
+        for code, kind in enumerate(self.types):
+            totals[kind] = np.bincount(group, weights=np.where(kinds == code, change, 0), minlength=len(groups)).astype(np.int64)
+        return groups >> 20, groups & (1 << 20) - 1, totals
+
+
+_catalogs = {}
+
+
+def segments(directory=None):
+    """The archived months in ``directory``, oldest first; re-read whenever the directory changes."""
+    directory = directory or settings.LEDGER_COLD_DIR
+    try:
+        stamp = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    cached = _catalogs.get(directory)
+    if cached is None or cached[0] != stamp:
+        names = sorted(
+            name for name in os.listdir(directory)
+            if name.isdigit() and os.path.exists(os.path.join(directory, name, MANIFEST))
+        )
+        cached = _catalogs[directory] = (stamp, [Segment(os.path.join(directory, name)) for name in names])
+    return cached[1]
+
+
+def horizon(directory=None):
+    """Where the ledger table starts: the end of the newest archived month, None with nothing archived."""
+    archived = segments(directory)
+    return archived[-1].end if archived else None
+
+
+def _materialize(matches):
+    """``StockTransaction`` instances for ``(segment, block, positions)`` matches, their items and users loaded together.
+
+    Rows of items deleted since they were archived come back without one:
+    ``inventory_item`` raises ``DoesNotExist``, as for a dangling key.
+    """
+    values = [row for segment, number, positions in matches for row in segment.read(number, positions)]
+    items = InventoryItem.objects.only('name', 'sku').in_bulk({row['inventory_item_id'] for row in values})
+    users = get_user_model().objects.only('username').in_bulk({row['performed_by_id'] for row in values} - {None})
+    item_field, user_field = StockTransaction._meta.get_field('inventory_item'), StockTransaction._meta.get_field('performed_by')
+    found = []
+    for row in values:
+        txn = StockTransaction.from_db(DEFAULT_DB_ALIAS, FIELDS, [row[name] for name in FIELDS])
+        item_field.set_cached_value(txn, items.get(txn.inventory_item_id))
+        user_field.set_cached_value(txn, users.get(txn.performed_by_id))
+        found.append(txn)
+    return found
+
+
+def rows(hospital_id, item_id=None, transaction_type=None, start=None, end=None, after=None, descending=True, limit=None, directory=None):
+    """Archived rows of ``hospital_id``'s tenant matching the filters, as ``StockTransaction`` instances.
+
+    Rows come in ``(performed_at, id)`` order, newest first unless
+    ``descending`` is false, continuing past the ``(performed_at, id)`` key
+    ``after`` the way a keyset page does. ``start`` is inclusive and ``end``
+    exclusive. Blocks are read lazily and their matches turned into instances
+    ``MATERIALIZE_ROWS`` or so at a time, so a short page touches few blocks.
+    """
+    low = _micros(start) if start else None
+    high = _micros(end) if end else None
+    key = (_micros(after[0]), int(after[1])) if after else None
+    remaining = limit
+    pending, pending_rows = [], 0
+    archived = segments(directory)
+    for segment in reversed(archived) if descending else archived:
+        if _ruled_out(_micros(segment.start), _micros(segment.end) - 1, low, high, key, descending):
+            continue
+        numbers = range(len(segment.blocks))
+        for number in reversed(numbers) if descending else numbers:
+            positions = segment.match(number, hospital_id, item_id, transaction_type, low, high, key, descending)
+            if descending:
+                positions = positions[::-1]
+            if remaining is not None:
+                positions = positions[:remaining]
+                remaining -= len(positions)
+            for offset in range(0, len(positions), MATERIALIZE_ROWS):
+                pending.append((segment, number, positions[offset:offset + MATERIALIZE_ROWS]))
+                pending_rows += len(pending[-1][2])
+                if pending_rows >= MATERIALIZE_ROWS:
+                    yield from _materialize(pending)
+                    pending, pending_rows = [], 0
+            if remaining == 0:
+                break
+        if remaining == 0:
+            break
+    yield from _materialize(pending)
+
+
+def get(pk, hospital_id, directory=None):
+    """The archived row ``pk`` if it belongs to ``hospital_id``'s tenant, else None."""
+    for segment in segments(directory):
+        for number, block in enumerate(segment.blocks):
+            if not block['min_id'] <= pk <= block['max_id']:
+                continue
+            hits = np.flatnonzero(segment.column('id')[block['start']:block['stop']] == pk) + block['start']
+            if len(hits) and segment.column('hospital_id')[hits[0]] == (hospital_id or NULL_KEY):
+                return _materialize([(segment, number, hits[:1])])[0]
+    return None
+
+
+def archive_months(folded_through, hot_months=None, directory=None, today=None, batch_size=10000):
+    """Move the closed months before the last ``hot_months`` out of the ledger table into column files.
+
+    Months go oldest first, and only while all of a month's rows have ids up
+    to ``folded_through``, the report rollups' watermark, so the rollups
+    already hold whatever is archived. Each month is written under a
+    temporary name and renamed into place before its rows are removed; a run
+    stopped in between leaves the rows hidden behind ``horizon()`` and the
+    next run finishes the removal. On a partitioned ledger a month with its
+    own partition is removed by detaching and dropping the partition, empty
+    ones included; otherwise its rows are deleted in batches. Rows are only
+    ever stamped with the current time, so a closed month cannot gain rows
+    meanwhile. Returns ``(month, rows)`` for each month archived.
+    """
+    directory = directory or settings.LEDGER_COLD_DIR
+    hot_months = settings.LEDGER_HOT_MONTHS if hot_months is None else hot_months
+    cutoff = month_start(add_months((today or timezone.now().date()).replace(day=1), -hot_months))
+    os.makedirs(directory, exist_ok=True)
+    partitioned = {month: name for name, month, _ in ledger_partitions() if month and month_start(month) < cutoff}
+    first = StockTransaction.objects.filter(performed_at__lt=cutoff).aggregate(first=Min('performed_at'))['first']
+    starts = [first.astimezone(dt_timezone.utc).date().replace(day=1)] if first else []
+    month = min(starts + list(partitioned), default=None)
+    done = []
+    while month and month_start(month) < cutoff:
+        segment = next((segment for segment in segments(directory) if segment.month == month), None)
+        if segment is None:
+            ledger = StockTransaction.objects.filter(performed_at__gte=month_start(month), performed_at__lt=month_start(add_months(month, 1)))
+            stats = ledger.aggregate(
+                rows=Count('pk'),
+                **{f'{name}_min': Min(name) for name in (*KEYS, *QUANTITIES)},
+                **{f'{name}_max': Max(name) for name in (*KEYS, *QUANTITIES)},
+            )
+            if stats['rows'] and stats['id_max'] > folded_through:
+                break
+            if stats['rows']:
+                _write_segment(ledger, month, stats, directory, batch_size)
+                segment = next(segment for segment in segments(directory) if segment.month == month)
+                done.append((month, stats['rows']))
+        if month in partitioned:
+            _drop_partition(partitioned[month], segment.rows if segment else 0)
+        elif segment is not None:
+            # By the ids written, so only rows that are in the files go.
+            ids = segment.column('id').tolist()
+            for offset in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    StockTransaction.objects.filter(pk__in=ids[offset:offset + batch_size]).delete()
+        month = add_months(month, 1)
+    return done
+
+
+def _drop_partition(name, archived):
+    """Detach and drop a month's partition, provided it holds exactly the ``archived`` rows written for it."""
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {qn(StockTransaction._meta.db_table)} DETACH PARTITION {qn(name)}')
+        cursor.execute(f'SELECT count(*) FROM {qn(name)}')
+        held, = cursor.fetchone()
+        if held != archived:
+            # Rolls the detach back, leaving the partition attached.
+            raise RuntimeError(f'Partition {name} holds {held:,} rows but {archived:,} were archived.')
+        cursor.execute(f'DROP TABLE {qn(name)}')
+
+
+def _write_segment(ledger, month, stats, directory, batch_size):
+    final = os.path.join(directory, f'{month:%Y%m}')
+    partial = os.path.join(directory, f'.{month:%Y%m}.partial')
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    try:
+        dtypes = {'performed_at': np.dtype(np.int64), 'transaction_type': np.dtype(np.uint8)}
+        for name in (*KEYS, *QUANTITIES):
+            dtypes[name] = _narrowest(min(stats[f'{name}_min'] or 0, 0), max(stats[f'{name}_max'] or 0, 0))
+        columns = {
+            name: np.lib.format.open_memmap(os.path.join(partial, f'{name}.npy'), mode='w+', dtype=dtype, shape=(stats['rows'],))
+            for name, dtype in dtypes.items()
+        }
+        types = [kind for kind, _ in StockTransaction.TRANSACTION_TYPES]
+        blocks, start = [], 0
+        source = ledger.order_by('performed_at', 'id').values_list(
+            'performed_at', 'transaction_type', 'notes', *KEYS, *QUANTITIES,
+        ).iterator(chunk_size=batch_size)
+        while batch := list(islice(source, BLOCK_ROWS)):
+            stop = start + len(batch)
+            if stop > stats['rows']:
+                raise RuntimeError(f'Ledger rows for {month:%Y-%m} changed while it was being archived.')
+            at, kinds, notes, *values = zip(*batch)
+            types.extend(sorted(set(kinds) - set(types)))
+            codes = {kind: code for code, kind in enumerate(types)}
+            columns['performed_at'][start:stop] = [_micros(moment) for moment in at]
+            columns['transaction_type'][start:stop] = [codes[kind] for kind in kinds]
+            for name, column in zip((*KEYS, *QUANTITIES), values):
+                columns[name][start:stop] = [NULL_KEY if value is None else value for value in column]
+            with gzip.open(os.path.join(partial, f'notes-{len(blocks)}.json.gz'), 'wt', encoding='utf-8') as out:
+                json.dump(notes, out)
+            ids = columns['id'][start:stop]
+            blocks.append({
+                'start': start, 'stop': stop,
+                'min_at': int(columns['performed_at'][start]), 'max_at': int(columns['performed_at'][stop - 1]),
+                'min_id': int(ids.min()), 'max_id': int(ids.max()),
+            })
+            start = stop
+        if start != stats['rows']:
+            raise RuntimeError(f'Ledger rows for {month:%Y-%m} changed while it was being archived.')
+        for column in columns.values():
+            column.flush()
+        del columns
+        with open(os.path.join(partial, MANIFEST), 'w') as manifest:
+            json.dump({'month': f'{month:%Y-%m}', 'rows': start, 'types': types, 'blocks': blocks}, manifest)
+        # Everything is on disk before the month becomes visible and its rows are deleted.
+        for entry in os.scandir(partial):
+            with open(entry.path, 'rb') as written:
+                os.fsync(written.fileno())
+        os.rename(partial, final)
+        descriptor = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
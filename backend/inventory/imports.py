@@ -0,0 +1,270 @@
+import csv
+import io
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from core.bulk import update_rows
+from core.cache import invalidate
+from core.tenancy import for_tenant, tenant_of
+from .models import InventoryItem, Supplier, Warehouse, expiry_bucket
+from .realtime import publish_item_changes
+from .services import bulk_adjust_stock
+from .signals import StockCrossing, notify_crossings
+from .warehouses import ensure_warehouses, item_totals, move_totals
+
+# Columns an import file may carry; only ``sku`` is required. ``supplier`` is
+# a supplier name, ``location`` a warehouse name and ``quantity`` a stock count.
+ITEM_COLUMNS = (
+    'name', 'description', 'category', 'unit', 'minimum_stock', 'maximum_stock', 'expiry_date',
+    'batch_number', 'location', 'unit_price',
+)
+IMPORT_COLUMNS = ('sku', *ITEM_COLUMNS, 'supplier', 'quantity')
+# Needed to create an item that is not in the catalogue yet.
+REQUIRED_FOR_NEW = ('name', 'category', 'unit')
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def import_items(source, user=None, batch_size=1000, dry_run=False):
+    """Upsert catalogue rows from a CSV file and book stock counts.
+
+    ``source`` is a binary or text file object read incrementally, one batch
+    of ``batch_size`` rows per transaction. Items are matched on ``sku``;
+    columns missing from the file keep their current values. Supplier names
+    resolve through one name-to-id map, creating suppliers that do not exist;
+    warehouses named in ``location`` are created too. Items and suppliers
+    belong to ``user``'s hospital, and SKUs of another hospital's items are
+    rejected.
+    A ``quantity`` that differs from the stored one is applied through the
+    stock ledger as an ``adjust`` transaction. Invalid rows are skipped and
+    reported by line. With ``dry_run`` everything is validated and rolled back.
+    """
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(source)
+    columns = [name.strip() for name in reader.fieldnames or []]
+    reader.fieldnames = columns
+    if 'sku' not in columns:
+        raise ImportFileError('The file needs a "sku" column.')
+    unknown = sorted(set(columns) - set(IMPORT_COLUMNS))
+    if unknown:
+        raise ImportFileError(f'Unknown columns: {", ".join(unknown)}. Expected some of: {", ".join(IMPORT_COLUMNS)}.')
+
+    hospital_id = tenant_of(user)
+    batch = _ImportBatch(columns, user, hospital_id, _supplier_map(hospital_id))
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'adjusted': 0, 'error_count': 0, 'errors': []}
+    seen = {}
+    rows = enumerate(reader, start=2)
+    while chunk := _read(rows, batch_size, report):
+        valid = []
+        for line, row in chunk:
+            report['rows'] += 1
+            sku = (row.get('sku') or '').strip()
+            errors = {'sku': ['This field is required.']} if not sku else {}
+            if sku in seen:
+                errors = {'sku': [f'Duplicate of line {seen[sku]}.']}
+            values = {}
+            if not errors:
+                seen[sku] = line
+                values, errors = _clean(row, columns)
+            if errors:
+                _reject(report, line, sku, errors)
+            else:
+                valid.append((line, sku, values))
+
+        with transaction.atomic():
+            for key, count in batch.apply(valid, report).items():
+                report[key] += count
+            if dry_run:
+                transaction.set_rollback(True)
+        if dry_run:
+            # Suppliers created by the rolled-back batch are gone again.
+            batch.suppliers = _supplier_map(hospital_id)
+    report['errors'].sort(key=lambda error: error['line'])
+    report['suppliers_created'] = len(batch.new_suppliers)
+    report['dry_run'] = dry_run
+    return report
+
+
+def _read(rows, batch_size, report):
+    try:
+        return list(islice(rows, batch_size))
+    except (UnicodeDecodeError, csv.Error) as exc:
+        # Earlier batches are already committed; say where reading stopped.
+        raise ImportFileError(f'Could not read the file after row {report["rows"]} ({exc}); earlier rows were imported.')
+
+
+def _supplier_map(hospital_id):
+    return {name.strip().lower(): pk for pk, name in for_tenant(Supplier.objects, hospital_id).values_list('pk', 'name')}
+
+
+_fields = {name: InventoryItem._meta.get_field(name) for name in (*ITEM_COLUMNS, 'quantity')}
+
+
+def _clean(row, columns):
+    values, errors = {}, {}
+    for name in columns:
+        raw = (row.get(name) or '').strip()
+        if name == 'sku':
+            continue
+        if name == 'supplier':
+            values[name] = raw or None
+            continue
+        if name == 'location':
+            if len(raw) > Warehouse._meta.get_field('name').max_length:
+                errors[name] = ['Warehouse names are at most 255 characters.']
+            else:
+                values[name] = raw or None
+            continue
+        field = _fields[name]
+        if not raw:
+            # Blank clears optional fields and leaves required ones as they are.
+            if field.null:
+                values[name] = None
+            continue
+        try:
+            value = field.clean(raw, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+            continue
+        if isinstance(value, (int, Decimal)) and value < 0:
+            errors[name] = ['Must not be negative.']
+            continue
+        values[name] = value
+    return values, errors
+
+
+def _reject(report, line, sku, errors):
+    report['error_count'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line, 'sku': sku, 'errors': errors})
+
+
+class _ImportBatch:
+    def __init__(self, columns, user, hospital_id, suppliers):
+        self.columns = columns
+        self.user = user
+        self.hospital_id = hospital_id
+        self.suppliers = suppliers
+        self.new_suppliers = set()
+        self.update_fields = ['location_id' if name == 'location' else name for name in ITEM_COLUMNS if name in columns]
+        if 'supplier' in columns:
+            self.update_fields.append('supplier')
+        if 'expiry_date' in columns:
+            self.update_fields.append('expiry_status')
+        self.update_fields += ['is_below_minimum', 'updated_at']
+
+    def apply(self, valid, report):
+        counts = {'created': 0, 'updated': 0, 'adjusted': 0}
+        if not valid:
+            return counts
+        self._create_suppliers({values['supplier'] for _, _, values in valid if values.get('supplier')})
+        ensure_warehouses(self.hospital_id, {values.get('location') for _, _, values in valid})
+
+        # Locking the existing rows makes the stock-count deltas below exact.
+        existing = {
+            item.sku: item for item in InventoryItem.objects.select_for_update().filter(sku__in=[sku for _, sku, _ in valid])
+        }
+        now = timezone.now()
+        items, counted, crossings, changes, totals, lines = [], {}, [], [], [], {}
+        for line, sku, values in valid:
+            current = existing.get(sku)
+            if current is not None and current.hospital_id != self.hospital_id:
+                # SKUs are unique across hospitals; say so without showing the other hospital's item.
+                _reject(report, line, sku, {'sku': ['Already used by another hospital.']})
+                continue
+            if current is None:
+                missing = [name for name in REQUIRED_FOR_NEW if not values.get(name)]
+                if missing:
+                    _reject(report, line, sku, {name: ['Required for a new item.'] for name in missing})
+                    continue
+                item = InventoryItem(sku=sku, hospital_id=self.hospital_id, quantity=0, is_below_minimum=False)
+            else:
+                item = current
+                before = item.live_values()
+                totals.append(item_totals(item.hospital_id, item.location_id, item.quantity, item.is_below_minimum, sign=-1))
+
+            for name, value in values.items():
+                if name == 'supplier':
+                    item.supplier_id = self.suppliers[value.lower()] if value else None
+                elif name == 'location':
+                    item.location_id = value
+                elif name != 'quantity':
+                    setattr(item, name, value)
+            item.expiry_status = expiry_bucket(item.expiry_date)
+            item.updated_at = now
+
+            if values.get('quantity') is not None and values['quantity'] != item.quantity:
+                # The ledger moves the quantity and reports the crossing, if any.
+                counted[sku] = values['quantity']
+            else:
+                was_below = item.is_below_minimum
+                item.is_below_minimum = item.quantity < item.minimum_stock
+                if item.is_below_minimum != was_below:
+                    crossings.append(sku)
+            if current is not None:
+                diff = {name: value for name, value in item.live_values().items() if value != before[name]}
+                if diff:
+                    changes.append((sku, item.location_id, item.hospital_id, diff))
+            lines[sku] = line
+            items.append(item)
+
+        updated = [item for item in items if item.sku in existing]
+        created = [item for item in items if item.sku not in existing]
+        update_rows(InventoryItem, updated, self.update_fields)
+        # New SKUs are not locked above, and another hospital may insert one
+        # meanwhile. Its row is kept and the line rejected, never overwritten.
+        InventoryItem.objects.bulk_create(created, ignore_conflicts=True)
+        ids = {item.sku: item.pk for item in updated}
+        taken = set()
+        for sku, pk, hospital_id in InventoryItem.objects.filter(sku__in=[item.sku for item in created]).values_list('sku', 'pk', 'hospital'):
+            if hospital_id == self.hospital_id:
+                ids[sku] = pk
+            else:
+                taken.add(sku)
+                _reject(report, lines[sku], sku, {'sku': ['Already used by another hospital.']})
+        if taken:
+            created = [item for item in created if item.sku not in taken]
+            crossings = [sku for sku in crossings if sku not in taken]
+            counted = {sku: quantity for sku, quantity in counted.items() if sku not in taken}
+        items = updated + created
+        by_sku = {item.sku: item for item in items}
+        counts['created'] = len(created)
+        counts['updated'] = len(updated)
+        # Counted quantities reach the totals through the ledger below.
+        totals += [item_totals(item.hospital_id, item.location_id, item.quantity, item.is_below_minimum) for item in items]
+
+        notify_crossings(InventoryItem, [
+            StockCrossing(ids[sku], by_sku[sku].is_below_minimum, by_sku[sku].quantity, by_sku[sku].minimum_stock)
+            for sku in crossings
+        ])
+        publish_item_changes([(ids[sku], location, hospital_id, diff) for sku, location, hospital_id, diff in changes])
+        move_totals(totals)
+        if counted:
+            results = bulk_adjust_stock([
+                {
+                    'item': ids[sku], 'quantity_change': quantity - by_sku[sku].quantity,
+                    'transaction_type': 'adjust', 'notes': 'Stock count import',
+                }
+                for sku, quantity in counted.items()
+            ], user=self.user)
+            counts['adjusted'] = sum(1 for result in results if result['status'] == 'ok')
+        invalidate(InventoryItem, Supplier)
+        return counts
+
+    def _create_suppliers(self, names):
+        new = {}
+        for name in names:
+            if name.lower() not in self.suppliers:
+                new.setdefault(name.lower(), name)
+        if new:
+            Supplier.objects.bulk_create([Supplier(name=name, hospital_id=self.hospital_id) for name in new.values()])
+            self.suppliers = _supplier_map(self.hospital_id)
+            self.new_suppliers.update(new)
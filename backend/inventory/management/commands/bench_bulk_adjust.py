@@ -0,0 +1,32 @@
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare N single adjust_stock calls against one bulk_adjust call.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+
+    def run_benchmark(self, rows, **options):
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        InventoryItem.objects.bulk_create(
+            InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:06d}', category='consumable', unit='pcs', quantity=1000)
+            for i in range(rows)
+        )
+        item_ids = list(InventoryItem.objects.values_list('pk', flat=True))
+
+        with self.timer(f'{rows} single adjust_stock calls', rows=rows):
+            for pk in item_ids:
+                client.post(f'/api/inventory/{pk}/adjust_stock/', {'quantity_change': -1, 'transaction_type': 'consume'}, format='json')
+
+        movements = [{'item': pk, 'quantity_change': -1, 'transaction_type': 'consume'} for pk in item_ids]
+        with self.timer(f'1 bulk_adjust call with {rows} rows', rows=rows):
+            response = client.post('/api/inventory/bulk_adjust/', {'movements': movements}, format='json')
+
+        self.stdout.write(f"bulk result: applied={response.data['applied']} failed={response.data['failed']}")
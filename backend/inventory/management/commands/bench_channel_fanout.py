@@ -0,0 +1,94 @@
+import asyncio
+import multiprocessing
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.realtime import hospital_group, publish
+
+# Every simulated client is signed in to the same hospital.
+GROUP = hospital_group(1)
+
+
+def _worker(sockets, messages, ready, results):
+    async def run():
+        layer = get_channel_layer()
+        channels = [await layer.new_channel() for _ in range(sockets)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        ready.release()
+
+        async def drain(channel):
+            for _ in range(messages):
+                await layer.receive(channel)
+
+        await asyncio.gather(*(drain(channel) for channel in channels))
+        return time.monotonic()
+
+    results.put((sockets * messages, asyncio.run(run())))
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how fast diffs published through the configured channel layer reach subscribed '
+        'consumers spread across several worker processes. Point CHANNEL_REDIS_URL at a Redis server '
+        'to measure cross-process fan-out; the in-memory layer only works with --workers 1.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--messages', type=int, default=50)
+
+    def handle(self, sockets, workers, messages, **options):
+        layer = get_channel_layer()
+        if layer is None:
+            raise CommandError('No channel layer configured.')
+        in_memory = type(layer).__name__ == 'InMemoryChannelLayer'
+        if in_memory and workers != 1:
+            raise CommandError('The in-memory channel layer cannot span processes; use --workers 1 or configure Redis.')
+
+        payload = {'type': 'INVENTORY_DIFF', 'items': [{'id': 1, 'quantity': 42, 'is_below_minimum': False}]}
+
+        if in_memory:
+            async def single():
+                channels = [await layer.new_channel() for _ in range(sockets)]
+                for channel in channels:
+                    await layer.group_add(GROUP, channel)
+                started = time.monotonic()
+                for _ in range(messages):
+                    await layer.group_send(GROUP, {'type': 'inventory.diff', 'payload': payload})
+                for channel in channels:
+                    for _ in range(messages):
+                        await layer.receive(channel)
+                return started, time.monotonic()
+
+            layer.capacity = max(layer.capacity, messages)
+            started, finished = async_to_sync(single)()
+            delivered = sockets * messages
+        else:
+            per_worker = [sockets // workers + (i < sockets % workers) for i in range(workers)]
+            ctx = multiprocessing.get_context('fork')
+            ready, results = ctx.Semaphore(0), ctx.Queue()
+            processes = [ctx.Process(target=_worker, args=(n, messages, ready, results)) for n in per_worker]
+            for process in processes:
+                process.start()
+            for _ in processes:
+                ready.acquire()
+
+            started = time.monotonic()
+            for _ in range(messages):
+                publish([GROUP], payload)
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            delivered = sum(count for count, _ in outcomes)
+            finished = max(at for _, at in outcomes)
+
+        elapsed = finished - started
+        self.stdout.write(
+            f'{type(layer).__name__}: {messages} diffs to {sockets} consumers across {workers} worker(s), '
+            f'{delivered} deliveries in {elapsed:.3f}s ({delivered / elapsed:,.0f} msg/s)'
+        )
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Max
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory import cold_ledger
+from inventory.models import InventoryItem, StockTransaction
+from inventory.views import TransactionPagination
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare ledger size and ledger API latency before and after archiving closed months to column files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000000)
+        parser.add_argument('--months', type=int, default=24, help='Months of history the rows are spread over.')
+        parser.add_argument('--hot-months', type=int, default=6)
+        parser.add_argument('--items', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def run_benchmark(self, rows, months, hot_months, items, repeat, **options):
+        directory = tempfile.mkdtemp(prefix='cold-ledger-')
+        try:
+            with override_settings(LEDGER_COLD_DIR=directory):
+                self.compare(rows, months, hot_months, items, repeat)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def compare(self, rows, months, hot_months, items, repeat):
+        InventoryItem.objects.bulk_create(
+            InventoryItem(name=f'Item {i}', sku=f'SKU-{i:06d}', category='consumable', unit='pcs') for i in range(items)
+        )
+        item_ids = list(InventoryItem.objects.values_list('pk', flat=True))
+        now = timezone.now()
+        with self.timer(f'seed {rows:,} ledger rows over {months} months', rows=rows):
+            self.seed_ledger(item_ids, rows, now - timedelta(days=30.5 * months), now)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='bench', password='bench'))
+        anchor = StockTransaction.objects.filter(
+            performed_at__lt=now - timedelta(days=30.5 * (months - 2)),
+        ).order_by('-performed_at', '-id').first()
+        paginator = TransactionPagination()
+        paginator.fields = [paginator._field(StockTransaction, name) for name in paginator.ordering]
+        cursor = paginator.encode_cursor(paginator._key(anchor), reverse=False)
+        day = {'start': (anchor.performed_at - timedelta(hours=12)).isoformat(), 'end': (anchor.performed_at + timedelta(hours=12)).isoformat()}
+        queries = [
+            ('newest page', {}),
+            (f'page {months - 2} months back (cursor)', {'cursor': cursor}),
+            (f'one day {months - 2} months back', day),
+            (f'one item, one day {months - 2} months back', {**day, 'item': anchor.inventory_item_id}),
+            ("one item's history, oldest first", {'item': anchor.inventory_item_id, 'cursor': paginator.encode_cursor(
+                [(now - timedelta(days=31 * months)).isoformat(), '0'], reverse=True,
+            )}),
+        ]
+
+        hot = self.table_bytes()
+        self.stdout.write(f'ledger table: {StockTransaction.objects.count():,} rows, {hot / 2**20:.1f} MiB on disk')
+        self.time_queries(client, queries, repeat, 'table')
+
+        started = time.perf_counter()
+        folded_through = StockTransaction.objects.aggregate(last=Max('pk'))['last']
+        archived = cold_ledger.archive_months(folded_through, hot_months=hot_months)
+        elapsed = time.perf_counter() - started
+        moved = sum(count for _, count in archived)
+        self.stdout.write(f'archive {len(archived)} months: {elapsed * 1000:.1f} ms ({moved / elapsed:,.0f} rows/s)')
+
+        cold = sum(segment.size() for segment in cold_ledger.segments())
+        self.stdout.write(
+            f'ledger table: {StockTransaction.objects.count():,} rows, {self.table_bytes() / 2**20:.1f} MiB; '
+            f'cold files: {moved:,} rows, {cold / 2**20:.1f} MiB ({cold / moved:.1f} bytes/row, '
+            f'table was {hot / rows:.1f} bytes/row)'
+        )
+        self.time_queries(client, queries, repeat, 'cold')
+
+        segments = cold_ledger.segments()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            matched = sum(
+                len(segment.match(number, None, item_id=anchor.inventory_item_id))
+                for segment in segments for number in range(len(segment.blocks))
+            )
+            samples.append(time.perf_counter() - started)
+        self.report_latencies(f'scan every archived row for one item ({matched:,} hits)', samples)
+        self.stdout.write(f'  {moved / min(samples):,.0f} rows/s')
+        with self.timer('daily item totals of every archived month (rollup rebuild)', rows=moved):
+            for segment in segments:
+                segment.daily_totals()
+
+    def time_queries(self, client, queries, repeat, label):
+        for name, params in queries:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get('/api/transactions/', {'page_size': 50, **params})
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.content[:200]
+            self.report_latencies(f'  {label:<5} {name} ({len(response.data["results"])} rows)', samples)
+
+    def table_bytes(self):
+        # The table with its indexes on PostgreSQL; the whole, otherwise tiny, database file on SQLite.
+        table = StockTransaction._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('VACUUM')
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                return cursor.fetchone()[0]
+            cursor.execute('VACUUM')
+        return os.path.getsize(connection.settings_dict['NAME'])
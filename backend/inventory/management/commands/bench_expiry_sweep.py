@@ -0,0 +1,37 @@
+import tracemalloc
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem
+from inventory.services import sweep_expiry
+
+
+class Command(BenchmarkCommand):
+    help = 'Time the nightly expiry sweep over a large catalogue and report its peak Python memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200000)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def run_benchmark(self, items, chunk_size, **options):
+        today = timezone.localdate()
+        batch = 20000
+        for start in range(0, items, batch):
+            # Spread expiry dates over two years, a seventh of them undated.
+            InventoryItem.objects.bulk_create(
+                InventoryItem(
+                    name=f'Item {i}', sku=f'BENCH-{i:07d}', category='medicine', unit='box', quantity=i % 5,
+                    expiry_date=None if i % 7 == 0 else today + timedelta(days=i % 730 - 30),
+                )
+                for i in range(start, min(start + batch, items))
+            )
+
+        for label, day in (('first sweep', today), ('next day', today + timedelta(days=1))):
+            tracemalloc.start()
+            with self.timer(f'{label} over {items} items', rows=items):
+                stats = sweep_expiry(chunk_size=chunk_size, today=day)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(f'  {stats}, peak {peak / 2 ** 20:.1f} MiB')
@@ -0,0 +1,41 @@
+import csv
+import tempfile
+
+from core.benchmark import BenchmarkCommand
+from inventory.imports import import_items
+from inventory.models import InventoryItem, StockTransaction
+
+
+class Command(BenchmarkCommand):
+    help = 'Time a CSV import that updates half the catalogue, adds the rest and books stock counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--suppliers', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def run_benchmark(self, rows, suppliers, batch_size, **options):
+        existing = rows // 2
+        for start in range(0, existing, 20000):
+            InventoryItem.objects.bulk_create(
+                InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:07d}', category='medicine', unit='box', quantity=50)
+                for i in range(start, min(start + 20000, existing))
+            )
+
+        with tempfile.NamedTemporaryFile('w+', suffix='.csv', newline='') as upload:
+            writer = csv.writer(upload)
+            writer.writerow(['sku', 'name', 'category', 'unit', 'supplier', 'minimum_stock', 'unit_price', 'location', 'quantity'])
+            for i in range(rows):
+                # Every hundredth row is invalid; a third of the counts differ from stock.
+                writer.writerow([
+                    f'BENCH-{i:07d}', f'Item {i}', 'consumable' if i % 100 else 'widget', 'box',
+                    f'Supplier {i % suppliers}', i % 30, f'{i % 500}.25', f'Ward {i % 40}', 50 + (i % 3 == 0) * (i % 7),
+                ])
+            upload.flush()
+
+            with open(upload.name, 'rb') as source, self.timer(f'import {rows} rows', rows=rows):
+                report = import_items(source, batch_size=batch_size)
+
+        report.pop('errors')
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in report.items()))
+        self.stdout.write(f'ledger rows: {StockTransaction.objects.count()}')
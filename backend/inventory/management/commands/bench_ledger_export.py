@@ -0,0 +1,54 @@
+import resource
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem
+from users.models import User
+
+
+def _rss_mib():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BenchmarkCommand):
+    help = 'Stream the stock ledger export and report rows/sec, bytes sent and process memory while streaming.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000000)
+        parser.add_argument('--items', type=int, default=2000)
+        parser.add_argument('--formats', default='csv,csv+gzip,xlsx')
+
+    def run_benchmark(self, rows, items, formats, **options):
+        InventoryItem.objects.bulk_create(
+            InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:06d}', category='medicine', unit='pcs')
+            for i in range(items)
+        )
+        now = timezone.now()
+        with self.timer(f'seed {rows} ledger rows', rows=rows):
+            self.seed_ledger(list(InventoryItem.objects.values_list('pk', flat=True)), rows, now - timedelta(days=365), now)
+
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        for label in formats.split(','):
+            fmt, _, encoding = label.partition('+')
+            baseline = peak = _rss_mib()
+            sent = 0
+            started = time.perf_counter()
+            response = client.get('/api/transactions/export/', {'format': fmt}, HTTP_ACCEPT_ENCODING=encoding)
+            for chunk in response.streaming_content:
+                sent += len(chunk)
+                peak = max(peak, _rss_mib())
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label}: {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s), {sent / 2 ** 20:.1f} MiB sent, '
+                f'RSS {baseline:.0f} MiB before, peak {peak:.0f} MiB (+{peak - baseline:.1f})'
+            )
@@ -0,0 +1,58 @@
+import time
+
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, StockTransaction
+from inventory.serializers import StockTransactionSerializer
+from inventory.views import StockTransactionViewSet, TransactionPagination
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Show that keyset page latency on the ledger is flat from page 1 to page 10,000.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--pages', type=int, default=10000)
+        parser.add_argument('--samples', type=int, default=30)
+
+    def run_benchmark(self, page_size, pages, samples, **options):
+        rows = page_size * pages
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        item = InventoryItem.objects.create(name='Bench Gauze', sku='BENCH-001', category='consumable', unit='pcs')
+
+        with self.timer(f'seed {rows} ledger rows', rows=rows):
+            for offset in range(0, rows, 10000):
+                StockTransaction.objects.bulk_create(
+                    StockTransaction(
+                        inventory_item=item, transaction_type='consume', quantity_change=-1,
+                        previous_quantity=1, new_quantity=0, performed_by=user,
+                    )
+                    for _ in range(min(10000, rows - offset))
+                )
+
+        paginator = TransactionPagination()
+        paginator.fields = [paginator._field(StockTransaction, name) for name in paginator.ordering]
+        ordered = StockTransactionViewSet.queryset
+        for page in (1, pages // 2, pages):
+            offset = (page - 1) * page_size
+            url = f'/api/transactions/?page_size={page_size}'
+            if page > 1:
+                anchor = ordered[offset - 1]
+                url += f'&cursor={paginator.encode_cursor(paginator._key(anchor), reverse=False)}'
+
+            keyset, offset_latencies = [], []
+            for _ in range(samples):
+                t0 = time.perf_counter()
+                response = client.get(url)
+                keyset.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                StockTransactionSerializer(ordered[offset:offset + page_size], many=True).data
+                offset_latencies.append(time.perf_counter() - t0)
+            assert len(response.data['results']) == page_size
+            self.report_latencies(f'keyset page {page:>6}', keyset)
+            self.report_latencies(f'OFFSET page {page:>6}', offset_latencies)
@@ -0,0 +1,50 @@
+import time
+
+from django.db import transaction
+
+from core import metrics
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem
+from inventory.services import adjust_stock
+from inventory.signals import stock_moved
+
+
+class Command(BenchmarkCommand):
+    help = 'Time recording live metric events and reading their windows, alone and through the ledger signal.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=200000)
+        parser.add_argument('--adjustments', type=int, default=2000)
+
+    def run_benchmark(self, events, adjustments, **options):
+        counter = metrics.EventCounter()
+        names = ['stock_moves', 'stock_outs', 'orders_placed', 'expiry_alerts']
+        started = time.perf_counter()
+        for n in range(events):
+            counter.record(names[n % len(names)])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'record(): {elapsed / events * 1e6:.2f} µs/event')
+
+        samples = []
+        for _ in range(1000):
+            started = time.perf_counter()
+            counter.windows()
+            samples.append(time.perf_counter() - started)
+        self.report_latencies('windows()', samples)
+
+        item = InventoryItem.objects.create(name='Saline', sku='BENCH-1', category='consumable', unit='pcs', quantity=10 ** 6)
+        txn = adjust_stock(item.pk, -1)
+        started = time.perf_counter()
+        for _ in range(events):
+            stock_moved.send(sender=InventoryItem, transactions=[txn])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'stock_moved signal to counter: {elapsed / events * 1e6:.2f} µs/event')
+
+        samples = []
+        for _ in range(adjustments):
+            started = time.perf_counter()
+            with transaction.atomic():
+                adjust_stock(item.pk, -1)
+            samples.append(time.perf_counter() - started)
+        self.report_latencies('adjust_stock, counted on commit', samples)
+        self.stdout.write(f'last minute: {metrics.windows()["minute"]}')
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, OperationalError
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, StockTransaction
+from inventory.services import adjust_stock
+
+
+class Command(BenchmarkCommand):
+    help = 'Fire concurrent stock adjustments at one item and verify no update is lost.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adjustments', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--retries', type=int, default=20)
+
+    def run_benchmark(self, adjustments, workers, retries, **options):
+        start_quantity = adjustments
+        item = InventoryItem.objects.create(
+            name='Bench Saline', sku='BENCH-001', category='consumable', unit='pcs', quantity=start_quantity
+        )
+
+        def worker(chunk):
+            applied, total = 0, 0
+            try:
+                for i in chunk:
+                    delta = -1 if i % 2 else 2
+                    for _ in range(retries):
+                        try:
+                            adjust_stock(item.pk, delta, transaction_type='consume' if delta < 0 else 'restock')
+                        except OperationalError:
+                            # SQLite reports write contention instead of queueing it.
+                            continue
+                        applied += 1
+                        total += delta
+                        break
+            finally:
+                connection.close()
+            return applied, total
+
+        chunks = [range(w, adjustments, workers) for w in range(workers)]
+        with self.timer(f'{adjustments} adjustments on {workers} threads', rows=adjustments):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(worker, chunks))
+
+        applied = sum(r[0] for r in results)
+        expected = start_quantity + sum(r[1] for r in results)
+        item.refresh_from_db()
+        ledger = StockTransaction.objects.filter(inventory_item=item).count()
+        self.stdout.write(f'applied: {applied}/{adjustments}')
+        self.stdout.write(f'final quantity: {item.quantity} (expected {expected})')
+        self.stdout.write(f'ledger rows: {ledger} (expected {applied})')
+
+        if item.quantity == expected and ledger == applied:
+            self.stdout.write(self.style.SUCCESS('OK: no lost updates'))
+        else:
+            self.stdout.write(self.style.ERROR('MISMATCH: lost updates detected'))
@@ -0,0 +1,66 @@
+import time
+
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, StockTransaction, Supplier
+from users.models import Hospital, User
+
+ENDPOINTS = [
+    ('inventory page', '/api/inventory/?page_size=50'),
+    ('whole catalogue', '/api/inventory/'),
+    ('low stock', '/api/inventory/low_stock/'),
+    ('ledger page', '/api/transactions/'),
+    ('suppliers', '/api/suppliers/'),
+]
+
+
+class Command(BenchmarkCommand):
+    help = "Time one hospital's list endpoints as more hospitals share the tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--items', type=int, default=500, help='Items per hospital.')
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def run_benchmark(self, tenants, items, repeat, **options):
+        client = APIClient()
+        seeded = 0
+        for total in sorted(tenants):
+            while seeded < total:
+                user = self.seed_hospital(seeded, items)
+                if seeded == 0:
+                    client.force_authenticate(user)
+                seeded += 1
+            self.stdout.write(f'{total} hospitals, {InventoryItem.objects.count():,} items in all:')
+            for label, url in ENDPOINTS:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = client.get(url, HTTP_CACHE_CONTROL='no-cache')
+                    samples.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.content[:200]
+                self.report_latencies(f'  {label}', samples)
+
+    def seed_hospital(self, index, items):
+        hospital = Hospital.objects.create(name=f'Hospital {index}')
+        suppliers = Supplier.objects.bulk_create(Supplier(name=f'Supplier {index}-{i}', hospital=hospital) for i in range(20))
+        InventoryItem.objects.bulk_create(
+            InventoryItem(
+                hospital=hospital, name=f'Item {i}', sku=f'H{index}-{i:05d}', category='consumable', unit='pcs',
+                quantity=(i * 7) % 60, minimum_stock=20, is_below_minimum=(i * 7) % 60 < 20, supplier=suppliers[i % 20],
+            )
+            for i in range(items)
+        )
+        item_ids = list(InventoryItem.objects.filter(hospital=hospital).values_list('pk', flat=True))
+        StockTransaction.objects.bulk_create(
+            (
+                StockTransaction(
+                    hospital=hospital, inventory_item_id=item_ids[n % items], transaction_type='consume',
+                    quantity_change=-1, previous_quantity=1, new_quantity=0,
+                )
+                for n in range(items * 4)
+            ),
+            batch_size=5000,
+        )
+        return User.objects.create_user(username=f'user{index}', password='bench', hospital=hospital)
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, Warehouse
+from inventory.services import adjust_stock, bulk_adjust_stock
+from inventory.warehouses import live_cache_key, rebuild_warehouse_totals
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Time ledger writes that move warehouse totals, the live warehouse endpoint and a full rebuild.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--warehouses', type=int, default=50)
+        parser.add_argument('--writes', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def run_benchmark(self, items, warehouses, writes, requests, **options):
+        Warehouse.objects.bulk_create(
+            Warehouse(name=f'Warehouse {i}', latitude=i % 90, longitude=i % 180) for i in range(warehouses)
+        )
+        InventoryItem.objects.bulk_create(
+            (
+                InventoryItem(
+                    name=f'Item {i}', sku=f'BENCH-{i:06d}', category='consumable', unit='pcs', quantity=(i * 7) % 60,
+                    minimum_stock=20, is_below_minimum=(i * 7) % 60 < 20, location_id=f'Warehouse {i % warehouses}',
+                )
+                for i in range(items)
+            ),
+            batch_size=5000,
+        )
+        with self.timer(f'rebuild totals from {items} items'):
+            rebuild_warehouse_totals()
+
+        item_ids = list(InventoryItem.objects.values_list('pk', flat=True))
+        rng = random.Random(7)
+        samples = []
+        for _ in range(writes):
+            started = time.perf_counter()
+            adjust_stock(rng.choice(item_ids), rng.choice((-2, -1, 1, 3)))
+            samples.append(time.perf_counter() - started)
+        self.report_latencies('adjust_stock', samples)
+        movements = [{'item': pk, 'quantity_change': 5} for pk in rng.sample(item_ids, 1000)]
+        with self.timer('bulk_adjust_stock, 1000 items', rows=1000):
+            bulk_adjust_stock(movements)
+        self.stdout.write(f'rebuild corrections after the writes: {rebuild_warehouse_totals()}')
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='bench', password='bench'))
+        for label, cold in (('live endpoint, cached', False), ('live endpoint, after a change', True)):
+            samples = []
+            for _ in range(requests):
+                if cold:
+                    # What the first request after a ledger write pays: one read of the warehouse table.
+                    cache.delete(live_cache_key(None))
+                started = time.perf_counter()
+                response = client.get('/api/warehouses/live/')
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200 and len(response.data) == warehouses
+            self.report_latencies(label, samples)
@@ -0,0 +1,99 @@
+import random
+from datetime import date, timedelta
+
+from django.db import connection
+
+from alerts.models import Alert
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, Supplier, StockTransaction
+from orders.models import PurchaseOrder
+from users.models import Hospital, User
+
+
+class Command(BenchmarkCommand):
+    help = 'Seed a dataset, EXPLAIN each hot query and report whether it uses its index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=20000)
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def run_benchmark(self, items, verbose_plans, **options):
+        self.seed(items)
+        today = date.today()
+        sample_item, tenant = InventoryItem.objects.order_by('?').values_list('pk', 'hospital_id').first()
+
+        queries = [
+            ('low stock', InventoryItem.objects.filter(hospital_id=tenant, is_below_minimum=True), ['item_tenant_below_min_idx']),
+            ('expiring soon', InventoryItem.objects.filter(expiry_date__lte=today + timedelta(days=30)).order_by('expiry_date'), ['item_expiry_idx']),
+            ('inventory page', InventoryItem.objects.filter(hospital_id=tenant).order_by('name', 'id')[:50], ['item_tenant_name_idx']),
+            ('orders page', PurchaseOrder.objects.filter(hospital_id=tenant).order_by('-created_at')[:50], ['po_tenant_created_idx']),
+            ('orders by status', PurchaseOrder.objects.filter(hospital_id=tenant, status='approved').order_by('-created_at')[:50], ['po_tenant_status_created_idx']),
+            ('open orders', PurchaseOrder.objects.filter(hospital_id=tenant, status__in=['pending', 'approved', 'ordered']).order_by('-created_at')[:50], ['po_tenant_open_created_idx', 'po_tenant_status_created_idx', 'po_tenant_created_idx']),
+            ('ledger page', StockTransaction.objects.filter(hospital_id=tenant).order_by('-performed_at', '-id')[:50], ['stocktxn_tenant_performed_idx']),
+            ('item history', StockTransaction.objects.filter(inventory_item_id=sample_item).order_by('-performed_at', '-id')[:50], ['stocktxn_item_performed_idx']),
+            ('unread alerts', Alert.objects.filter(hospital_id=tenant, is_read=False).order_by('-created_at')[:50], ['alert_tenant_unread_idx']),
+            ('alerts by type', Alert.objects.filter(hospital_id=tenant, type='expiry').order_by('-created_at')[:50], ['alert_tenant_type_created_idx']),
+            ('staff list', User.objects.filter(hospital_id=tenant), ['users_user_hospital_id']),
+        ]
+
+        misses = 0
+        for label, queryset, indexes in queries:
+            plan = queryset.explain()
+            used = next((name for name in indexes if name in plan), None)
+            if used:
+                self.stdout.write(self.style.SUCCESS(f'{label:<18} uses {used}'))
+            else:
+                misses += 1
+                self.stdout.write(self.style.ERROR(f'{label:<18} does not use {" / ".join(indexes)}'))
+            if verbose_plans or not used:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        self.stdout.write(f'{len(queries) - misses}/{len(queries)} hot queries use their index')
+
+    def seed(self, items):
+        rng = random.Random(42)
+        today = date.today()
+        hospitals = Hospital.objects.bulk_create(Hospital(name=f'Hospital {i}') for i in range(50))
+        suppliers = Supplier.objects.bulk_create(Supplier(name=f'Supplier {i}', hospital=hospitals[i % 50]) for i in range(200))
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', hospital=hospitals[i % 50]) for i in range(2000)
+        )
+        catalogue = []
+        for i in range(items):
+            quantity = rng.randint(0, 5) if rng.random() < 0.02 else rng.randint(50, 500)
+            supplier = rng.choice(suppliers)
+            catalogue.append(InventoryItem(
+                hospital_id=supplier.hospital_id, name=f'Item {i:06d}', sku=f'SKU-{i:06d}', category='medicine', unit='box',
+                quantity=quantity, minimum_stock=10, is_below_minimum=quantity < 10,
+                expiry_date=today + timedelta(days=rng.randint(-30, 720)) if rng.random() < 0.3 else None,
+                supplier=supplier,
+            ))
+        InventoryItem.objects.bulk_create(catalogue, batch_size=5000)
+        item_ids = list(InventoryItem.objects.values_list('pk', 'hospital_id'))
+        StockTransaction.objects.bulk_create(
+            (
+                StockTransaction(
+                    hospital_id=hospital_id, inventory_item_id=item_id, transaction_type='consume', quantity_change=-1,
+                    previous_quantity=1, new_quantity=0, performed_by=rng.choice(users),
+                )
+                for item_id, hospital_id in (rng.choice(item_ids) for _ in range(items * 5))
+            ),
+            batch_size=5000,
+        )
+        statuses = ['pending', 'approved', 'ordered', 'delivered', 'delivered', 'delivered', 'cancelled']
+        PurchaseOrder.objects.bulk_create(
+            PurchaseOrder(
+                order_number=f'PO-{i:06d}', supplier=supplier, hospital_id=supplier.hospital_id, order_date=today,
+                status=rng.choice(statuses),
+            )
+            for i, supplier in enumerate(rng.choice(suppliers) for _ in range(items // 4))
+        )
+        Alert.objects.bulk_create(
+            Alert(
+                hospital=rng.choice(hospitals), type=rng.choice(['low_stock', 'expiry', 'order', 'system']), message='seed',
+                is_read=rng.random() > 0.05,
+            )
+            for _ in range(items)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
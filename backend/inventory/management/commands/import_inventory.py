@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import ImportFileError, import_items
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import catalogue rows and stock counts from a CSV file, upserting on sku.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without saving anything.')
+        parser.add_argument('--user', help='Username recorded on stock count adjustments.')
+
+    def handle(self, path, batch_size, dry_run, user, **options):
+        performed_by = None
+        if user:
+            performed_by = User.objects.filter(username=user).first()
+            if performed_by is None:
+                raise CommandError(f'No user named {user!r}.')
+        try:
+            with open(path, 'rb') as source:
+                report = import_items(source, user=performed_by, batch_size=batch_size, dry_run=dry_run)
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        errors = report.pop('errors')
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in report.items()))
+        for error in errors:
+            self.stdout.write(json.dumps(error, default=str))
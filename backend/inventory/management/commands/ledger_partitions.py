@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from inventory import partitions
+from inventory.models import StockTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage monthly PostgreSQL partitions of the stock ledger: enable, create ahead, EXPLAIN. '
+        'Old months are archived by archive_ledger.'
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+        actions.add_parser('status', help='List the partitions and their estimated rows.')
+        for name, text in (('enable', 'Rebuild the ledger as a partitioned table.'), ('ensure', 'Create upcoming monthly partitions.')):
+            action = actions.add_parser(name, help=text)
+            action.add_argument('--ahead', type=int, default=partitions.PARTITIONS_AHEAD, help='Months ahead of this one to create.')
+        actions.add_parser('explain', help='EXPLAIN date-bounded ledger queries and report the partitions they scan.')
+
+    def handle(self, action, **options):
+        if not partitions.supported():
+            self.stdout.write(f'Ledger partitioning needs PostgreSQL; nothing to do on {connection.vendor}.')
+            return
+        if action != 'enable' and not partitions.is_partitioned():
+            self.stdout.write('The ledger is not partitioned; run "ledger_partitions enable" first.')
+            return
+        getattr(self, f'do_{action}')(**options)
+
+    def do_status(self, **options):
+        for name, month, rows in partitions.partitions():
+            self.stdout.write(f'{name:<40} {month or "default":<10} ~{rows:,} rows')
+
+    def do_enable(self, ahead, **options):
+        moved = partitions.enable_partitioning(ahead=ahead)
+        if moved is None:
+            self.stdout.write('The ledger is already partitioned.')
+            return
+        self.stdout.write(f'Partitioned the ledger: {moved:,} rows over {len(partitions.partitions())} partitions.')
+
+    def do_ensure(self, ahead, **options):
+        created = partitions.ensure_partitions(ahead=ahead)
+        self.stdout.write(f'Created {", ".join(created)}' if created else 'All partitions exist.')
+
+    def do_explain(self, **options):
+        now = timezone.now()
+        sample = StockTransaction.objects.order_by('-performed_at').values_list('inventory_item_id', flat=True).first()
+        queries = [
+            ('last 7 days', StockTransaction.objects.filter(performed_at__gte=now - timedelta(days=7)).order_by('-performed_at', '-id')[:50]),
+            ('one day, as rollups read it', StockTransaction.objects.filter(
+                performed_at__gte=now - timedelta(days=1), performed_at__lt=now,
+            ).order_by('performed_at', 'id')),
+            ("an item's last 30 days", StockTransaction.objects.filter(
+                inventory_item_id=sample, performed_at__gte=now - timedelta(days=30),
+            ).order_by('-performed_at', '-id')[:50]),
+            ('unbounded ledger page', StockTransaction.objects.order_by('-performed_at', '-id')[:50]),
+        ]
+        total = len(partitions.partitions())
+        for label, queryset in queries:
+            plan, scanned = partitions.explain_pruning(queryset)
+            self.stdout.write(f'{label}: scans {len(scanned)} of {total} partitions ({", ".join(scanned) or "none"})')
+            self.stdout.write('    ' + plan.replace('\n', '\n    '))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['-performed_at', '-id'], name='stocktxn_performed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['inventory_item', '-performed_at', '-id'], name='stocktxn_item_performed_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+def populate_is_below_minimum(apps, schema_editor):
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    InventoryItem.objects.filter(quantity__lt=models.F('minimum_stock')).update(is_below_minimum=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventoryitem',
+            name='item_low_stock_idx',
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='is_below_minimum',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(populate_is_below_minimum, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('is_below_minimum', True)), fields=['id'], name='item_below_minimum_idx'),
+        ),
+    ]
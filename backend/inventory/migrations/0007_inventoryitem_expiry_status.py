@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 11:00
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_expiry_status(apps, schema_editor):
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    today = timezone.localdate()
+    InventoryItem.objects.filter(expiry_date__lt=today).update(expiry_status='expired')
+    InventoryItem.objects.filter(expiry_date__gte=today, expiry_date__lt=today + timedelta(days=30)).update(expiry_status='expiring_soon')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_tombstone_updated_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventoryitem',
+            name='item_expiry_idx',
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='expiry_status',
+            field=models.CharField(choices=[('valid', 'Valid'), ('expiring_soon', 'Expiring soon'), ('expired', 'Expired')], default='valid', editable=False, max_length=20),
+        ),
+        migrations.RunPython(populate_expiry_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('expiry_date__isnull', False)), fields=['expiry_date', 'id'], name='item_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('expiry_status', 'valid'), _negated=True), fields=['expiry_status', 'id'], name='item_expiry_status_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def create_warehouses(apps, schema_editor):
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    Warehouse = apps.get_model('inventory', 'Warehouse')
+    InventoryItem.objects.filter(location='').update(location=None)
+    totals = InventoryItem.objects.filter(location__isnull=False).order_by().values('location').annotate(
+        item_count=Count('pk'), units=Sum('quantity'), critical_items=Count('pk', filter=Q(is_below_minimum=True)),
+    )
+    Warehouse.objects.bulk_create(
+        [
+            Warehouse(
+                name=row['location'], item_count=row['item_count'], units=row['units'] or 0,
+                critical_items=row['critical_items'],
+            )
+            for row in totals
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_inventoryitem_expiry_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Warehouse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('item_count', models.IntegerField(default=0, editable=False)),
+                ('units', models.BigIntegerField(default=0, editable=False)),
+                ('critical_items', models.IntegerField(default=0, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_warehouses, migrations.RunPython.noop),
+    ]
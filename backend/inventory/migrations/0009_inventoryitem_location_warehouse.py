@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_warehouse'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventoryitem',
+            name='location',
+            field=models.ForeignKey(blank=True, db_column='location', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='items', to='inventory.warehouse', to_field='name'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def adopt_sole_hospital(apps, schema_editor):
+    # Existing rows predate tenancy. With one hospital they are its rows; with several they
+    # stay unattached until assigned in the admin.
+    hospitals = list(apps.get_model('users', 'Hospital').objects.values_list('pk', flat=True)[:2])
+    if len(hospitals) == 1:
+        for name in ('Supplier', 'InventoryItem', 'StockTransaction'):
+            apps.get_model('inventory', name).objects.update(hospital_id=hospitals[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_hospital'),
+        ('inventory', '0009_inventoryitem_location_warehouse'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventoryitem',
+            name='item_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='inventoryitem',
+            name='item_below_minimum_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='inventoryitem',
+            name='item_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='inventoryitem',
+            name='item_expiry_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stocktransaction',
+            name='stocktxn_performed_idx',
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='inventory_items', to='users.hospital'),
+        ),
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_transactions', to='users.hospital'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='suppliers', to='users.hospital'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['hospital', 'name', 'id'], name='item_tenant_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('is_below_minimum', True)), fields=['hospital', 'id'], name='item_tenant_below_min_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('expiry_status', 'valid'), _negated=True), fields=['hospital', 'expiry_status', 'id'], name='item_tenant_expiry_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['hospital', 'updated_at'], name='item_tenant_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['hospital', '-performed_at', '-id'], name='stocktxn_tenant_performed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['hospital', 'name'], name='supplier_tenant_name_idx'),
+        ),
+        migrations.RunPython(adopt_sole_hospital, migrations.RunPython.noop),
+    ]
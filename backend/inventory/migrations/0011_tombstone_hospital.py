@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def adopt_sole_hospital(apps, schema_editor):
+    # As in 0010: with one hospital the existing tombstones are its deletions.
+    hospitals = list(apps.get_model('users', 'Hospital').objects.values_list('pk', flat=True)[:2])
+    if len(hospitals) == 1:
+        apps.get_model('inventory', 'Tombstone').objects.update(hospital_id=hospitals[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_hospital'),
+        ('inventory', '0010_hospital_tenancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tombstones', to='users.hospital'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['hospital', 'model', 'deleted_at'], name='tombstone_tenant_deleted_idx'),
+        ),
+        migrations.RunPython(adopt_sole_hospital, migrations.RunPython.noop),
+    ]
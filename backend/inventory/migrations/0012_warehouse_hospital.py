@@ -0,0 +1,83 @@
+import core.tenancy
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_warehouses(apps, schema_editor):
+    # Warehouses were shared by name across hospitals. Each hospital (or the unattached tenant) with
+    # items in one now gets a warehouse of its own, and the totals are counted again per copy.
+    # Warehouses no item uses go to the sole hospital, if there is just one.
+    Warehouse = apps.get_model('inventory', 'Warehouse')
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    hospitals = list(apps.get_model('users', 'Hospital').objects.values_list('pk', flat=True)[:2])
+    users = {}
+    for row in InventoryItem.objects.filter(location_id__isnull=False).values('hospital_id', 'location_id').order_by().annotate(
+        item_count=models.Count('pk'), units=models.Sum('quantity', default=0),
+        critical_items=models.Count('pk', filter=models.Q(is_below_minimum=True)),
+    ):
+        users.setdefault(row.pop('location_id'), []).append(row)
+    for warehouse in Warehouse.objects.order_by('pk'):
+        tenants = sorted(users.get(warehouse.name, []), key=lambda row: (row['hospital_id'] is not None, row['hospital_id'] or 0))
+        if not tenants:
+            Warehouse.objects.filter(pk=warehouse.pk).update(
+                hospital_id=hospitals[0] if len(hospitals) == 1 else None, item_count=0, units=0, critical_items=0,
+            )
+            continue
+        Warehouse.objects.filter(pk=warehouse.pk).update(**tenants[0])
+        Warehouse.objects.bulk_create(
+            Warehouse(name=warehouse.name, latitude=warehouse.latitude, longitude=warehouse.longitude, **row)
+            for row in tenants[1:]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_hospital'),
+        ('inventory', '0011_tombstone_hospital'),
+    ]
+
+    operations = [
+        # The column keeps the warehouse name; only the database foreign key to the name goes.
+        migrations.AlterField(
+            model_name='inventoryitem',
+            name='location',
+            field=models.CharField(blank=True, db_column='location', max_length=255, null=True),
+        ),
+        migrations.RenameField(
+            model_name='inventoryitem',
+            old_name='location',
+            new_name='location_id',
+        ),
+        migrations.AddField(
+            model_name='warehouse',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='warehouses', to='users.hospital'),
+        ),
+        migrations.AlterField(
+            model_name='warehouse',
+            name='name',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.RunPython(split_warehouses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='warehouse',
+            constraint=models.UniqueConstraint(fields=('hospital', 'name'), name='warehouse_hospital_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='warehouse',
+            constraint=models.UniqueConstraint(core.tenancy.TenantKey(), models.F('name'), name='warehouse_tenant_name_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['hospital', 'location_id'], name='item_tenant_location_idx'),
+        ),
+        # The relation has no column of its own; only the state gains it.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddField(
+                model_name='inventoryitem',
+                name='location',
+                field=models.ForeignObject(blank=True, from_fields=('hospital', 'location_id'), null=True, on_delete=django.db.models.deletion.PROTECT, related_name='items', to='inventory.warehouse', to_fields=('hospital', 'name')),
+            ),
+        ]),
+    ]
@@ -1,7 +1,13 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from core.tenancy import hospital_field, tenant_unique
+from .signals import StockCrossing, notify_crossings
 
 class Supplier(models.Model):
+    hospital = hospital_field('suppliers')
     name = models.CharField(max_length=255)
     contact_person = models.CharField(max_length=255, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
@@ -9,15 +15,64 @@ class Supplier(models.Model):
     address = models.TextField(blank=True, null=True)
     rating = models.IntegerField(default=3)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'name'], name='supplier_tenant_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class Warehouse(models.Model):
+    """A stock location of one hospital. Items reference it by hospital and name through ``InventoryItem.location``.
+
+    The totals are running aggregates over the items stored here, moved by the
+    stock ledger and item writes through ``inventory.warehouses.move_totals``.
+    """
+    hospital = hospital_field('warehouses')
+    name = models.CharField(max_length=255)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    item_count = models.IntegerField(default=0, editable=False)
+    units = models.BigIntegerField(default=0, editable=False)
+    critical_items = models.IntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Items' key. NULLs never conflict, so the unattached tenant needs the second one.
+            models.UniqueConstraint(fields=['hospital', 'name'], name='warehouse_hospital_name_uniq'),
+            tenant_unique('name', name='warehouse_tenant_name_uniq'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+EXPIRY_STATUS_CHOICES = [
+    ('valid', 'Valid'),
+    ('expiring_soon', 'Expiring soon'),
+    ('expired', 'Expired'),
+]
+EXPIRY_WARNING_DAYS = 30
+
+
+def expiry_bucket(expiry_date, today=None):
+    if not expiry_date:
+        return 'valid'
+    today = today or timezone.localdate()
+    if expiry_date < today:
+        return 'expired'
+    if expiry_date < today + timedelta(days=EXPIRY_WARNING_DAYS):
+        return 'expiring_soon'
+    return 'valid'
+
 class InventoryItem(models.Model):
     CATEGORY_CHOICES = [
         ('medicine', 'Medicine'),
         ('equipment', 'Equipment'),
         ('consumable', 'Consumable'),
     ]
+    hospital = hospital_field('inventory_items')
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     sku = models.CharField(max_length=100, unique=True)
@@ -29,11 +84,72 @@ class InventoryItem(models.Model):
     expiry_date = models.DateField(blank=True, null=True)
     batch_number = models.CharField(max_length=100, blank=True, null=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, related_name='items')
-    location = models.CharField(max_length=255, blank=True, null=True)
+    # The warehouse name, so the column and the values clients send stay plain names. With
+    # ``hospital`` it keys the item's warehouse; set it rather than assigning ``location``,
+    # which would overwrite ``hospital`` too.
+    location_id = models.CharField(max_length=255, blank=True, null=True, db_column='location')
+    location = models.ForeignObject(
+        Warehouse, from_fields=('hospital', 'location_id'), to_fields=('hospital', 'name'), on_delete=models.PROTECT,
+        blank=True, null=True, related_name='items',
+    )
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     last_restocked = models.DateField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized quantity < minimum_stock, maintained by save() and the stock ledger.
+    is_below_minimum = models.BooleanField(default=False, editable=False)
+    # Denormalized expiry bucket, set by save() and moved along by the nightly expiry sweep.
+    expiry_status = models.CharField(max_length=20, choices=EXPIRY_STATUS_CHOICES, default='valid', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'name', 'id'], name='item_tenant_name_idx'),
+            models.Index(fields=['hospital', 'id'], condition=models.Q(is_below_minimum=True), name='item_tenant_below_min_idx'),
+            # Walked across all tenants by the nightly expiry sweep.
+            models.Index(fields=['expiry_date', 'id'], condition=models.Q(expiry_date__isnull=False), name='item_expiry_idx'),
+            models.Index(
+                fields=['hospital', 'expiry_status', 'id'], condition=~models.Q(expiry_status='valid'),
+                name='item_tenant_expiry_status_idx',
+            ),
+            models.Index(fields=['hospital', 'updated_at'], name='item_tenant_updated_idx'),
+            models.Index(fields=['hospital', 'location_id'], name='item_tenant_location_idx'),
+        ]
+
+    # Fields pushed to live clients when they change.
+    LIVE_FIELDS = ('name', 'quantity', 'minimum_stock', 'is_below_minimum', 'expiry_date', 'expiry_status', 'location', 'unit_price')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._live_snapshot = instance.live_values(
+            name for name in cls.LIVE_FIELDS if cls.live_attname(name) in field_names
+        )
+        return instance
+
+    @classmethod
+    def live_attname(cls, name):
+        # ``location`` is read as the warehouse name rather than fetching the warehouse.
+        return 'location_id' if name == 'location' else cls._meta.get_field(name).attname
+
+    def live_values(self, names=LIVE_FIELDS):
+        return {name: getattr(self, self.live_attname(name)) for name in names}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'expiry_date' in update_fields:
+            self.expiry_status = expiry_bucket(self.expiry_date)
+        if update_fields is not None:
+            if 'expiry_date' in update_fields:
+                update_fields = kwargs['update_fields'] = {*update_fields, 'expiry_status'}
+            if not {'quantity', 'minimum_stock'} & set(update_fields):
+                return super().save(*args, **kwargs)
+            kwargs['update_fields'] = {*update_fields, 'is_below_minimum'}
+
+        was_below = None if self._state.adding else self.is_below_minimum
+        self.is_below_minimum = self.quantity < self.minimum_stock
+        super().save(*args, **kwargs)
+        if self.is_below_minimum != bool(was_below):
+            notify_crossings(type(self), [StockCrossing(self.pk, self.is_below_minimum, self.quantity, self.minimum_stock)])
 
     def __str__(self):
         return f"{self.name} ({self.sku})"
@@ -46,6 +162,7 @@ class StockTransaction(models.Model):
         ('transfer', 'Transfer'),
         ('expired', 'Expired'),
     ]
+    hospital = hospital_field('stock_transactions')
     inventory_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='transactions')
     transaction_type = models.CharField(max_length=50, choices=TRANSACTION_TYPES)
     quantity_change = models.IntegerField() # Negative for consumption
@@ -55,5 +172,31 @@ class StockTransaction(models.Model):
     performed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     performed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', '-performed_at', '-id'], name='stocktxn_tenant_performed_idx'),
+            models.Index(fields=['inventory_item', '-performed_at', '-id'], name='stocktxn_item_performed_idx'),
+        ]
+
     def __str__(self):
         return f"{self.inventory_item.name} - {self.transaction_type} ({self.quantity_change})"
+
+class Tombstone(models.Model):
+    """A deleted row, kept so delta (``?since=``) clients learn about deletions.
+
+    Carries the deleted row's hospital so each tenant only hears of its own.
+    """
+    hospital = hospital_field('tombstones')
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'model', 'deleted_at'], name='tombstone_tenant_deleted_idx'),
+            # Rollups read every hospital's deletions.
+            models.Index(fields=['model', 'deleted_at'], name='tombstone_model_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
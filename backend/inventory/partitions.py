@@ -0,0 +1,178 @@
+"""Monthly range partitions of the stock ledger on PostgreSQL.
+
+Partitioning is opt-in: ``manage.py ledger_partitions enable`` rebuilds
+``inventory_stocktransaction`` as a table partitioned by ``performed_at``
+month, with a default partition catching anything outside the monthly ones.
+Queries bounded by date then only scan the months they cover. Old months are
+archived by ``cold_ledger`` (``manage.py archive_ledger``), which keeps them
+readable through the ledger API and detaches and drops their partitions
+rather than deleting row by row. On other backends the ledger stays one
+table and everything here is a no-op.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import StockTransaction
+
+TABLE = StockTransaction._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+# Months created ahead of the current one, so inserts never fall into the default partition.
+PARTITIONS_AHEAD = 3
+
+
+def supported():
+    return connection.vendor == 'postgresql'
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y%m}'
+
+
+def month_start(month):
+    # Months are cut at midnight UTC, like the stored timestamps.
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _current_month(today=None):
+    return (today or timezone.now().date()).replace(day=1)
+
+
+def is_partitioned():
+    if not supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """``(name, month, estimated_rows)`` per partition in month order, ``month`` being None for the default one."""
+    if not supported():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, c.reltuples::bigint FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname',
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    found = []
+    for name, estimate in rows:
+        suffix = name[len(TABLE) + 1:]
+        month = date(int(suffix[:4]), int(suffix[4:]), 1) if suffix.isdigit() and len(suffix) == 6 else None
+        found.append((name, month, max(estimate, 0)))
+    return sorted(found, key=lambda row: (row[1] is None, row[1] or date.min))
+
+
+def enable_partitioning(ahead=PARTITIONS_AHEAD, today=None):
+    """Rebuild the ledger as a partitioned table, keeping its rows, ids, indexes and foreign keys.
+
+    Runs in one transaction holding an exclusive lock on the ledger, so writes
+    wait until it commits; plan it for a quiet window on large ledgers. The
+    primary key becomes ``(id, performed_at)``, as a partitioned table's unique
+    keys must include the partition key; ids stay unique through their sequence.
+    Returns the number of rows moved, or None when already partitioned.
+    """
+    if not supported() or is_partitioned():
+        return None
+    qn = connection.ops.quote_name
+    old = f'{TABLE}_unpartitioned'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        # Recreated under their current names once the old table is gone.
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s AND indexname NOT IN '
+            "(SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p')",
+            [TABLE, TABLE],
+        )
+        indexes = [definition for definition, in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT is_identity = 'YES', pg_get_serial_sequence(%s, 'id') FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'",
+            [TABLE, TABLE],
+        )
+        identity, sequence = cursor.fetchone()
+        cursor.execute(f'SELECT min(performed_at) FROM {qn(TABLE)}')
+        first, = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}')
+        cursor.execute(
+            f'CREATE TABLE {qn(TABLE)} (LIKE {qn(old)} INCLUDING DEFAULTS{" INCLUDING IDENTITY" if identity else ""}) '
+            f'PARTITION BY RANGE (performed_at)'
+        )
+        month = _current_month(first.date() if first else today)
+        while month <= add_months(_current_month(today), ahead):
+            _create_partition(cursor, month, attach=False)
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {qn(DEFAULT_PARTITION)} PARTITION OF {qn(TABLE)} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}')
+        moved = cursor.rowcount
+        if identity:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {qn(TABLE)}", [TABLE],
+            )
+        elif sequence:
+            # A serial column's sequence is owned by the old table and would go with it.
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+        cursor.execute(f'DROP TABLE {qn(old)}')
+        if sequence and not identity:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {qn(TABLE)}.id')
+
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(TABLE + "_pkey")} PRIMARY KEY (id, performed_at)')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(name)} {definition}')
+    return moved
+
+
+def _create_partition(cursor, month, attach=True):
+    qn = connection.ops.quote_name
+    name, lower, upper = partition_name(month), month_start(month), month_start(add_months(month, 1))
+    if not attach:
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} FOR VALUES FROM (%s) TO (%s)', [lower, upper],
+        )
+        return
+    # Rows for the month that landed in the default partition move over before the month is attached.
+    cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(TABLE)} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)} WHERE performed_at >= %s AND performed_at < %s RETURNING *) '
+        f'INSERT INTO {qn(name)} SELECT * FROM moved',
+        [lower, upper],
+    )
+    cursor.execute(f'ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+
+
+def ensure_partitions(ahead=PARTITIONS_AHEAD, today=None):
+    """Create the partitions for this month and ``ahead`` more that do not exist yet. Returns their names."""
+    if not is_partitioned():
+        return []
+    existing = {month for _, month, _ in partitions() if month}
+    current = _current_month(today)
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month in (add_months(current, n) for n in range(ahead + 1)):
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def explain_pruning(queryset):
+    """The plan for ``queryset`` and the names of the partitions it scans."""
+    plan = queryset.explain()
+    return plan, [name for name, _, _ in partitions() if name in plan]
@@ -0,0 +1,72 @@
+import hashlib
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils.text import slugify
+
+def group_name(kind, value):
+    # Group names are limited to 100 ASCII alphanumerics, hyphens, underscores and periods.
+    slug = slugify(value or '')[:60] or 'none'
+    if slug != value:
+        slug = f'{slug}-{hashlib.md5((value or "").encode()).hexdigest()[:8]}'
+    return f'{kind}.{slug}'
+
+
+def hospital_group(hospital_id):
+    # Rows without a hospital go to users without one, as in ``core.tenancy.for_tenant``.
+    return f'hospital.{hospital_id if hospital_id is not None else "none"}'
+
+
+def warehouse_group(hospital_id):
+    # Clients showing their hospital's warehouse totals opt in to them; item diffs never go here.
+    return f'warehouses.{hospital_id if hospital_id is not None else "none"}'
+
+
+def location_group(hospital_id, location):
+    return group_name(f'{hospital_group(hospital_id)}.location', location)
+
+
+def publish(groups, payload):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for group in groups:
+        async_to_sync(layer.group_send)(group, {'type': 'inventory.diff', 'payload': payload})
+
+
+def publish_item_changes(changes):
+    """Send compact per-item diffs after commit.
+
+    ``changes`` is a list of ``(item_id, location, hospital_id, fields)``.
+    Rows only reach the item's hospital: clients subscribed to its location get
+    that location's rows, the rest of the hospital's clients get them all.
+    """
+    if not changes:
+        return
+
+    def send():
+        by_group = {}
+        for item_id, location, hospital_id, fields in changes:
+            row = {'id': item_id, **fields}
+            by_group.setdefault(hospital_group(hospital_id), []).append(row)
+            by_group.setdefault(location_group(hospital_id, location), []).append(row)
+        for group, rows in by_group.items():
+            publish([group], {'type': 'INVENTORY_DIFF', 'items': rows})
+
+    transaction.on_commit(send)
+
+
+def publish_item_deleted(item_id, location, hospital_id):
+    groups = [hospital_group(hospital_id), location_group(hospital_id, location)]
+    transaction.on_commit(lambda: publish(groups, {'type': 'INVENTORY_DELETED', 'id': item_id}))
+
+
+def publish_warehouse_stats(rows):
+    """Send warehouses' new live totals, ``{hospital_id: rows}``, after commit to that hospital's clients watching them."""
+    def send():
+        for hospital_id, warehouses in rows.items():
+            publish([warehouse_group(hospital_id)], {'type': 'WAREHOUSE_STATS', 'warehouses': warehouses})
+
+    if rows:
+        transaction.on_commit(send)
@@ -1,30 +1,41 @@
 from rest_framework import serializers
-from .models import InventoryItem, Supplier, StockTransaction
+from core.tenancy import TenantRelatedMixin
+from .models import InventoryItem, Supplier, StockTransaction, Warehouse
 
 class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
+        read_only_fields = ['hospital']
 
-class InventoryItemSerializer(serializers.ModelSerializer):
+class WarehouseNameField(serializers.Field):
+    """A warehouse of the requesting user's hospital, by name. Naming one that does not exist yet creates it."""
+
+    def __init__(self, **kwargs):
+        # The item's key already holds the name; the warehouse is never fetched.
+        super().__init__(source='location_id', allow_null=True, required=False, **kwargs)
+
+    def to_representation(self, value):
+        return value
+
+    def to_internal_value(self, data):
+        name = str(data).strip()
+        if len(name) > Warehouse._meta.get_field('name').max_length:
+            raise serializers.ValidationError('Warehouse names are at most 255 characters.')
+        if not name:
+            return None
+        Warehouse.objects.get_or_create(hospital_id=self.context.get('tenant_id'), name=name)
+        return name
+
+class InventoryItemSerializer(TenantRelatedMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
-    expiry_status = serializers.SerializerMethodField()
-    
+    location = WarehouseNameField()
+    tenant_related_fields = ('supplier',)
+
     class Meta:
         model = InventoryItem
-        fields = '__all__'
-    
-    def get_expiry_status(self, obj):
-        from django.utils import timezone
-        from datetime import timedelta
-        if not obj.expiry_date:
-            return 'valid'
-        today = timezone.now().date()
-        if obj.expiry_date < today:
-            return 'expired'
-        elif obj.expiry_date < today + timedelta(days=30):
-            return 'expiring_soon'
-        return 'valid'
+        exclude = ['location_id']
+        read_only_fields = ['hospital']
 
 class StockTransactionSerializer(serializers.ModelSerializer):
     performed_by_name = serializers.CharField(source='performed_by.username', read_only=True)
@@ -33,4 +44,10 @@ class StockTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockTransaction
         fields = '__all__'
-        read_only_fields = ['performed_at', 'previous_quantity', 'new_quantity']
+        read_only_fields = ['hospital', 'performed_at', 'previous_quantity', 'new_quantity']
+
+class StockMovementSerializer(serializers.Serializer):
+    item = serializers.IntegerField()
+    quantity_change = serializers.IntegerField()
+    transaction_type = serializers.ChoiceField(choices=StockTransaction.TRANSACTION_TYPES, default='adjust')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
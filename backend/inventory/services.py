@@ -0,0 +1,267 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from core.bulk import update_rows
+from core.cache import invalidate
+from .models import EXPIRY_WARNING_DAYS, InventoryItem, StockTransaction, expiry_bucket
+from .realtime import publish_item_changes
+from .signals import ExpiryState, StockCrossing, expiry_swept, notify_crossings, notify_moves
+from .warehouses import move_totals
+
+
+# Item fields a stock receipt may stamp alongside the quantity.
+RECEIPT_FIELDS = ('batch_number', 'expiry_date', 'expiry_status', 'last_restocked')
+
+
+class StockError(Exception):
+    pass
+
+
+class InsufficientStock(StockError):
+    pass
+
+
+def _apply_delta(item_id, quantity_change, allow_negative):
+    table = connection.ops.quote_name(InventoryItem._meta.db_table)
+    # SET expressions see the pre-update row, so the flag is computed from the new quantity.
+    sql = (
+        f'UPDATE {table} SET quantity = quantity + %s, is_below_minimum = (quantity + %s < minimum_stock), '
+        f'updated_at = %s WHERE id = %s'
+    )
+    params = [quantity_change, quantity_change, connection.ops.adapt_datetimefield_value(timezone.now()), item_id]
+    if not allow_negative:
+        sql += ' AND quantity + %s >= 0'
+        params.append(quantity_change)
+    sql += ' RETURNING quantity, minimum_stock, location, hospital_id'
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def adjust_stock(item_id, quantity_change, transaction_type='adjust', notes='', user=None, allow_negative=True):
+    """Apply a stock delta atomically and record it in the ledger.
+
+    The delta is applied with a single conditional ``UPDATE ... RETURNING`` so
+    concurrent callers never lose updates and the new quantity needs no re-read.
+    """
+    quantity_change = int(quantity_change)
+    with transaction.atomic():
+        row = _apply_delta(item_id, quantity_change, allow_negative)
+        if row is None:
+            if not InventoryItem.objects.filter(pk=item_id).exists():
+                raise InventoryItem.DoesNotExist(f'Inventory item {item_id} does not exist')
+            raise InsufficientStock(f'Insufficient stock for item {item_id}')
+
+        new_quantity, minimum_stock, location, hospital_id = row
+        below = new_quantity < minimum_stock
+        was_below = new_quantity - quantity_change < minimum_stock
+        if was_below != below:
+            notify_crossings(InventoryItem, [StockCrossing(item_id, below, new_quantity, minimum_stock)])
+        publish_item_changes([(item_id, location, hospital_id, {'quantity': new_quantity, 'is_below_minimum': below})])
+        move_totals([(hospital_id, location, 0, quantity_change, below - was_below)])
+        invalidate(InventoryItem)
+        txn = StockTransaction.objects.create(
+            hospital_id=hospital_id,
+            inventory_item_id=item_id,
+            transaction_type=transaction_type,
+            quantity_change=quantity_change,
+            previous_quantity=new_quantity - quantity_change,
+            new_quantity=new_quantity,
+            notes=notes,
+            performed_by=user,
+        )
+        notify_moves(InventoryItem, [txn])
+        return txn
+
+
+def bulk_adjust_stock(movements, user=None, allow_negative=False, items=None):
+    """Apply many stock movements in one transaction.
+
+    Rows are locked in primary-key order so concurrent batches cannot deadlock,
+    quantities are written with one ``update_rows`` and the ledger with one
+    ``bulk_create``. A movement may also carry ``batch_number`` and
+    ``expiry_date`` to stamp on the item, and restocks set ``last_restocked``.
+    ``items`` limits the movements to those inventory items, e.g. one
+    hospital's; others fail as missing. Returns a result dict per movement,
+    in input order.
+    """
+    item_ids = sorted({m['item'] for m in movements})
+    results = []
+    ledger = []
+    touched = {}
+    stamped = set()
+
+    with transaction.atomic():
+        items = {
+            item.pk: item
+            for item in (InventoryItem.objects if items is None else items).select_for_update().filter(pk__in=item_ids)
+            .order_by('pk').only('id', 'hospital', 'quantity', 'minimum_stock', 'is_below_minimum', 'location_id', *RECEIPT_FIELDS)
+        }
+        initially = {pk: (item.quantity, item.is_below_minimum) for pk, item in items.items()}
+        for index, movement in enumerate(movements):
+            item = items.get(movement['item'])
+            result = {'index': index, 'item': movement['item']}
+            if item is None:
+                result.update(status='error', error='Inventory item does not exist')
+            elif not allow_negative and item.quantity + movement['quantity_change'] < 0:
+                result.update(status='error', error='Insufficient stock')
+            else:
+                previous_quantity = item.quantity
+                item.quantity += movement['quantity_change']
+                for field in ('batch_number', 'expiry_date'):
+                    if movement.get(field) is not None:
+                        setattr(item, field, movement[field])
+                        stamped.add(item.pk)
+                item.expiry_status = expiry_bucket(item.expiry_date)
+                if movement.get('transaction_type') == 'restock':
+                    item.last_restocked = timezone.localdate()
+                touched[item.pk] = item
+                ledger.append(StockTransaction(
+                    hospital_id=item.hospital_id,
+                    inventory_item_id=item.pk,
+                    transaction_type=movement.get('transaction_type', 'adjust'),
+                    quantity_change=movement['quantity_change'],
+                    previous_quantity=previous_quantity,
+                    new_quantity=item.quantity,
+                    notes=movement.get('notes', ''),
+                    performed_by=user,
+                ))
+                result.update(status='ok', previous_quantity=previous_quantity, new_quantity=item.quantity)
+            results.append(result)
+
+        now = timezone.now()
+        crossings = []
+        for item in touched.values():
+            item.updated_at = now
+            item.is_below_minimum = item.quantity < item.minimum_stock
+            if item.is_below_minimum != initially[item.pk][1]:
+                crossings.append(StockCrossing(item.pk, item.is_below_minimum, item.quantity, item.minimum_stock))
+        update_rows(InventoryItem, touched.values(), ['quantity', 'is_below_minimum', 'updated_at', *RECEIPT_FIELDS])
+        StockTransaction.objects.bulk_create(ledger, batch_size=500)
+        notify_moves(InventoryItem, ledger)
+        notify_crossings(InventoryItem, crossings)
+        move_totals([
+            (item.hospital_id, item.location_id, 0, item.quantity - initially[item.pk][0], item.is_below_minimum - initially[item.pk][1])
+            for item in touched.values()
+        ])
+        publish_item_changes([
+            (item.pk, item.location_id, item.hospital_id, {
+                'quantity': item.quantity, 'is_below_minimum': item.is_below_minimum,
+                **({'expiry_date': item.expiry_date, 'expiry_status': item.expiry_status} if item.pk in stamped else {}),
+            })
+            for item in touched.values()
+        ])
+        if touched:
+            invalidate(InventoryItem)
+
+    return results
+
+
+def recompute_low_stock():
+    """Repair ``is_below_minimum`` on rows written without going through the model or the ledger.
+
+    Drifted rows are corrected with two set-based UPDATEs, and each correction
+    is reported as a threshold crossing so alerts and live clients catch up.
+    Returns the number of rows fixed.
+    """
+    should_be_below = Q(is_below_minimum=False, quantity__lt=F('minimum_stock'))
+    should_be_above = Q(is_below_minimum=True, quantity__gte=F('minimum_stock'))
+    with transaction.atomic():
+        drifted = list(
+            InventoryItem.objects.select_for_update().filter(should_be_below | should_be_above)
+            .values_list('pk', 'quantity', 'minimum_stock', 'location_id', 'hospital')
+        )
+        if not drifted:
+            return 0
+        now = timezone.now()
+        InventoryItem.objects.filter(should_be_below).update(is_below_minimum=True, updated_at=now)
+        InventoryItem.objects.filter(should_be_above).update(is_below_minimum=False, updated_at=now)
+        notify_crossings(InventoryItem, [StockCrossing(pk, quantity < minimum, quantity, minimum) for pk, quantity, minimum, _, _ in drifted])
+        publish_item_changes([
+            (pk, location, hospital_id, {'is_below_minimum': quantity < minimum}) for pk, quantity, minimum, location, hospital_id in drifted
+        ])
+        move_totals([
+            (hospital_id, location, 0, 0, 1 if quantity < minimum else -1) for _, quantity, minimum, location, hospital_id in drifted
+        ])
+        invalidate(InventoryItem)
+    return len(drifted)
+
+
+def sweep_expiry(chunk_size=2000, write_off=True, today=None):
+    """Move items between expiry buckets and write off stock that has just expired.
+
+    Walks ``item_expiry_idx`` in ``(expiry_date, id)`` order up to the warning
+    horizon, one locked chunk per transaction, so memory and lock time stay
+    bounded by ``chunk_size`` however large the catalogue is. Items already
+    stored as expired for longer than the warning period can no longer change
+    bucket and are left out. Newly expired stock is zeroed with ``expired``
+    ledger rows, and ``expiry_swept`` reports every item in the window after
+    each chunk commits. Returns counts.
+    """
+    today = today or timezone.localdate()
+    horizon = today + timedelta(days=EXPIRY_WARNING_DAYS)
+    stats = Counter()
+
+    # Dates cleared or pushed out of the window by writes that skipped save().
+    stats['reclassified'] = InventoryItem.objects.exclude(expiry_status='valid').filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=horizon)
+    ).update(expiry_status='valid', updated_at=timezone.now())
+    if stats['reclassified']:
+        invalidate(InventoryItem)
+
+    settled = Q(expiry_status='expired', expiry_date__lt=today - timedelta(days=EXPIRY_WARNING_DAYS))
+    window = InventoryItem.objects.filter(expiry_date__isnull=False, expiry_date__lt=horizon).exclude(settled).order_by('expiry_date', 'pk')
+    last = None
+    while True:
+        rows = window
+        if last is not None:
+            rows = rows.filter(expiry_date__gte=last[0]).filter(Q(expiry_date__gt=last[0]) | Q(expiry_date=last[0], pk__gt=last[1]))
+        with transaction.atomic():
+            chunk = list(rows.select_for_update().values_list(
+                'pk', 'name', 'quantity', 'location_id', 'expiry_date', 'expiry_status', 'hospital_id',
+            )[:chunk_size])
+            if not chunk:
+                break
+            _sweep_chunk(chunk, today, write_off, stats)
+        last = chunk[-1][4], chunk[-1][0]
+        if len(chunk) < chunk_size:
+            break
+    return dict(stats)
+
+
+def _sweep_chunk(chunk, today, write_off, stats):
+    moved = {}
+    changes = []
+    write_offs = []
+    states = []
+    for pk, name, quantity, location, expiry_date, status, hospital_id in chunk:
+        bucket = expiry_bucket(expiry_date, today)
+        stats['scanned'] += 1
+        states.append(ExpiryState(pk, name, bucket, expiry_date, hospital_id))
+        if bucket == status:
+            continue
+        moved.setdefault(bucket, []).append(pk)
+        changes.append((pk, location, hospital_id, {'expiry_status': bucket}))
+        if bucket == 'expired' and write_off and quantity > 0:
+            write_offs.append({
+                'item': pk,
+                'quantity_change': -quantity,
+                'transaction_type': 'expired',
+                'notes': f'Expired on {expiry_date:%Y-%m-%d}',
+            })
+
+    if write_offs:
+        results = bulk_adjust_stock(write_offs, allow_negative=True)
+        stats['written_off'] += sum(result['status'] == 'ok' for result in results)
+    # After the write-offs, which bucket against the real date rather than ``today``.
+    now = timezone.now()
+    for bucket, ids in moved.items():
+        stats[bucket] += InventoryItem.objects.filter(pk__in=ids).update(expiry_status=bucket, updated_at=now)
+    if moved:
+        publish_item_changes(changes)
+        invalidate(InventoryItem)
+    transaction.on_commit(lambda: expiry_swept.send(sender=InventoryItem, items=states, today=today))
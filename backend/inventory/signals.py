@@ -0,0 +1,94 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from core import metrics
+from core.cache import invalidate_on_change
+
+from . import realtime
+
+StockCrossing = namedtuple('StockCrossing', 'item_id below quantity minimum_stock')
+ExpiryState = namedtuple('ExpiryState', 'item_id name status expiry_date hospital_id', defaults=(None,))
+
+# Sent after commit with a list of StockCrossing for every item whose quantity
+# moved across minimum_stock, in either direction.
+stock_threshold_crossed = Signal()
+
+# Sent after each committed chunk of the expiry sweep with an ExpiryState for
+# every item in it that is expiring soon or expired, and the sweep's ``today``.
+# Items stay in the window for a while after their bucket last changed, so
+# receivers must not act on every item every night.
+expiry_swept = Signal()
+
+# Sent after commit with the StockTransaction rows each ledger write created.
+stock_moved = Signal()
+
+invalidate_on_change('inventory.InventoryItem', 'inventory.Supplier')
+
+# Live fields that feed the warehouse totals, in ``warehouses.item_totals`` order after the hospital.
+TOTAL_FIELDS = ('location', 'quantity', 'is_below_minimum')
+
+
+def notify_crossings(sender, crossings):
+    if crossings:
+        transaction.on_commit(lambda: stock_threshold_crossed.send(sender=sender, crossings=crossings))
+
+
+def notify_moves(sender, transactions):
+    if transactions:
+        transaction.on_commit(lambda: stock_moved.send(sender=sender, transactions=transactions))
+
+
+@receiver(stock_moved)
+def count_stock_moves(sender, transactions, **kwargs):
+    by_hospital = {}
+    for t in transactions:
+        by_hospital.setdefault(t.hospital_id, []).append(t)
+    for hospital_id, moves in by_hospital.items():
+        metrics.record('stock_moves', len(moves), hospital_id=hospital_id)
+        stock_outs = sum(1 for t in moves if t.new_quantity <= 0 < t.previous_quantity)
+        if stock_outs:
+            metrics.record('stock_outs', stock_outs, hospital_id=hospital_id)
+        write_offs = sum(1 for t in moves if t.transaction_type == 'expired')
+        if write_offs:
+            metrics.record('expired_write_offs', write_offs, hospital_id=hospital_id)
+
+
+@receiver(post_save, sender='inventory.InventoryItem')
+def publish_item_save(sender, instance, created, update_fields=None, **kwargs):
+    from .warehouses import item_totals, move_totals
+
+    snapshot = getattr(instance, '_live_snapshot', None)
+    names = sender.LIVE_FIELDS if update_fields is None else [f for f in sender.LIVE_FIELDS if sender.live_attname(f) in update_fields]
+    current = instance.live_values(names)
+    if created:
+        move_totals([item_totals(instance.hospital_id, instance.location_id, instance.quantity, instance.is_below_minimum)])
+    elif snapshot is not None:
+        current = {name: value for name, value in current.items() if snapshot.get(name, current) != value}
+        if current.keys() & set(TOTAL_FIELDS) and snapshot.keys() >= set(TOTAL_FIELDS):
+            after = {**snapshot, **current}
+            move_totals([
+                item_totals(instance.hospital_id, *(snapshot[name] for name in TOTAL_FIELDS), sign=-1),
+                item_totals(instance.hospital_id, *(after[name] for name in TOTAL_FIELDS)),
+            ])
+        snapshot.update(current)
+    if current:
+        realtime.publish_item_changes([(instance.pk, instance.location_id, instance.hospital_id, current)])
+
+
+def record_tombstone(sender, instance, **kwargs):
+    from .models import Tombstone
+    Tombstone.objects.create(model=sender._meta.label, object_id=instance.pk, hospital_id=getattr(instance, 'hospital_id', None))
+
+
+post_delete.connect(record_tombstone, sender='inventory.InventoryItem', dispatch_uid='tombstone:inventory.InventoryItem')
+
+
+@receiver(post_delete, sender='inventory.InventoryItem')
+def publish_item_delete(sender, instance, **kwargs):
+    from .warehouses import item_totals, move_totals
+
+    move_totals([item_totals(instance.hospital_id, instance.location_id, instance.quantity, instance.is_below_minimum, sign=-1)])
+    realtime.publish_item_deleted(instance.pk, instance.location_id, instance.hospital_id)
@@ -0,0 +1,23 @@
+from celery import shared_task
+
+from . import partitions, services, warehouses
+
+
+@shared_task
+def recompute_low_stock():
+    return services.recompute_low_stock()
+
+
+@shared_task
+def sweep_expiry(chunk_size=2000):
+    return services.sweep_expiry(chunk_size=chunk_size)
+
+
+@shared_task
+def rebuild_warehouse_totals():
+    return warehouses.rebuild_warehouse_totals()
+
+
+@shared_task
+def ensure_ledger_partitions():
+    return partitions.ensure_partitions()
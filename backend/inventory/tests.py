@@ -1,3 +1,952 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import itertools
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels import DEFAULT_CHANNEL_LAYER
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import cache, metrics
+from core.celery import job_stats
+from core.consumers import InventoryConsumer
+from core.socket_auth import TokenAuthMiddlewareStack
+from core.export import EXPORT_CHUNK_SIZE
+from core.testing import EagerTasksMixin, QueryBudgetMixin
+from users.models import Hospital, User
+from . import cold_ledger, partitions
+from .models import InventoryItem, Supplier, StockTransaction, Warehouse
+from .realtime import hospital_group
+from .services import adjust_stock, bulk_adjust_stock, InsufficientStock
+from .signals import stock_threshold_crossed
+from .tasks import recompute_low_stock, sweep_expiry
+from .warehouses import rebuild_warehouse_totals
+
+
+def make_item(**kwargs):
+    defaults = {'name': 'Saline', 'sku': 'SAL-001', 'category': 'consumable', 'unit': 'pcs', 'quantity': 10}
+    defaults.update(kwargs)
+    return InventoryItem.objects.create(**defaults)
+
+
+def live_socket(user):
+    communicator = WebsocketCommunicator(InventoryConsumer.as_asgi(), '/ws/live/')
+    communicator.scope['user'] = user
+    return communicator
+
+
+class AdjustStockServiceTests(TestCase):
+    def setUp(self):
+        self.item = make_item()
+
+    def test_applies_delta_and_records_transaction(self):
+        txn = adjust_stock(self.item.pk, -4, transaction_type='consume', notes='ward 3')
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 6)
+        self.assertEqual((txn.previous_quantity, txn.new_quantity, txn.quantity_change), (10, 6, -4))
+        self.assertEqual(StockTransaction.objects.get().notes, 'ward 3')
+
+    def test_non_negative_guard(self):
+        with self.assertRaises(InsufficientStock):
+            adjust_stock(self.item.pk, -11, allow_negative=False)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_missing_item(self):
+        with self.assertRaises(InventoryItem.DoesNotExist):
+            adjust_stock(self.item.pk + 1, 1)
+
+
+class LowStockFlagTests(TestCase):
+    def setUp(self):
+        self.item = make_item(quantity=12, minimum_stock=10)
+
+    def test_save_maintains_flag(self):
+        self.assertFalse(self.item.is_below_minimum)
+        self.item.minimum_stock = 20
+        self.item.save(update_fields=['minimum_stock'])
+        self.assertTrue(InventoryItem.objects.get().is_below_minimum)
+
+    def test_ledger_maintains_flag_and_reports_crossings(self):
+        crossings = []
+
+        def receiver(sender, **kwargs):
+            crossings.extend(kwargs['crossings'])
+
+        stock_threshold_crossed.connect(receiver)
+        self.addCleanup(stock_threshold_crossed.disconnect, receiver)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(self.item.pk, -1)
+        self.assertEqual(crossings, [])
+        self.assertFalse(InventoryItem.objects.get().is_below_minimum)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(self.item.pk, -5)
+        self.assertEqual([c.below for c in crossings], [True])
+        self.assertTrue(InventoryItem.objects.get().is_below_minimum)
+
+        bulk_adjust_stock([{'item': self.item.pk, 'quantity_change': 10}])
+        self.assertFalse(InventoryItem.objects.get().is_below_minimum)
+
+
+class RecomputeLowStockTests(EagerTasksMixin, TestCase):
+    def test_repairs_flags_written_behind_the_models_back(self):
+        drifted = make_item(quantity=50, minimum_stock=10)
+        make_item(sku='OK-001', quantity=50, minimum_stock=10)
+        InventoryItem.objects.filter(pk=drifted.pk).update(quantity=2)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(recompute_low_stock.delay().get(), 1)
+        self.assertTrue(InventoryItem.objects.get(pk=drifted.pk).is_below_minimum)
+        self.assertTrue(callbacks)
+        self.assertEqual(recompute_low_stock.delay().get(), 0)
+
+class ExpirySweepTests(EagerTasksMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='pharmacist', password='pw')
+        self.client.force_authenticate(self.user)
+
+    def test_sweep_walks_the_window_in_chunks(self):
+        today = timezone.localdate()
+        for i, days in enumerate([-3, -1, 0, 3, 12, 29, 30, 400]):
+            make_item(sku=f'EXP-{i}', expiry_date=today + timedelta(days=days), quantity=0)
+        stale = make_item(sku='STALE', expiry_date=today + timedelta(days=2))
+        InventoryItem.objects.filter(pk=stale.pk).update(expiry_date=today + timedelta(days=200))
+        # Buckets assigned yesterday, as if the sweep had not run since.
+        InventoryItem.objects.exclude(pk=stale.pk).update(expiry_status='valid')
+
+        runs = (job_stats()['inventory.tasks.sweep_expiry'] or {}).get('runs', 0)
+        stats = sweep_expiry.delay(chunk_size=2).get()
+        self.assertEqual(
+            stats, {'reclassified': 1, 'scanned': 6, 'expired': 2, 'expiring_soon': 4},
+        )
+        self.assertEqual(job_stats()['inventory.tasks.sweep_expiry']['runs'], runs + 1)
+
+        expired = self.client.get('/api/inventory/', {'expiry_status': 'expired'}).json()
+        self.assertEqual(sorted(row['sku'] for row in expired), ['EXP-0', 'EXP-1'])
+        self.assertEqual(self.client.get('/api/inventory/', {'expiry_status': 'soon'}).status_code, 400)
+
+    def test_save_and_receipts_keep_the_bucket_current(self):
+        item = make_item(expiry_date=timezone.localdate() + timedelta(days=3))
+        self.assertEqual(item.expiry_status, 'expiring_soon')
+        item.expiry_date = None
+        item.save(update_fields=['expiry_date'])
+        self.assertEqual(InventoryItem.objects.get(pk=item.pk).expiry_status, 'valid')
+
+        bulk_adjust_stock([{'item': item.pk, 'quantity_change': 5, 'transaction_type': 'restock', 'expiry_date': timezone.localdate()}])
+        self.assertEqual(InventoryItem.objects.get(pk=item.pk).expiry_status, 'expiring_soon')
+
+class AdjustStockEndpointTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='nurse', password='pw')
+        self.client.force_authenticate(self.user)
+        self.item = make_item()
+
+    def test_adjust_stock(self):
+        response = self.client.post(f'/api/inventory/{self.item.pk}/adjust_stock/', {'quantity_change': 5, 'transaction_type': 'restock'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 15)
+        self.assertEqual(StockTransaction.objects.get().performed_by, self.user)
+
+    def test_rejects_overdraw(self):
+        response = self.client.post(f'/api/inventory/{self.item.pk}/adjust_stock/', {'quantity_change': -20})
+
+        self.assertEqual(response.status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+
+    def test_rejects_unknown_transaction_type(self):
+        response = self.client.post(f'/api/inventory/{self.item.pk}/adjust_stock/', {'quantity_change': 5, 'transaction_type': 'gift'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_low_stock_reads_flag(self):
+        make_item(sku='GLV-001', quantity=2, minimum_stock=5)
+        response = self.client.get('/api/inventory/low_stock/')
+        self.assertEqual([row['sku'] for row in response.data], ['GLV-001'])
+
+    def test_bulk_adjust(self):
+        other = make_item(sku='GLV-001', quantity=3)
+        movements = [
+            {'item': self.item.pk, 'quantity_change': -2, 'transaction_type': 'consume'},
+            {'item': other.pk, 'quantity_change': -5},
+            {'item': self.item.pk, 'quantity_change': 4, 'transaction_type': 'restock', 'notes': 'delivery'},
+            {'item': 9999, 'quantity_change': 1},
+        ]
+        response = self.client.post('/api/inventory/bulk_adjust/', {'movements': movements}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['applied'], response.data['failed']), (2, 2))
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'error', 'ok', 'error'])
+        self.assertEqual(response.data['results'][2]['new_quantity'], 12)
+        self.item.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.item.quantity, other.quantity), (12, 3))
+        self.assertEqual(
+            list(StockTransaction.objects.order_by('id').values_list('previous_quantity', 'new_quantity')),
+            [(10, 8), (8, 12)],
+        )
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='pw')
+        self.client.force_authenticate(self.user)
+        self.item = make_item(name='Saline <0.9%> & water', unit_price='2.50')
+        bulk_adjust_stock(
+            [{'item': self.item.pk, 'quantity_change': 1, 'transaction_type': 'restock'}] * (EXPORT_CHUNK_SIZE + 5),
+            user=self.user,
+        )
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_ledger_csv_streams_every_row_gzipped_on_request(self):
+        response = self.client.get('/api/transactions/export/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual((response['Content-Encoding'], response['Content-Type']), ('gzip', 'text/csv; charset=utf-8'))
+        self.assertIn('ledger.csv', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(gzip.decompress(self.read(response)).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'performed_at', 'item_id'])
+        self.assertEqual(len(rows), EXPORT_CHUNK_SIZE + 6)
+        self.assertEqual(rows[1][-2:], ['auditor', ''])
+
+        plain = self.client.get('/api/transactions/export/', {'type': 'consume'})
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(self.read(plain).decode().splitlines()[1:], [])
+
+    def test_csv_cells_are_not_formulas(self):
+        make_item(sku='EVIL-1', name='=HYPERLINK("http://example.com")', unit='-pcs')
+        response = self.client.get('/api/inventory/export/')
+        rows = {row['sku']: row for row in csv.DictReader(io.StringIO(self.read(response).decode()))}
+        self.assertEqual((rows['EVIL-1']['name'], rows['EVIL-1']['unit']), ('\'=HYPERLINK("http://example.com")', "'-pcs"))
+
+    def test_inventory_xlsx(self):
+        response = self.client.get('/api/inventory/export/', {'format': 'xlsx'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        with zipfile.ZipFile(io.BytesIO(self.read(response))) as workbook:
+            self.assertIn('xl/workbook.xml', workbook.namelist())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('Saline &lt;0.9%&gt; &amp; water', sheet)
+        self.assertIn(f'<c><v>{EXPORT_CHUNK_SIZE + 15}</v></c>', sheet)
+        self.assertEqual(sheet.count('<row>'), 2)
+
+    def test_errors_are_reported_before_streaming(self):
+        response = self.client.get('/api/inventory/export/', {'expiry_status': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'expiry_status', response.content)
+
+
+class AsyncExportTests(TestCase):
+    async def test_asgi_export_streams_asynchronously(self):
+        user = await sync_to_async(User.objects.create_user)(username='auditor', password='pw')
+        await sync_to_async(make_item)()
+        # AsyncClient on this Django version only sends headers passed as raw ASGI headers.
+        response = await AsyncClient().request(
+            method='GET', path='/api/inventory/export/', query_string='',
+            headers=[(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body.decode().splitlines()[1].split(',')[1], 'SAL-001')
+
+class ImportTests(APITestCase):
+    CSV = (
+        'sku,name,category,unit,supplier,minimum_stock,quantity,expiry_date\n'
+        'SAL-001,,,,MedCo ,5,4,\n'
+        'GLV-001,Gloves,consumable,box,medco,20,100,2030-01-01\n'
+        'BAD-001,Bad,widget,box,,,-1,someday\n'
+        'NEW-002,,,,,,,\n'
+        'GLV-001,Gloves again,consumable,box,,,,\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='onboarding', password='pw')
+        self.client.force_authenticate(self.user)
+        self.item = make_item(minimum_stock=10)
+
+    def upload(self, content, **data):
+        return self.client.post(
+            '/api/inventory/import/', {'file': SimpleUploadedFile('items.csv', content.encode()), **data}, format='multipart',
+        )
+
+    def test_upserts_on_sku_and_books_stock_counts(self):
+        response = self.upload(self.CSV)
+        self.assertEqual(response.status_code, 200, response.data)
+        report = response.data
+        self.assertEqual(
+            {key: report[key] for key in ('rows', 'created', 'updated', 'adjusted', 'suppliers_created', 'error_count')},
+            {'rows': 5, 'created': 1, 'updated': 1, 'adjusted': 2, 'suppliers_created': 1, 'error_count': 3},
+        )
+        self.assertEqual([error['line'] for error in report['errors']], [4, 5, 6])
+        self.assertEqual(sorted(report['errors'][0]['errors']), ['category', 'expiry_date', 'quantity'])
+        self.assertEqual(sorted(report['errors'][1]['errors']), ['category', 'name', 'unit'])
+
+        supplier = Supplier.objects.get()
+        self.item.refresh_from_db()
+        self.assertEqual(
+            (self.item.name, self.item.quantity, self.item.minimum_stock, self.item.supplier, self.item.is_below_minimum),
+            ('Saline', 4, 5, supplier, True),
+        )
+        gloves = InventoryItem.objects.get(sku='GLV-001')
+        self.assertEqual((gloves.quantity, gloves.supplier, gloves.is_below_minimum), (100, supplier, False))
+        self.assertEqual(
+            sorted(StockTransaction.objects.values_list('inventory_item__sku', 'transaction_type', 'quantity_change', 'performed_by')),
+            [('GLV-001', 'adjust', 100, self.user.pk), ('SAL-001', 'adjust', -6, self.user.pk)],
+        )
+
+        again = self.upload(self.CSV.split('BAD-001')[0]).data
+        self.assertEqual((again['updated'], again['adjusted'], again['suppliers_created']), (2, 0, 0))
+
+    def test_dry_run_saves_nothing(self):
+        report = self.upload(self.CSV, dry_run='true').data
+        self.assertEqual((report['created'], report['adjusted'], report['suppliers_created']), (1, 2, 1))
+        self.assertEqual(InventoryItem.objects.count(), 1)
+        self.assertFalse(Supplier.objects.exists() or StockTransaction.objects.exists())
+
+    def test_rejects_files_without_sku_column(self):
+        response = self.upload('name,quantity\nSaline,4\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sku', response.data['file'])
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='pw')
+        self.client.force_authenticate(self.user)
+        self.counter = itertools.count()
+
+    def seed_items(self, n):
+        for _ in range(n):
+            i = next(self.counter)
+            supplier = Supplier.objects.create(name=f'Supplier {i}')
+            item = make_item(sku=f'SKU-{i}', supplier=supplier, quantity=1, minimum_stock=5)
+            StockTransaction.objects.create(
+                inventory_item=item, transaction_type='consume', quantity_change=-1,
+                previous_quantity=2, new_quantity=1, performed_by=self.user,
+            )
+
+    def test_inventory_list(self):
+        self.assertConstantQueries('/api/inventory/', self.seed_items)
+
+    def test_low_stock(self):
+        self.assertConstantQueries('/api/inventory/low_stock/', self.seed_items)
+
+    def test_suppliers(self):
+        self.assertConstantQueries('/api/suppliers/', self.seed_items)
+
+    def test_transactions(self):
+        self.assertConstantQueries('/api/transactions/', self.seed_items)
+
+    def test_inventory_detail(self):
+        self.seed_items(1)
+        item = InventoryItem.objects.get()
+        self.assertConstantQueries(f'/api/inventory/{item.pk}/', self.seed_items)
+
+
+class LedgerPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='pw')
+        self.client.force_authenticate(self.user)
+        self.item = make_item(quantity=100)
+        self.other = make_item(name='Gloves', sku='GLV-001')
+        for i in range(7):
+            adjust_stock(self.item.pk, -1, transaction_type='consume')
+        adjust_stock(self.other.pk, 5, transaction_type='restock')
+
+    def test_walks_ledger_forward_and_back(self):
+        expected = list(StockTransaction.objects.order_by('-performed_at', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/transactions/?page_size=3'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([row['id'] for row in response.data['results']], expected[3:6])
+
+    def test_filters(self):
+        response = self.client.get(f'/api/transactions/?item={self.other.pk}')
+        self.assertEqual([row['transaction_type'] for row in response.data['results']], ['restock'])
+
+        response = self.client.get('/api/transactions/?type=consume')
+        self.assertEqual(len(response.data['results']), 7)
+
+        response = self.client.get('/api/transactions/?end=2000-01-01')
+        self.assertEqual(response.data['results'], [])
+
+        response = self.client.get('/api/transactions/?start=not-a-date')
+        self.assertEqual(response.status_code, 400)
+
+    def test_inventory_list_paginates_on_request(self):
+        self.assertIsInstance(self.client.get('/api/inventory/').data, list)
+
+        response = self.client.get('/api/inventory/?page_size=1')
+        self.assertEqual([row['sku'] for row in response.data['results']], ['GLV-001'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['sku'] for row in response.data['results']], ['SAL-001'])
+        self.assertIsNone(response.data['next'])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='buyer', password='pw')
+        self.client.force_authenticate(self.user)
+        self.supplier = Supplier.objects.create(name='MedCo')
+
+    def test_hits_skip_the_database_and_support_etags(self):
+        before = cache.stats()['views'].get('SupplierViewSet', {'hit': 0, 'miss': 0, 'not_modified': 0})
+        first = self.client.get('/api/suppliers/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/suppliers/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+        unchanged = self.client.get('/api/suppliers/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+        after = cache.stats()['views']['SupplierViewSet']
+        self.assertEqual({k: after[k] - before[k] for k in after}, {'hit': 1, 'miss': 1, 'not_modified': 1})
+
+    def test_saves_and_ledger_writes_invalidate(self):
+        self.supplier.name = 'MedCo Ltd'
+        self.supplier.save()
+        self.assertEqual(self.client.get('/api/suppliers/').json()[0]['name'], 'MedCo Ltd')
+
+        item = make_item(supplier=self.supplier)
+        self.assertEqual(self.client.get('/api/inventory/').json()[0]['quantity'], 10)
+        adjust_stock(item.pk, -4)
+        response = self.client.get('/api/inventory/')
+        self.assertEqual((response['X-Cache'], response.json()[0]['quantity']), ('MISS', 6))
+        bulk_adjust_stock([{'item': item.pk, 'quantity_change': -1}])
+        self.assertEqual(self.client.get('/api/inventory/').json()[0]['quantity'], 5)
+
+
+class WatermarkTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='buyer', password='pw')
+        self.client.force_authenticate(self.user)
+        self.item = make_item()
+
+    def test_unchanged_collection_is_answered_from_the_fingerprint(self):
+        etag = self.client.get('/api/inventory/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/inventory/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        adjust_stock(self.item.pk, 1)
+        response = self.client.get('/api/inventory/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_since_returns_changes_and_tombstones(self):
+        stale = make_item(sku='GLV-001')
+        InventoryItem.objects.filter(pk__in=[self.item.pk, stale.pk]).update(updated_at=timezone.now() - timedelta(hours=1))
+        since = (timezone.now() - timedelta(minutes=30)).isoformat()
+
+        adjust_stock(self.item.pk, 2)
+        gone = make_item(sku='TMP-001')
+        gone_pk = gone.pk
+        gone.delete()
+
+        body = self.client.get('/api/inventory/', {'since': since}).json()
+        self.assertEqual([row['id'] for row in body['results']], [self.item.pk])
+        self.assertEqual(body['deleted'], [gone_pk])
+        self.assertFalse(body['full'])
+        self.assertEqual(self.client.get('/api/inventory/', {'since': 'yesterday'}).status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class LiveDiffTests(TestCase):
+    def setUp(self):
+        self.ward = make_item(location=Warehouse.objects.create(name='Ward 3'))
+        self.pharmacy = make_item(sku='GLV-001', location=Warehouse.objects.create(name='Pharmacy'))
+        self.user = User.objects.create_user(username='storekeeper', password='pw')
+
+    def adjust(self, item, delta):
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(item.pk, delta)
+
+    async def connect(self):
+        communicator = live_socket(self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_ledger_pushes_compact_diffs(self):
+        client = await self.connect()
+        await sync_to_async(self.adjust)(self.ward, -3)
+
+        message = await client.receive_json_from()
+        self.assertEqual(message, {'type': 'INVENTORY_DIFF', 'items': [{'id': self.ward.pk, 'quantity': 7, 'is_below_minimum': True}]})
+        await client.disconnect()
+
+    async def test_location_subscription_and_client_messages_are_not_rebroadcast(self):
+        everyone = await self.connect()
+        pharmacy = await self.connect()
+        await pharmacy.send_json_to({'action': 'subscribe', 'locations': ['Pharmacy']})
+        await everyone.send_json_to({'type': 'AUDIT_LOG', 'message': 'spoofed'})
+        await pharmacy.receive_nothing()
+
+        await sync_to_async(self.adjust)(self.ward, 1)
+        await sync_to_async(self.adjust)(self.pharmacy, 1)
+
+        self.assertEqual((await pharmacy.receive_json_from())['items'][0]['id'], self.pharmacy.pk)
+        self.assertTrue(await pharmacy.receive_nothing())
+        self.assertEqual([(await everyone.receive_json_from())['items'][0]['id'] for _ in range(2)], [self.ward.pk, self.pharmacy.pk])
+        await everyone.disconnect()
+        await pharmacy.disconnect()
+
+    async def test_anonymous_sockets_are_refused(self):
+        connected, _ = await live_socket(AnonymousUser()).connect()
+        self.assertFalse(connected)
+
+    async def test_token_holders_get_their_hospitals_rows(self):
+        hospital = await Hospital.objects.acreate(name='St. Mary')
+        nurse = await User.objects.acreate(username='nurse', hospital=hospital)
+        await InventoryItem.objects.filter(pk=self.pharmacy.pk).aupdate(hospital=hospital)
+        app = TokenAuthMiddlewareStack(InventoryConsumer.as_asgi())
+        communicator = WebsocketCommunicator(app, f'/ws/live/?token={AccessToken.for_user(nurse)}')
+        self.assertTrue((await communicator.connect())[0])
+
+        await sync_to_async(self.adjust)(self.ward, 1)
+        await sync_to_async(self.adjust)(self.pharmacy, 1)
+        self.assertEqual((await communicator.receive_json_from())['items'][0]['id'], self.pharmacy.pk)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    def test_save_publishes_only_changed_fields(self):
+        item = InventoryItem.objects.get(pk=self.ward.pk)
+        item.name = 'Saline 0.9%'
+        with mock.patch('inventory.realtime.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        payloads = [call.args[1] for call in publish.call_args_list]
+        self.assertEqual(payloads[0], {'type': 'INVENTORY_DIFF', 'items': [{'id': item.pk, 'name': 'Saline 0.9%'}]})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+@skipUnless(settings.CHANNEL_REDIS_URL, 'Set CHANNEL_REDIS_URL to test the Redis channel layers')
+class RedisChannelLayerTests(TestCase):
+    """Fan-out across worker processes, through each Redis layer ``CHANNEL_LAYER`` can select."""
+    BACKENDS = ('channels_redis.core.RedisChannelLayer', 'channels_redis.pubsub.RedisPubSubChannelLayer')
+
+    def layer_settings(self, backend):
+        return override_settings(CHANNEL_LAYERS={DEFAULT_CHANNEL_LAYER: {
+            'BACKEND': backend, 'CONFIG': {'hosts': [settings.CHANNEL_REDIS_URL], 'prefix': 'healthstock-test'},
+        }})
+
+    async def test_diffs_reach_the_hospitals_sockets_on_every_worker(self):
+        mary = await Hospital.objects.acreate(name='St. Mary')
+        item = await sync_to_async(make_item)(hospital=mary)
+        nurse = await User.objects.acreate(username='nurse', hospital=mary)
+        outsider = await User.objects.acreate(username='outsider')
+
+        def consume():
+            with self.captureOnCommitCallbacks(execute=True):
+                adjust_stock(item.pk, -1)
+
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend), self.layer_settings(backend):
+                # A layer instance of its own stands in for another worker process.
+                other_worker = channel_layers.make_backend(DEFAULT_CHANNEL_LAYER)
+                channel = await other_worker.new_channel()
+                await other_worker.group_add(hospital_group(mary.pk), channel)
+                sockets = [live_socket(nurse), live_socket(outsider)]
+                for socket in sockets:
+                    self.assertTrue((await socket.connect(timeout=5))[0])
+
+                await sync_to_async(consume)()
+
+                message = await asyncio.wait_for(other_worker.receive(channel), timeout=5)
+                self.assertEqual(message['payload']['items'][0]['id'], item.pk)
+                self.assertEqual((await sockets[0].receive_json_from(timeout=5))['items'][0]['id'], item.pk)
+                self.assertTrue(await sockets[1].receive_nothing(timeout=0.5))
+                for socket in sockets:
+                    await socket.disconnect()
+                await other_worker.group_discard(hospital_group(mary.pk), channel)
+                await other_worker.flush()
+
+
+class WarehouseTotalsTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='storekeeper', password='pw')
+        self.client.force_authenticate(self.user)
+
+    def totals(self):
+        return {
+            name: (item_count, units, critical)
+            for name, item_count, units, critical in Warehouse.objects.values_list('name', 'item_count', 'units', 'critical_items')
+        }
+
+    def test_ledger_and_item_writes_keep_running_totals(self):
+        response = self.client.post('/api/inventory/', {
+            'name': 'Saline', 'sku': 'SAL-001', 'category': 'consumable', 'unit': 'bag', 'quantity': 12,
+            'minimum_stock': 10, 'location': 'Ward 3',
+        })
+        self.assertEqual((response.status_code, response.data['location']), (201, 'Ward 3'))
+        saline = InventoryItem.objects.get(sku='SAL-001')
+        gloves = make_item(sku='GLV-001', quantity=2, minimum_stock=5, location=Warehouse.objects.create(name='Pharmacy'))
+        self.assertEqual(self.totals(), {'Ward 3': (1, 12, 0), 'Pharmacy': (1, 2, 1)})
+
+        adjust_stock(saline.pk, -5)
+        bulk_adjust_stock([{'item': gloves.pk, 'quantity_change': 10}, {'item': saline.pk, 'quantity_change': 1}])
+        self.assertEqual(self.totals(), {'Ward 3': (1, 8, 1), 'Pharmacy': (1, 12, 0)})
+
+        item = InventoryItem.objects.get(pk=gloves.pk)
+        item.location_id = 'Ward 3'
+        item.save()
+        self.assertEqual(self.totals(), {'Ward 3': (2, 20, 1), 'Pharmacy': (0, 0, 0)})
+        self.upload('sku,location,quantity\nSAL-001,East Wing,30\nNEW-001,,\n')
+        self.assertEqual(self.totals(), {'Ward 3': (1, 12, 0), 'Pharmacy': (0, 0, 0), 'East Wing': (1, 30, 0)})
+        item.delete()
+        self.assertEqual(self.totals()['Ward 3'], (0, 0, 0))
+
+        # Writes that skip the ledger are repaired by the rebuild.
+        self.assertEqual(rebuild_warehouse_totals(), 0)
+        InventoryItem.objects.filter(pk=saline.pk).update(quantity=1, is_below_minimum=True)
+        self.assertEqual(rebuild_warehouse_totals(), 1)
+        self.assertEqual(self.totals()['East Wing'], (1, 1, 1))
+
+    def upload(self, content):
+        response = self.client.post(
+            '/api/inventory/import/', {'file': SimpleUploadedFile('items.csv', content.encode())}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_live_endpoint_reads_the_totals_from_the_cache(self):
+        ward = Warehouse.objects.create(name='Ward 3', latitude=40.7, longitude=-74.0)
+        for index, quantity in enumerate((1, 20, 30, 40)):
+            make_item(sku=f'SAL-{index}', quantity=quantity, minimum_stock=10, location=ward)
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/warehouses/live/')
+        with self.assertNumQueries(0):
+            rows = self.client.get('/api/warehouses/live/').json()
+        self.assertEqual(rows, [{
+            'id': ward.pk, 'name': 'Ward 3', 'lat': 40.7, 'lng': -74.0, 'stockLevel': 75, 'status': 'active',
+            'items': 4, 'units': 91, 'criticalItems': 1,
+        }])
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_adjust_stock([{'item': item.pk, 'quantity_change': -15} for item in InventoryItem.objects.filter(quantity=20)])
+            bulk_adjust_stock([{'item': item.pk, 'quantity_change': -25} for item in InventoryItem.objects.filter(quantity=30)])
+        self.assertEqual(self.client.get('/api/warehouses/live/').json()[0]['status'], 'critical')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/warehouses/live/').status_code, 401)
+
+    async def test_changes_are_pushed_to_clients_watching_warehouses(self):
+        ward = await Warehouse.objects.acreate(name='Ward 3')
+        item = await sync_to_async(make_item)(location=ward, minimum_stock=5)
+        watcher = live_socket(self.user)
+        self.assertTrue((await watcher.connect())[0])
+        await watcher.send_json_to({'action': 'watch_warehouses'})
+        await watcher.receive_nothing()
+
+        def consume():
+            with self.captureOnCommitCallbacks(execute=True):
+                adjust_stock(item.pk, -6)
+        await sync_to_async(consume)()
+
+        self.assertEqual((await watcher.receive_json_from())['type'], 'INVENTORY_DIFF')
+        message = await watcher.receive_json_from()
+        self.assertEqual(message['type'], 'WAREHOUSE_STATS')
+        self.assertEqual([(row['name'], row['units'], row['criticalItems']) for row in message['warehouses']], [('Ward 3', 4, 1)])
+        await watcher.disconnect()
+
+    def test_each_hospital_keeps_its_own_warehouses(self):
+        mary, general = Hospital.objects.create(name='St. Mary'), Hospital.objects.create(name='General')
+        nurse = User.objects.create_user(username='nurse', password='pw', hospital=mary)
+        outsider = User.objects.create_user(username='outsider', password='pw', hospital=general)
+        for user, sku, quantity in ((nurse, 'SAL-001', 12), (outsider, 'SAL-002', 3)):
+            self.client.force_authenticate(user)
+            response = self.client.post('/api/inventory/', {
+                'name': 'Saline', 'sku': sku, 'category': 'consumable', 'unit': 'bag', 'quantity': quantity,
+                'minimum_stock': 5, 'location': 'Main Warehouse',
+            })
+            self.assertEqual((response.status_code, response.data['location']), (201, 'Main Warehouse'))
+        self.upload('sku,location,quantity\nSAL-002,Main Warehouse,4\n')
+        self.assertEqual(
+            set(Warehouse.objects.values_list('hospital', 'name', 'item_count', 'units', 'critical_items')),
+            {(mary.pk, 'Main Warehouse', 1, 12, 0), (general.pk, 'Main Warehouse', 1, 4, 1)},
+        )
+
+        self.assertEqual([(row['name'], row['units']) for row in self.client.get('/api/warehouses/live/').json()], [('Main Warehouse', 4)])
+        self.client.force_authenticate(nurse)
+        self.assertEqual([(row['name'], row['units']) for row in self.client.get('/api/warehouses/live/').json()], [('Main Warehouse', 12)])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/warehouses/live/').json(), [])
+        self.assertEqual(rebuild_warehouse_totals(), 0)
+
+    async def test_totals_are_pushed_to_the_hospitals_own_clients(self):
+        mary, general = await Hospital.objects.acreate(name='St. Mary'), await Hospital.objects.acreate(name='General')
+        watchers = []
+        for name, hospital in (('nurse', mary), ('outsider', general)):
+            await Warehouse.objects.acreate(hospital=hospital, name='Main Warehouse')
+            watcher = live_socket(await User.objects.acreate(username=name, hospital=hospital))
+            self.assertTrue((await watcher.connect())[0])
+            await watcher.send_json_to({'action': 'watch_warehouses'})
+            watchers.append(watcher)
+        nurse, outsider = watchers
+        await outsider.receive_nothing()
+        item = await sync_to_async(make_item)(hospital=mary, location_id='Main Warehouse', minimum_stock=5)
+
+        def consume():
+            with self.captureOnCommitCallbacks(execute=True):
+                adjust_stock(item.pk, -6)
+        await sync_to_async(consume)()
+
+        self.assertEqual((await nurse.receive_json_from())['type'], 'INVENTORY_DIFF')
+        message = await nurse.receive_json_from()
+        self.assertEqual([(row['name'], row['units']) for row in message['warehouses']], [('Main Warehouse', 4)])
+        self.assertTrue(await outsider.receive_nothing())
+        for watcher in watchers:
+            await watcher.disconnect()
+
+
+class LiveMetricsTests(APITestCase):
+    def setUp(self):
+        metrics.counter.reset()
+        self.addCleanup(metrics.counter.reset)
+
+    def test_windows_slide(self):
+        counter = metrics.EventCounter()
+        counter.record('stock_outs', now=1000)
+        counter.record('stock_outs', 2, now=1030.5)
+        self.assertEqual(counter.windows(now=1040)['minute'], {'stock_outs': 3})
+        self.assertEqual(counter.windows(now=1060)['minute'], {'stock_outs': 2})
+        self.assertEqual(counter.windows(now=1091)['minute'], {'stock_outs': 0})
+        self.assertEqual(counter.windows(now=1091)['hour'], {'stock_outs': 3})
+        # Idle for longer than the window empties every slot.
+        self.assertEqual(counter.windows(now=1000 + 3600 * 2)['hour'], {'stock_outs': 0})
+        # Each hospital counts on its own.
+        counter.record('stock_outs', 4, now=1095, hospital_id=7)
+        self.assertEqual(counter.windows(now=1095, hospital_id=7)['minute'], {'stock_outs': 4})
+        self.assertEqual(counter.windows(now=1095)['minute'], {'stock_outs': 0})
+
+    def test_ledger_writes_feed_the_endpoint(self):
+        saline = make_item(quantity=3)
+        gloves = make_item(sku='GLV-001', quantity=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(saline.pk, -3, transaction_type='consume')
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_adjust_stock([
+                {'item': gloves.pk, 'quantity_change': -2, 'transaction_type': 'expired'},
+                {'item': saline.pk, 'quantity_change': 10, 'transaction_type': 'restock'},
+            ])
+        # Nothing is counted for a write that rolls back.
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(InsufficientStock):
+            adjust_stock(gloves.pk, -50, allow_negative=False)
+
+        self.assertEqual(self.client.get('/api/metrics/live/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user(username='storekeeper', password='pw'))
+        data = self.client.get('/api/metrics/live/').json()
+        self.assertEqual((data['stockOuts'], data['incomingOrders'], data['expiryEvents']), (1, 0, 0))
+        self.assertEqual(data['windows']['hour'], {'stock_moves': 3, 'stock_outs': 1, 'expired_write_offs': 1})
+
+        # Another hospital's users see only their own hospital's events.
+        hospital = Hospital.objects.create(name='St. Mary')
+        self.client.force_authenticate(User.objects.create_user(username='nurse', password='pw', hospital=hospital))
+        self.assertEqual(self.client.get('/api/metrics/live/').json()['windows']['hour'], {})
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(make_item(sku='INS-001', hospital=hospital).pk, -10)
+        self.assertEqual(self.client.get('/api/metrics/live/').json()['windows']['hour'], {
+            'stock_moves': 1, 'stock_outs': 1, 'low_stock_alerts': 1,
+        })
+
+
+class TenancyTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.mary, self.general = Hospital.objects.create(name='St. Mary'), Hospital.objects.create(name='General')
+        self.nurse = User.objects.create_user(username='nurse', password='pw', hospital=self.mary)
+        self.outsider = User.objects.create_user(username='outsider', password='pw', hospital=self.general)
+        self.client.force_authenticate(self.nurse)
+        supplier = self.client.post('/api/suppliers/', {'name': 'MedCo'}).data
+        self.item = self.client.post('/api/inventory/', {
+            'name': 'Saline', 'sku': 'SAL-001', 'category': 'consumable', 'unit': 'bag', 'quantity': 12, 'supplier': supplier['id'],
+        }).data
+        self.supplier_id = supplier['id']
+
+    def test_rows_are_stamped_and_hidden_from_other_hospitals(self):
+        self.client.post(f'/api/inventory/{self.item["id"]}/adjust_stock/', {'quantity_change': -2})
+        self.assertEqual(InventoryItem.objects.get().hospital, self.mary)
+        self.assertEqual(StockTransaction.objects.get().hospital, self.mary)
+        self.assertEqual(len(self.client.get('/api/inventory/').data), 1)
+
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get('/api/inventory/').data, [])
+        self.assertEqual(self.client.get('/api/suppliers/').data, [])
+        self.assertEqual(self.client.get('/api/transactions/').data['results'], [])
+        self.assertEqual(self.client.get(f'/api/inventory/{self.item["id"]}/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/inventory/{self.item["id"]}/adjust_stock/', {'quantity_change': -2}).status_code, 404)
+        response = self.client.post('/api/inventory/bulk_adjust/', {'movements': [{'item': self.item['id'], 'quantity_change': -2}]}, format='json')
+        self.assertEqual(response.data['results'][0]['error'], 'Inventory item does not exist')
+        self.assertEqual(InventoryItem.objects.get().quantity, 10)
+
+    def test_other_hospitals_rows_cannot_be_referenced(self):
+        self.client.force_authenticate(self.outsider)
+        response = self.client.post('/api/inventory/', {
+            'name': 'Gloves', 'sku': 'GLV-001', 'category': 'consumable', 'unit': 'box', 'supplier': self.supplier_id,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('supplier', response.data)
+
+        upload = SimpleUploadedFile('items.csv', b'sku,name,category,unit,quantity\nSAL-001,Mine now,consumable,bag,0\n')
+        report = self.client.post('/api/inventory/import/', {'file': upload}, format='multipart').data
+        self.assertEqual((report['updated'], report['errors'][0]['errors']), (0, {'sku': ['Already used by another hospital.']}))
+        self.assertEqual(InventoryItem.objects.get().name, 'Saline')
+
+    def test_deltas_only_report_the_hospitals_deletions(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        theirs = make_item(name='Gloves', sku='GLV-001', hospital=self.general)
+        theirs_pk = theirs.pk
+        theirs.delete()
+        self.client.delete(f'/api/inventory/{self.item["id"]}/')
+
+        self.assertEqual(self.client.get('/api/inventory/', {'since': since}).json()['deleted'], [self.item['id']])
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get('/api/inventory/', {'since': since}).json()['deleted'], [theirs_pk])
+
+    def test_import_never_overwrites_a_sku_inserted_concurrently(self):
+        from . import imports
+        update_rows = imports.update_rows
+
+        def race(*args):
+            # Another hospital inserts the SKU after the import locked the rows it already knew.
+            make_item(name='Theirs', sku='GLV-001', hospital=self.general)
+            update_rows(*args)
+
+        upload = SimpleUploadedFile('items.csv', b'sku,name,category,unit,quantity\nGLV-001,Gloves,consumable,box,5\nMSK-001,Masks,consumable,box,5\n')
+        with mock.patch.object(imports, 'update_rows', race):
+            report = self.client.post('/api/inventory/import/', {'file': upload}, format='multipart').data
+        self.assertEqual((report['created'], report['errors'][0]['sku']), (1, 'GLV-001'))
+        self.assertEqual(
+            sorted(InventoryItem.objects.values_list('sku', 'name', 'hospital', 'quantity')),
+            [('GLV-001', 'Theirs', self.general.pk, 10), ('MSK-001', 'Masks', self.mary.pk, 5), ('SAL-001', 'Saline', self.mary.pk, 12)],
+        )
+
+
+class ColdLedgerTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='cold-ledger-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.enterContext(override_settings(LEDGER_COLD_DIR=directory))
+        hospital = Hospital.objects.create(name='St. Mary')
+        self.nurse = User.objects.create_user(username='nurse', password='pw', hospital=hospital)
+        self.client.force_authenticate(self.nurse)
+        self.item = make_item(quantity=100, hospital=hospital)
+        self.other = make_item(name='Gloves', sku='GLV-001', hospital=hospital)
+        for change in (-1, -2, -3, 5, -4):
+            adjust_stock(self.item.pk, change, transaction_type='consume' if change < 0 else 'restock', user=self.nurse)
+        adjust_stock(self.other.pk, 2, transaction_type='restock', notes='Donated')
+        adjust_stock(self.other.pk, -1, transaction_type='consume')
+        ids = list(StockTransaction.objects.order_by('pk').values_list('pk', flat=True))
+        # Two years back, spread over two months with a shared timestamp, then this month.
+        self.old = old = timezone.now().replace(day=15) - timedelta(days=730)
+        for pk, at in zip(ids, [old, old, old + timedelta(days=31), old + timedelta(days=31, hours=1), old + timedelta(days=32), old + timedelta(days=33)]):
+            StockTransaction.objects.filter(pk=pk).update(performed_at=at)
+        self.expected = list(StockTransaction.objects.order_by('-performed_at', '-id').values_list('id', flat=True))
+
+    def ids(self, url, **params):
+        return [row['id'] for row in self.client.get(url, params).data['results']]
+
+    def test_closed_months_move_to_files_and_are_still_served(self):
+        archived = cold_ledger.archive_months(folded_through=self.expected[0], hot_months=12)
+        self.assertEqual([rows for _, rows in archived], [2, 4])
+        self.assertEqual(StockTransaction.objects.count(), 1)
+        self.assertIsNotNone(cold_ledger.horizon())
+
+        seen, url, pages = [], '/api/transactions/?page_size=2', []
+        while url:
+            pages.append(self.client.get(url).data)
+            seen += [row['id'] for row in pages[-1]['results']]
+            url = pages[-1]['next']
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([row['id'] for row in self.client.get(pages[-1]['previous']).data['results']], self.expected[4:6])
+        self.assertEqual([row['id'] for row in self.client.get(pages[2]['previous']).data['results']], self.expected[2:4])
+
+        self.assertEqual(self.ids('/api/transactions/', item=self.other.pk), self.expected[:2])
+        self.assertEqual(len(self.ids('/api/transactions/', type='restock')), 2)
+        self.assertEqual(self.ids('/api/transactions/', end=self.old.date().replace(day=1).isoformat()), [])
+        around = {'start': (self.old - timedelta(hours=1)).isoformat(), 'end': (self.old + timedelta(hours=1)).isoformat()}
+        self.assertEqual(self.ids('/api/transactions/', **around), self.expected[-2:])
+
+        row = self.client.get(f'/api/transactions/{self.expected[1]}/').data
+        self.assertEqual((row['item_name'], row['notes'], row['transaction_type'], row['quantity_change']), ('Gloves', 'Donated', 'restock', 2))
+        self.assertEqual(self.client.get(f'/api/transactions/{self.expected[-1]}/').data['performed_by_name'], 'nurse')
+
+        export = b''.join(self.client.get('/api/transactions/export/').streaming_content).decode()
+        self.assertEqual([int(line[0]) for line in csv.reader(io.StringIO(export)) if line[0].isdigit()], self.expected)
+
+        outsider = User.objects.create_user(username='outsider', password='pw', hospital=Hospital.objects.create(name='General'))
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.ids('/api/transactions/'), [])
+        self.assertEqual(self.client.get(f'/api/transactions/{self.expected[-1]}/').status_code, 404)
+
+    def test_months_wait_for_the_rollups(self):
+        self.assertEqual(cold_ledger.archive_months(folded_through=0, hot_months=12), [])
+        self.assertEqual(StockTransaction.objects.count(), len(self.expected))
+        self.assertIsNone(cold_ledger.horizon())
+
+    @skipUnless(partitions.supported(), 'Ledger partitioning needs PostgreSQL')
+    def test_partitioned_months_are_detached_and_dropped(self):
+        partitions.enable_partitioning()
+        cold_ledger.archive_months(folded_through=self.expected[0], hot_months=12)
+        cutoff = partitions.add_months(timezone.now().date().replace(day=1), -12)
+        # Empty months between the archived ones go as well, with no segment written.
+        self.assertEqual([month for _, month, _ in partitions.partitions() if month and month < cutoff], [])
+        self.assertEqual(len(cold_ledger.segments()), 2)
+        self.assertEqual(self.ids('/api/transactions/', page_size=10), self.expected)
+
+    def test_blocks_outside_the_bounds_are_skipped(self):
+        cold_ledger.archive_months(folded_through=self.expected[0], hot_months=12)
+        first, second = cold_ledger.segments()
+        with mock.patch.object(first, 'column', wraps=first.column) as reads:
+            rows = list(cold_ledger.rows(self.nurse.hospital_id, start=second.start))
+        self.assertEqual([txn.pk for txn in rows], self.expected[1:5])
+        reads.assert_not_called()
+
+
+class LedgerPartitionTests(TestCase):
+    def test_months_and_partition_names(self):
+        self.assertEqual(partitions.add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(partitions.add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+        self.assertEqual(partitions.partition_name(date(2025, 2, 1)), 'inventory_stocktransaction_202502')
+
+    def test_is_a_no_op_without_postgres(self):
+        out = io.StringIO()
+        call_command('ledger_partitions', 'ensure', stdout=out)
+        self.assertIn('needs PostgreSQL', out.getvalue())
+        self.assertEqual((partitions.is_partitioned(), partitions.ensure_partitions()), (False, []))
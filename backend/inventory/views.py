@@ -1,26 +1,113 @@
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from django.db.models import F
-from .models import InventoryItem, Supplier, StockTransaction
-from .serializers import InventoryItemSerializer, SupplierSerializer, StockTransactionSerializer
+from datetime import datetime, timedelta
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from core.cache import CachedResponseMixin, cached_action, generations
+from core.conditional import WatermarkMixin
+from core.export import CSVRenderer, XLSXRenderer, export_response
+from core.pagination import KeysetPagination
+from core.tenancy import TenantScopedMixin, for_tenant, tenant_of
+from .models import EXPIRY_STATUS_CHOICES, InventoryItem, Supplier, StockTransaction, Tombstone
+from .serializers import InventoryItemSerializer, SupplierSerializer, StockTransactionSerializer, StockMovementSerializer
+from . import cold_ledger, services
+from .warehouses import live_warehouses
+from .imports import ImportFileError, import_items
 
-class SupplierViewSet(viewsets.ModelViewSet):
+def _flag(request, name):
+    return str(request.data.get(name, '')).lower() in ('1', 'true')
+
+def _parse_bound(request, name, inclusive_date=False):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is not None:
+                if inclusive_date:
+                    day += timedelta(days=1)
+                parsed = datetime.combine(day, datetime.min.time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+class InventoryPagination(KeysetPagination):
+    ordering = ('name', 'id')
+    optional = True
+
+class TransactionPagination(KeysetPagination):
+    ordering = ('-performed_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+    def fetch(self, queryset, key, reverse):
+        rows = super().fetch(queryset, key, reverse)
+        # Archived rows are all older than the table's, so a full newest-first page needs none of them.
+        if (len(rows) > self.page_size and not reverse) or not hasattr(self.view, 'archived_rows'):
+            return rows
+        archived = self.view.archived_rows(after=key, descending=not reverse, limit=self.page_size + 1)
+        rows = sorted([*rows, *archived], key=lambda txn: (txn.performed_at, txn.pk), reverse=not reverse)
+        return rows[:self.page_size + 1]
+
+class SupplierViewSet(TenantScopedMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class InventoryItemViewSet(viewsets.ModelViewSet):
-    queryset = InventoryItem.objects.all()
+class InventoryItemViewSet(TenantScopedMixin, WatermarkMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = InventoryItem.objects.select_related('supplier')
+    cache_dependencies = (InventoryItem, Supplier)
+    tombstone_model = Tombstone
     serializer_class = InventoryItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = InventoryPagination
+    bulk_adjust_limit = 5000
+    export_columns = [
+        ('id', 'id'), ('sku', 'sku'), ('name', 'name'), ('category', 'category'), ('quantity', 'quantity'),
+        ('unit', 'unit'), ('minimum_stock', 'minimum_stock'), ('maximum_stock', 'maximum_stock'),
+        ('location', 'location_id'), ('unit_price', 'unit_price'), ('batch_number', 'batch_number'),
+        ('expiry_date', 'expiry_date'), ('expiry_status', 'expiry_status'), ('supplier', 'supplier__name'),
+        ('updated_at', 'updated_at'),
+    ]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expiry_status = self.request.query_params.get('expiry_status')
+        if expiry_status:
+            if expiry_status not in dict(EXPIRY_STATUS_CHOICES):
+                raise ValidationError({'expiry_status': f'Expected one of {", ".join(dict(EXPIRY_STATUS_CHOICES))}.'})
+            queryset = queryset.filter(expiry_status=expiry_status)
+        return queryset
+
+    def get_fingerprint_extra(self, request):
+        # supplier_name changes without touching updated_at.
+        return tuple(generations([Supplier]))
 
     @action(detail=False, methods=['get'])
+    @cached_action
     def low_stock(self, request):
-        items = self.get_queryset().filter(quantity__lt=F('minimum_stock'))
+        items = self.get_queryset().filter(is_below_minimum=True)
         serializer = self.get_serializer(items, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, XLSXRenderer])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        return export_response(request, queryset, self.export_columns, 'inventory')
+
     @action(detail=True, methods=['post'])
     def adjust_stock(self, request, pk=None):
         item = self.get_object()
@@ -30,24 +117,135 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
 
         if quantity_change is None:
             return Response({'error': 'quantity_change is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quantity_change = int(quantity_change)
+        except (TypeError, ValueError):
+            return Response({'error': 'quantity_change must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if transaction_type not in dict(StockTransaction.TRANSACTION_TYPES):
+            return Response({'error': f'"{transaction_type}" is not a valid transaction_type'}, status=status.HTTP_400_BAD_REQUEST)
 
-        previous_quantity = item.quantity
-        item.quantity += int(quantity_change)
-        item.save()
-
-        StockTransaction.objects.create(
-            inventory_item=item,
-            transaction_type=transaction_type,
-            quantity_change=quantity_change,
-            previous_quantity=previous_quantity,
-            new_quantity=item.quantity,
-            notes=notes,
-            performed_by=request.user
-        )
+        try:
+            txn = services.adjust_stock(
+                item.pk,
+                quantity_change,
+                transaction_type=transaction_type,
+                notes=notes,
+                user=request.user,
+                allow_negative=_flag(request, 'allow_negative'),
+            )
+        except services.InsufficientStock as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
+        item.quantity = txn.new_quantity
         return Response(self.get_serializer(item).data)
 
-class StockTransactionViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = StockTransaction.objects.all().order_by('-performed_at')
+    @action(detail=False, methods=['post'])
+    def bulk_adjust(self, request):
+        serializer = StockMovementSerializer(data=request.data.get('movements'), many=True)
+        serializer.is_valid(raise_exception=True)
+        if len(serializer.validated_data) > self.bulk_adjust_limit:
+            return Response({'error': f'At most {self.bulk_adjust_limit} movements per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = services.bulk_adjust_stock(
+            serializer.validated_data,
+            user=request.user,
+            allow_negative=_flag(request, 'allow_negative'),
+            items=for_tenant(InventoryItem.objects, self.tenant_id),
+        )
+        failed = sum(1 for r in results if r['status'] != 'ok')
+        return Response({'applied': len(results) - failed, 'failed': failed, 'results': results})
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Upload the CSV file as "file".'})
+        try:
+            report = import_items(upload.file, user=request.user, dry_run=_flag(request, 'dry_run'))
+        except ImportFileError as exc:
+            raise ValidationError({'file': str(exc)})
+        return Response(report)
+
+class StockTransactionViewSet(TenantScopedMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = StockTransaction.objects.select_related('inventory_item', 'performed_by').only(
+        'id', 'hospital', 'transaction_type', 'quantity_change', 'previous_quantity', 'new_quantity', 'notes', 'performed_at',
+        'inventory_item__name', 'performed_by__username',
+    ).order_by('-performed_at', '-id')
     serializer_class = StockTransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionPagination
+    export_columns = [
+        ('id', 'id'), ('performed_at', 'performed_at'), ('item_id', 'inventory_item_id'),
+        ('sku', 'inventory_item__sku'), ('item', 'inventory_item__name'), ('type', 'transaction_type'),
+        ('quantity_change', 'quantity_change'), ('previous_quantity', 'previous_quantity'),
+        ('new_quantity', 'new_quantity'), ('performed_by', 'performed_by__username'), ('notes', 'notes'),
+    ]
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, XLSXRenderer])
+    def export(self, request):
+        paths = [field.split('__') for _, field in self.export_columns]
+        archived = (tuple(_follow(txn, path) for path in paths) for txn in self.archived_rows())
+        return export_response(request, self.filter_queryset(self.get_queryset()), self.export_columns, 'ledger', archived)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pk = self.kwargs['pk']
+            archived = cold_ledger.get(int(pk), self.tenant_id) if pk.isdigit() else None
+            if archived is None:
+                raise
+            return Response(self.get_serializer(archived).data)
+
+    def ledger_filters(self):
+        """The request's filters, applied alike to the ledger table and the cold archive."""
+        params = self.request.query_params
+        if params.get('item') and not params['item'].isdigit():
+            raise ValidationError({'item': 'Expected an inventory item id.'})
+        return {
+            'hospital_id': self.tenant_id,
+            'item_id': int(params['item']) if params.get('item') else None,
+            'transaction_type': params.get('type') or None,
+            'start': _parse_bound(self.request, 'start'),
+            # A bare date as the end bound includes that whole day.
+            'end': _parse_bound(self.request, 'end', inclusive_date=True),
+        }
+
+    def archived_rows(self, **options):
+        return cold_ledger.rows(**self.ledger_filters(), **options)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        filters = self.ledger_filters()
+        if filters['item_id'] is not None:
+            queryset = queryset.filter(inventory_item_id=filters['item_id'])
+        if filters['transaction_type']:
+            queryset = queryset.filter(transaction_type=filters['transaction_type'])
+        if filters['start']:
+            queryset = queryset.filter(performed_at__gte=filters['start'])
+        if filters['end']:
+            queryset = queryset.filter(performed_at__lt=filters['end'])
+        # Rows before the horizon are read from the cold archive, even while a run is still deleting them here.
+        horizon = cold_ledger.horizon()
+        if horizon:
+            queryset = queryset.filter(performed_at__gte=horizon)
+        return queryset
+
+
+def _follow(obj, path):
+    for name in path:
+        try:
+            obj = getattr(obj, name)
+        except ObjectDoesNotExist:
+            return None
+        if obj is None:
+            return None
+    return obj
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def warehouses_live(request):
+    # Running totals kept by the stock ledger; changes are also pushed to
+    # ws/live/ clients that send {"action": "watch_warehouses"}.
+    return Response(live_warehouses(tenant_of(request.user)))
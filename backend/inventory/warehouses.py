@@ -0,0 +1,121 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.tenancy import for_tenant
+
+from .models import InventoryItem, Warehouse
+from .realtime import publish_warehouse_stats
+
+LIVE_CACHE_KEY = 'inventory:warehouses-live'
+# Bounds how long a snapshot cached just before a concurrent change can be served.
+LIVE_CACHE_TIMEOUT = 60
+# Below this share of items at or above their minimum a warehouse is flagged critical.
+CRITICAL_STOCK_LEVEL = 50
+LIVE_COLUMNS = ('id', 'name', 'latitude', 'longitude', 'item_count', 'units', 'critical_items')
+
+
+def live_row(pk, name, latitude, longitude, item_count, units, critical_items):
+    level = round(100 * (item_count - critical_items) / item_count) if item_count else 100
+    return {
+        'id': pk, 'name': name, 'lat': latitude, 'lng': longitude, 'stockLevel': level,
+        'status': 'critical' if level < CRITICAL_STOCK_LEVEL else 'active',
+        'items': item_count, 'units': units, 'criticalItems': critical_items,
+    }
+
+
+def live_cache_key(hospital_id):
+    return f'{LIVE_CACHE_KEY}:{hospital_id if hospital_id is not None else "none"}'
+
+
+def live_warehouses(hospital_id=None):
+    """``hospital_id``'s warehouses' live rows, from the cache or one read of the warehouse table."""
+    key = live_cache_key(hospital_id)
+    rows = cache.get(key)
+    if rows is None:
+        rows = [live_row(*values) for values in for_tenant(Warehouse.objects, hospital_id).order_by('name').values_list(*LIVE_COLUMNS)]
+        cache.set(key, rows, LIVE_CACHE_TIMEOUT)
+    return rows
+
+
+def item_totals(hospital_id, location, quantity, below, sign=1):
+    """The ``(hospital_id, location, items, units, critical_items)`` an item adds to its warehouse, or removes with ``sign=-1``."""
+    return hospital_id, location, sign, sign * quantity, sign * int(bool(below))
+
+
+def move_totals(changes):
+    """Add ``(hospital_id, location, items, units, critical_items)`` deltas to the warehouses' running totals.
+
+    Deltas are summed per warehouse and each warehouse row is bumped once, in
+    key order so concurrent transactions lock them in the same order. After
+    commit the hospitals' cached live rows are dropped and the new totals are
+    pushed to their live clients.
+    """
+    totals = {}
+    for hospital_id, location, *deltas in changes:
+        if location is not None:
+            current = totals.setdefault((hospital_id, location), [0, 0, 0])
+            for index, delta in enumerate(deltas):
+                current[index] += delta
+    totals = {key: deltas for key, deltas in totals.items() if any(deltas)}
+    if not totals:
+        return
+
+    table = connection.ops.quote_name(Warehouse._meta.db_table)
+    sql = (
+        f'UPDATE {table} SET item_count = item_count + %s, units = units + %s, critical_items = critical_items + %s, '
+        f'updated_at = %s WHERE {{hospital}} AND name = %s RETURNING {", ".join(LIVE_COLUMNS)}'
+    )
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = {}
+    with connection.cursor() as cursor:
+        for hospital_id, name in sorted(totals, key=lambda key: (key[0] or 0, key[1])):
+            if hospital_id is None:
+                cursor.execute(sql.format(hospital='hospital_id IS NULL'), [*totals[None, name], now, name])
+            else:
+                cursor.execute(sql.format(hospital='hospital_id = %s'), [*totals[hospital_id, name], now, hospital_id, name])
+            values = cursor.fetchone()
+            if values is not None:
+                rows.setdefault(hospital_id, []).append(live_row(*values))
+    keys = [live_cache_key(hospital_id) for hospital_id in {hospital_id for hospital_id, _ in totals}]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    publish_warehouse_stats(rows)
+
+
+def ensure_warehouses(hospital_id, names):
+    """Create the warehouses among ``names`` that ``hospital_id``'s tenant does not have yet."""
+    names = {name for name in names if name}
+    missing = names - set(for_tenant(Warehouse.objects, hospital_id).filter(name__in=names).values_list('name', flat=True))
+    if missing:
+        Warehouse.objects.bulk_create(
+            [Warehouse(hospital_id=hospital_id, name=name) for name in sorted(missing)], ignore_conflicts=True,
+        )
+
+
+def rebuild_warehouse_totals():
+    """Recompute the totals from the items, repairing drift left by writes that bypassed the ledger.
+
+    The warehouse rows are locked before the items are read, so a ledger write
+    still waiting on them adds its delta on top of the corrected totals.
+    Returns the number of warehouses corrected.
+    """
+    with transaction.atomic():
+        stored = {
+            (hospital_id, name): (item_count, units, critical_items)
+            for hospital_id, name, item_count, units, critical_items in Warehouse.objects.select_for_update()
+            .order_by('hospital', 'name').values_list('hospital', 'name', 'item_count', 'units', 'critical_items')
+        }
+        actual = {
+            (hospital_id, location): (item_count, units or 0, critical_items)
+            for hospital_id, location, item_count, units, critical_items in InventoryItem.objects
+            .filter(location_id__isnull=False).order_by().values('hospital', 'location_id').annotate(
+                item_count=Count('pk'), units=Sum('quantity'), critical_items=Count('pk', filter=Q(is_below_minimum=True)),
+            ).values_list('hospital', 'location_id', 'item_count', 'units', 'critical_items')
+        }
+        changes = [
+            (*key, *(now - then for now, then in zip(actual.get(key, (0, 0, 0)), totals)))
+            for key, totals in stored.items() if actual.get(key, (0, 0, 0)) != totals
+        ]
+        move_totals(changes)
+    return len(changes)
@@ -0,0 +1,39 @@
+from datetime import date
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, Supplier
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Time POST /api/orders/ for purchase orders of increasing line counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def run_benchmark(self, lines, repeat, **options):
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        supplier = Supplier.objects.create(name='Bench Supplier')
+        InventoryItem.objects.bulk_create(
+            InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:06d}', category='consumable', unit='pcs')
+            for i in range(max(lines))
+        )
+        item_ids = list(InventoryItem.objects.values_list('pk', flat=True))
+
+        number = 0
+        for size in lines:
+            payload_lines = [{'inventory_item': pk, 'quantity': 3, 'unit_price': '1.25'} for pk in item_ids[:size]]
+            for _ in range(repeat):
+                number += 1
+                payload = {'order_number': f'BENCH-{number}', 'supplier': supplier.pk, 'order_date': date.today().isoformat(), 'items': payload_lines}
+                with CaptureQueriesContext(connection) as ctx, self.timer(f'{size:>5}-line order', rows=size):
+                    response = client.post('/api/orders/', payload, format='json')
+                assert response.status_code == 201, response.data
+            self.stdout.write(f'  {len(ctx)} queries per order')
@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, Supplier
+from orders.models import OrderItem, PurchaseOrder
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Time POST /api/orders/{id}/receive/ for a large order, in one delivery and as a retry.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1000)
+
+    def run_benchmark(self, lines, **options):
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        supplier = Supplier.objects.create(name='Bench Supplier')
+        InventoryItem.objects.bulk_create(
+            InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:06d}', category='consumable', unit='pcs', quantity=i % 20)
+            for i in range(lines)
+        )
+        order = PurchaseOrder.objects.create(order_number='BENCH-1', supplier=supplier, order_date=date.today(), status='ordered')
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, inventory_item_id=pk, quantity=50, unit_price=1, total_price=50)
+            for pk in InventoryItem.objects.values_list('pk', flat=True)
+        )
+        expiry = (date.today() + timedelta(days=365)).isoformat()
+        payload = {
+            'reference': 'GRN-BENCH',
+            'lines': [
+                {'id': pk, 'quantity': 50, 'batch_number': 'LOT-1', 'expiry_date': expiry}
+                for pk in order.items.values_list('pk', flat=True)
+            ],
+        }
+        url = f'/api/orders/{order.pk}/receive/'
+
+        for label, expected in (('receive', 201), ('retry', 200)):
+            with CaptureQueriesContext(connection) as ctx, self.timer(f'{label} {lines}-line order', rows=lines):
+                response = client.post(url, payload, format='json')
+            assert response.status_code == expected, response.data
+            self.stdout.write(f'  {len(ctx)} queries')
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, Supplier
+from orders.models import OrderItem, PurchaseOrder
+from orders.replenishment import generate_reorders
+
+
+class Command(BenchmarkCommand):
+    help = 'Time a reorder run that drafts purchase orders across many items, suppliers and past order lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--suppliers', type=int, default=500)
+        parser.add_argument('--history', type=int, default=200000, help='Past order lines to choose prices from.')
+
+    def run_benchmark(self, items, suppliers, history, **options):
+        Supplier.objects.bulk_create(Supplier(name=f'Supplier {i}', rating=1 + i % 5) for i in range(suppliers))
+        supplier_ids = list(Supplier.objects.order_by('pk').values_list('pk', flat=True))
+        # Roughly a third of the items sit at or below their minimum.
+        InventoryItem.objects.bulk_create(
+            (
+                InventoryItem(
+                    name=f'Item {i}', sku=f'BENCH-{i:06d}', category='consumable', unit='pcs', quantity=(i * 7) % 60,
+                    minimum_stock=20, maximum_stock=100 if i % 2 else None, unit_price=1 + i % 20,
+                    supplier_id=supplier_ids[i % suppliers] if i % 10 else None,
+                )
+                for i in range(items)
+            ),
+            batch_size=5000,
+        )
+        item_ids = list(InventoryItem.objects.order_by('pk').values_list('pk', flat=True))
+
+        lines_per_order = 100
+        today = date.today()
+        PurchaseOrder.objects.bulk_create(
+            (
+                PurchaseOrder(
+                    order_number=f'HIST-{n}', supplier_id=supplier_ids[n % suppliers], order_date=today - timedelta(days=n % 365),
+                    status='ordered' if n % 50 == 0 else 'delivered',
+                )
+                for n in range(history // lines_per_order)
+            ),
+            batch_size=2000,
+        )
+        order_ids = list(PurchaseOrder.objects.order_by('pk').values_list('pk', flat=True))
+        OrderItem.objects.bulk_create(
+            (
+                OrderItem(
+                    order_id=order_ids[n // lines_per_order], inventory_item_id=item_ids[n * 7919 % items],
+                    quantity=10, unit_price=1 + n % 13, total_price=10 * (1 + n % 13),
+                )
+                for n in range(len(order_ids) * lines_per_order)
+            ),
+            batch_size=5000,
+        )
+
+        for dry_run in (True, False):
+            with CaptureQueriesContext(connection) as ctx, self.timer(f'reorder run ({"dry run" if dry_run else "drafts created"})', rows=items):
+                summary = generate_reorders(dry_run=dry_run)
+            self.stdout.write(
+                f"  {summary['items']} items on {len(summary['orders'])} draft orders, "
+                f"{summary['unsourced_items']} without a supplier, {len(ctx)} queries"
+            )
+        with self.timer('second run, everything already on order'):
+            summary = generate_reorders()
+        self.stdout.write(f"  {summary['items']} items")
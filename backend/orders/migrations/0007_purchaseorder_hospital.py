@@ -0,0 +1,61 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def adopt_sole_hospital(apps, schema_editor):
+    # Existing rows predate tenancy. With one hospital they are its rows; with several they
+    # stay unattached until assigned in the admin.
+    hospitals = list(apps.get_model('users', 'Hospital').objects.values_list('pk', flat=True)[:2])
+    if len(hospitals) == 1:
+        apps.get_model('orders', 'PurchaseOrder').objects.update(hospital_id=hospitals[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_hospital'),
+        ('orders', '0006_draft_status'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='purchaseorder',
+            name='po_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='purchaseorder',
+            name='po_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='purchaseorder',
+            name='po_open_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='purchaseorder',
+            name='po_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='purchase_orders', to='users.hospital'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['hospital', '-created_at'], name='po_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['hospital', 'status', '-created_at'], name='po_tenant_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'approved', 'ordered'])), fields=['hospital', '-created_at'], name='po_tenant_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['hospital', 'updated_at'], name='po_tenant_updated_idx'),
+        ),
+        migrations.RunPython(adopt_sole_hospital, migrations.RunPython.noop),
+    ]
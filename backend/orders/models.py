@@ -1,15 +1,18 @@
 from django.db import models
 from django.conf import settings
+from core.tenancy import hospital_field
 from inventory.models import InventoryItem, Supplier
 
 class PurchaseOrder(models.Model):
     STATUS_CHOICES = [
+        ('draft', 'Draft'),
         ('pending', 'Pending'),
         ('approved', 'Approved'),
         ('ordered', 'Ordered'),
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    hospital = hospital_field('purchase_orders')
     order_number = models.CharField(max_length=100, unique=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='orders')
     order_date = models.DateField()
@@ -22,6 +25,18 @@ class PurchaseOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', '-created_at'], name='po_tenant_created_idx'),
+            models.Index(fields=['hospital', 'status', '-created_at'], name='po_tenant_status_created_idx'),
+            models.Index(
+                fields=['hospital', '-created_at'],
+                condition=models.Q(status__in=['pending', 'approved', 'ordered']),
+                name='po_tenant_open_created_idx',
+            ),
+            models.Index(fields=['hospital', 'updated_at'], name='po_tenant_updated_idx'),
+        ]
+
     def __str__(self):
         return f"PO-{self.order_number}"
 
@@ -29,12 +44,33 @@ class OrderItem(models.Model):
     order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='items')
     inventory_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE)
     quantity = models.IntegerField()
+    received_quantity = models.IntegerField(default=0, editable=False)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
 
-    def save(self, *args, **kwargs):
+    def compute_total_price(self):
         self.total_price = self.quantity * self.unit_price
+        return self.total_price
+
+    def save(self, *args, **kwargs):
+        self.compute_total_price()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.inventory_item.name} for PO-{self.order.order_number}"
+
+class OrderReceipt(models.Model):
+    """One delivery booked against an order. ``reference`` makes retries idempotent."""
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='receipts')
+    reference = models.CharField(max_length=100)
+    lines = models.JSONField(default=list)
+    received_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'reference'], name='receipt_order_reference_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} for PO-{self.order.order_number}"
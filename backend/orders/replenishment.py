@@ -0,0 +1,141 @@
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Window
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from django.utils import timezone
+
+from core.cache import invalidate
+from inventory.models import InventoryItem, Supplier
+from .models import OrderItem, PurchaseOrder
+
+# Orders whose outstanding quantities are already on their way, drafts included
+# so that a second run does not suggest the same stock again.
+OPEN_STATUSES = ('draft', 'pending', 'approved', 'ordered')
+RUN_LOCK = 'orders:reorder-run'
+RUN_LOCK_TIMEOUT = 15 * 60
+
+
+class ReorderBusy(Exception):
+    pass
+
+
+def reorder_candidates(items=None):
+    """Items whose stock plus open orders is at or below their reorder level, with the quantity to order.
+
+    The reorder level is ``minimum_stock`` or the forecast reorder point,
+    whichever is higher. Items are ordered up to ``maximum_stock`` when it is
+    set, otherwise to the forecast order-up-to level or twice the minimum.
+    One query computes all of it, over ``items`` when given.
+    """
+    on_order = OrderItem.objects.filter(inventory_item=OuterRef('pk'), order__status__in=OPEN_STATUSES).order_by().values(
+        'inventory_item',
+    ).annotate(outstanding=Sum(F('quantity') - F('received_quantity'))).values('outstanding')
+    return (InventoryItem.objects if items is None else items).annotate(
+        on_order=Coalesce(Subquery(on_order), 0),
+        reorder_level=Greatest('minimum_stock', Coalesce('forecast__reorder_point', 0)),
+        target=Coalesce('maximum_stock', Greatest(Coalesce('forecast__order_up_to', 0), F('minimum_stock') * 2)),
+    ).filter(
+        quantity__lte=F('reorder_level') - F('on_order'),
+    ).annotate(
+        suggested=F('target') - F('quantity') - F('on_order'),
+    ).filter(suggested__gt=0).order_by()
+
+
+def last_prices(items):
+    """``{(item_id, supplier_id): unit_price}`` from each supplier's most recent order line for ``items``."""
+    lines = OrderItem.objects.filter(inventory_item__in=items).exclude(order__status='cancelled').annotate(
+        recency=Window(
+            RowNumber(), partition_by=[F('inventory_item'), F('order__supplier')],
+            order_by=[F('order__order_date').desc(), F('pk').desc()],
+        ),
+    ).filter(recency=1).values_list('inventory_item', 'order__supplier', 'unit_price')
+    return {(item_id, supplier_id): price for item_id, supplier_id, price in lines}
+
+
+def generate_reorders(user=None, dry_run=False, items=None):
+    """Create one draft purchase order per supplier for everything that needs reordering.
+
+    Each item goes to the best-rated supplier that has supplied it before or
+    is its default supplier, the cheaper last price breaking ties. Lines are
+    priced at that supplier's last price, or the item's unit price when it
+    has none. ``items`` limits the run to those inventory items, e.g. one
+    hospital's; each order belongs to its supplier's hospital. Runs are
+    serialised through a cache lock, which spans processes when the cache is
+    Redis. Returns a summary of the orders per supplier.
+    """
+    run = uuid.uuid4().hex[:8]
+    if not cache.add(RUN_LOCK, run, RUN_LOCK_TIMEOUT):
+        raise ReorderBusy('Another reorder run is in progress')
+    try:
+        with transaction.atomic():
+            summary = _generate(run, user, dry_run, items)
+            if dry_run:
+                transaction.set_rollback(True)
+    finally:
+        cache.delete(RUN_LOCK)
+    return summary
+
+
+def _generate(run, user, dry_run, scope):
+    candidates = reorder_candidates(scope)
+    items = list(candidates.values_list('pk', 'supplier_id', 'unit_price', 'suggested'))
+    prices = last_prices(candidates.values('pk'))
+    ratings, hospitals = {}, {}
+    for pk, rating, hospital_id in Supplier.objects.values_list('pk', 'rating', 'hospital_id'):
+        ratings[pk], hospitals[pk] = rating, hospital_id
+
+    offers = defaultdict(dict)
+    for (item_id, supplier_id), price in prices.items():
+        offers[item_id][supplier_id] = price
+    lines = defaultdict(list)
+    unsourced = 0
+    for item_id, default_supplier, unit_price, quantity in items:
+        choices = offers.get(item_id, {})
+        if default_supplier is not None:
+            choices.setdefault(default_supplier, unit_price)
+        if not choices:
+            unsourced += 1
+            continue
+        supplier_id = max(choices, key=lambda pk: (ratings.get(pk, 0), -choices[pk], -pk))
+        lines[supplier_id].append(OrderItem(
+            inventory_item_id=item_id, quantity=quantity, unit_price=choices[supplier_id],
+            total_price=quantity * choices[supplier_id],
+        ))
+
+    today = timezone.localdate()
+    orders = [
+        PurchaseOrder(
+            order_number=f'RO-{run}-{supplier_id}', supplier_id=supplier_id, hospital_id=hospitals.get(supplier_id),
+            order_date=today, status='draft',
+            total_amount=sum((line.total_price for line in supplier_lines), Decimal('0')), created_by=user,
+            notes=f'Suggested by reorder run {run}',
+        )
+        for supplier_id, supplier_lines in sorted(lines.items())
+    ]
+    PurchaseOrder.objects.bulk_create(orders, batch_size=500)
+    for order in orders:
+        for line in lines[order.supplier_id]:
+            line.order_id = order.pk
+    OrderItem.objects.bulk_create([line for order in orders for line in lines[order.supplier_id]], batch_size=1000)
+    if not dry_run:
+        invalidate(PurchaseOrder, OrderItem)
+
+    names = dict(Supplier.objects.filter(pk__in=lines.keys()).values_list('pk', 'name'))
+    return {
+        'run': run,
+        'dry_run': dry_run,
+        'items': sum(len(supplier_lines) for supplier_lines in lines.values()),
+        'unsourced_items': unsourced,
+        'orders': [
+            {
+                'order_id': None if dry_run else order.pk, 'order_number': order.order_number,
+                'supplier': order.supplier_id, 'supplier_name': names.get(order.supplier_id),
+                'lines': len(lines[order.supplier_id]), 'total_amount': f'{order.total_amount:.2f}',
+            }
+            for order in orders
+        ],
+    }
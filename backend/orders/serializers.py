@@ -1,21 +1,34 @@
+from collections import Counter
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import PurchaseOrder, OrderItem
+from core.cache import invalidate
+from core.tenancy import TenantRelatedMixin, for_tenant
+from .models import PurchaseOrder, OrderItem, OrderReceipt
 from inventory.models import InventoryItem, Supplier
 
+# What a line without an id must carry to be added to an order.
+NEW_LINE_FIELDS = {'inventory_item_id', 'quantity', 'unit_price'}
+
 class OrderItemSerializer(serializers.ModelSerializer):
+    # Lines are matched by id on nested update; existence of inventory items is
+    # checked for the whole order in one query by PurchaseOrderSerializer.
+    id = serializers.IntegerField(required=False)
+    inventory_item = serializers.IntegerField(source='inventory_item_id')
     inventory_item_name = serializers.ReadOnlyField(source='inventory_item.name')
     inventory_item_sku = serializers.ReadOnlyField(source='inventory_item.sku')
 
     class Meta:
         model = OrderItem
-        fields = ('id', 'inventory_item', 'inventory_item_name', 'inventory_item_sku', 'quantity', 'unit_price', 'total_price')
-        read_only_fields = ('total_price',)
+        fields = ('id', 'inventory_item', 'inventory_item_name', 'inventory_item_sku', 'quantity', 'received_quantity', 'unit_price', 'total_price')
+        read_only_fields = ('received_quantity', 'total_price')
 
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(TenantRelatedMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     supplier_name = serializers.ReadOnlyField(source='supplier.name')
     created_by_name = serializers.ReadOnlyField(source='created_by.username')
     approved_by_name = serializers.ReadOnlyField(source='approved_by.username')
+    tenant_related_fields = ('supplier',)
 
     class Meta:
         model = PurchaseOrder
@@ -27,14 +40,113 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('created_by', 'approved_by', 'total_amount', 'created_at', 'updated_at')
 
+    def validate_items(self, items):
+        repeated = sorted(pk for pk, count in Counter(line['id'] for line in items if 'id' in line).items() if count > 1)
+        if repeated:
+            raise serializers.ValidationError(f'Lines appear more than once: {repeated}')
+        # A PATCH leaves line fields optional, but a line without an id is created from its own fields alone.
+        incomplete = [index for index, line in enumerate(items) if 'id' not in line and not NEW_LINE_FIELDS <= line.keys()]
+        if incomplete:
+            raise serializers.ValidationError(f'New lines need an inventory item, quantity and unit price: {incomplete}')
+        item_ids = {line['inventory_item_id'] for line in items if 'inventory_item_id' in line}
+        inventory = InventoryItem.objects
+        if 'tenant_id' in self.context:
+            inventory = for_tenant(inventory, self.context['tenant_id'])
+        found = set(inventory.filter(pk__in=item_ids).values_list('pk', flat=True))
+        missing = sorted(item_ids - found)
+        if missing:
+            raise serializers.ValidationError(f'Inventory items do not exist: {missing}')
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        purchase_order = PurchaseOrder.objects.create(**validated_data)
-        total_amount = 0
-        for item_data in items_data:
-            item = OrderItem.objects.create(order=purchase_order, **item_data)
-            total_amount += item.total_price
-        
-        purchase_order.total_amount = total_amount
-        purchase_order.save()
+        lines = self._build_lines(items_data)
+        with transaction.atomic():
+            purchase_order = PurchaseOrder.objects.create(
+                total_amount=sum(line.total_price for line in lines), **validated_data,
+            )
+            for line in lines:
+                line.order = purchase_order
+            OrderItem.objects.bulk_create(lines, batch_size=500)
+            invalidate(OrderItem)
         return purchase_order
+
+    def update(self, instance, validated_data):
+        items_data = validated_data.pop('items', None)
+        with transaction.atomic():
+            if items_data is not None:
+                instance.total_amount = self._replace_lines(instance, items_data)
+            return super().update(instance, validated_data)
+
+    def _replace_lines(self, order, items_data):
+        """Sync the order's lines with ``items_data``: lines with an id are updated,
+        lines without one are added and existing lines not mentioned are removed."""
+        existing = {
+            line.pk: line
+            for line in order.items.select_for_update().only('id', 'inventory_item_id', 'quantity', 'received_quantity', 'unit_price')
+        }
+        mentioned = {data['id']: data for data in items_data if 'id' in data}
+        unknown = sorted(mentioned.keys() - existing.keys())
+        if unknown:
+            raise serializers.ValidationError({'items': f'Lines do not belong to this order: {unknown}'})
+
+        # Received stock is already on the shelf and in the ledger; its lines must keep accounting for it.
+        errors = []
+        for pk, line in existing.items():
+            if not line.received_quantity:
+                continue
+            data = mentioned.get(pk)
+            if data is None:
+                errors.append(f'Line {pk} has received stock and cannot be removed')
+            elif data.get('inventory_item_id', line.inventory_item_id) != line.inventory_item_id:
+                errors.append(f'Line {pk} has received stock and cannot change item')
+            elif data.get('quantity', line.quantity) < line.received_quantity:
+                errors.append(f'Line {pk} cannot be reduced below the {line.received_quantity} already received')
+        if errors:
+            raise serializers.ValidationError({'items': errors})
+
+        kept, added = [], []
+        for data in items_data:
+            if 'id' in data:
+                line = existing[data['id']]
+                for field, value in data.items():
+                    setattr(line, field, value)
+                line.compute_total_price()
+                kept.append(line)
+            else:
+                added.extend(self._build_lines([data]))
+        for line in added:
+            line.order = order
+
+        removed = existing.keys() - {line.pk for line in kept}
+        if removed:
+            OrderItem.objects.filter(pk__in=removed).delete()
+        OrderItem.objects.bulk_update(kept, ['inventory_item', 'quantity', 'unit_price', 'total_price'], batch_size=500)
+        OrderItem.objects.bulk_create(added, batch_size=500)
+        invalidate(OrderItem)
+        return sum(line.total_price for line in kept + added)
+
+    @staticmethod
+    def _build_lines(items_data):
+        lines = []
+        for data in items_data:
+            data = {field: value for field, value in data.items() if field != 'id'}
+            line = OrderItem(**data)
+            line.compute_total_price()
+            lines.append(line)
+        return lines
+
+class ReceiptLineSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    batch_number = serializers.CharField(max_length=100, required=False)
+    expiry_date = serializers.DateField(required=False)
+
+class ReceiveOrderSerializer(serializers.Serializer):
+    reference = serializers.CharField(max_length=100, required=False)
+    lines = ReceiptLineSerializer(many=True, required=False, allow_empty=False)
+
+class OrderReceiptSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderReceipt
+        fields = ('id', 'order', 'reference', 'lines', 'received_by', 'received_at')
@@ -0,0 +1,93 @@
+import uuid
+
+from django.db import transaction
+from core.bulk import update_rows
+from core.cache import invalidate
+from inventory.services import bulk_adjust_stock
+from .models import OrderItem, OrderReceipt, PurchaseOrder
+
+
+# Only orders that have been approved for the supplier can have deliveries booked against them.
+RECEIVABLE_STATUSES = ('approved', 'ordered', 'delivered')
+
+
+class ReceiptError(Exception):
+    pass
+
+
+def receive_order(order_id, lines=None, reference=None, user=None):
+    """Book a delivery against a purchase order and restock its items.
+
+    ``lines`` holds dicts with the order line ``id``, the ``quantity`` received
+    and optionally ``batch_number``/``expiry_date``; when omitted, everything
+    still outstanding is received. The order and its lines are locked, and the
+    stock moves through ``bulk_adjust_stock`` as ``restock`` ledger rows. A
+    retry with the same ``reference`` returns the original receipt instead of
+    restocking twice. Returns ``(receipt, created)``.
+    """
+    with transaction.atomic():
+        order = PurchaseOrder.objects.select_for_update().get(pk=order_id)
+        if reference:
+            existing = OrderReceipt.objects.filter(order=order, reference=reference).first()
+            if existing is not None:
+                return existing, False
+        if order.status not in RECEIVABLE_STATUSES:
+            raise ReceiptError(f'{order.get_status_display()} orders cannot be received')
+
+        reference = reference or uuid.uuid4().hex
+        order_lines = {
+            line.pk: line
+            for line in order.items.select_for_update().order_by('pk').only('id', 'order_id', 'inventory_item_id', 'quantity', 'received_quantity')
+        }
+        if lines is None:
+            lines = [
+                {'id': pk, 'quantity': line.quantity - line.received_quantity}
+                for pk, line in order_lines.items() if line.received_quantity < line.quantity
+            ]
+        if not lines:
+            raise ReceiptError('Nothing left to receive')
+
+        movements = []
+        errors = {}
+        for index, data in enumerate(lines):
+            line = order_lines.get(data['id'])
+            if line is None:
+                errors[index] = 'Line does not belong to this order'
+                continue
+            outstanding = line.quantity - line.received_quantity
+            if data['quantity'] > outstanding:
+                errors[index] = f'Only {outstanding} outstanding'
+                continue
+            line.received_quantity += data['quantity']
+            movements.append({
+                'item': line.inventory_item_id,
+                'quantity_change': data['quantity'],
+                'transaction_type': 'restock',
+                'notes': f'PO-{order.order_number} receipt {reference}',
+                'batch_number': data.get('batch_number'),
+                'expiry_date': data.get('expiry_date'),
+            })
+        if errors:
+            raise ReceiptError(errors)
+
+        results = bulk_adjust_stock(movements, user=user, allow_negative=True)
+        failed = {r['index']: r['error'] for r in results if r['status'] != 'ok'}
+        if failed:
+            raise ReceiptError(failed)
+
+        update_rows(OrderItem, order_lines.values(), ['received_quantity'])
+        invalidate(OrderItem)
+        if all(line.received_quantity >= line.quantity for line in order_lines.values()):
+            order.status = 'delivered'
+            order.save(update_fields=['status', 'updated_at'])
+
+        receipt = OrderReceipt.objects.create(
+            order=order,
+            reference=reference,
+            received_by=user,
+            lines=[
+                {'line': data['id'], 'item': result['item'], 'quantity': data['quantity'], 'new_quantity': result['new_quantity']}
+                for data, result in zip(lines, results)
+            ],
+        )
+    return receipt, True
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import metrics
+from core.cache import invalidate_on_change
+from inventory.signals import record_tombstone
+
+invalidate_on_change('orders.PurchaseOrder', 'orders.OrderItem')
+
+post_delete.connect(record_tombstone, sender='orders.PurchaseOrder', dispatch_uid='tombstone:orders.PurchaseOrder')
+
+
+@receiver(post_save, sender='orders.PurchaseOrder')
+def count_placed_order(sender, instance, created, **kwargs):
+    # Reorder drafts are bulk-created and only suggestions, so they never reach here.
+    if created and instance.status != 'draft':
+        transaction.on_commit(lambda: metrics.record('orders_placed', hospital_id=instance.hospital_id))
+
+
+@receiver(post_save, sender='orders.OrderReceipt')
+def count_receipt(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: metrics.record('orders_received', hospital_id=instance.order.hospital_id))
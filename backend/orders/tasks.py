@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from . import replenishment
+
+
+@shared_task
+def generate_reorders():
+    summary = replenishment.generate_reorders()
+    return {'orders': len(summary['orders']), 'items': summary['items'], 'unsourced_items': summary['unsourced_items']}
@@ -1,3 +1,308 @@
-from django.test import TestCase
+import csv
+import io
+import itertools
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from core import metrics
+from core.testing import QueryBudgetMixin
+from inventory.models import InventoryItem, Supplier, StockTransaction
+from reports.models import ItemForecast, OrderSpend
+from reports.services import refresh_supplier_spend
+from users.models import Hospital, User
+from .models import PurchaseOrder, OrderItem
+from .replenishment import RUN_LOCK
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='pw')
+        self.client.force_authenticate(self.user)
+        self.counter = itertools.count()
+
+    def seed_orders(self, n):
+        for _ in range(n):
+            i = next(self.counter)
+            supplier = Supplier.objects.create(name=f'Supplier {i}')
+            order = PurchaseOrder.objects.create(
+                order_number=f'PO-{i}', supplier=supplier, order_date=date.today(),
+                created_by=self.user, approved_by=self.user,
+            )
+            for line in range(3):
+                item = InventoryItem.objects.create(name=f'Item {i}-{line}', sku=f'SKU-{i}-{line}', category='medicine', unit='box')
+                OrderItem.objects.create(order=order, inventory_item=item, quantity=2, unit_price=Decimal('1.50'))
+
+    def test_order_list(self):
+        self.assertConstantQueries('/api/orders/', self.seed_orders)
+
+    def test_order_detail(self):
+        self.seed_orders(1)
+        order = PurchaseOrder.objects.get()
+        self.assertConstantQueries(f'/api/orders/{order.pk}/', lambda n: OrderItem.objects.bulk_create(
+            OrderItem(order=order, inventory_item=InventoryItem.objects.first(), quantity=1, unit_price=1, total_price=1)
+            for _ in range(n)
+        ))
+
+
+class PurchaseOrderWriteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='pw')
+        self.client.force_authenticate(self.user)
+        self.supplier = Supplier.objects.create(name='MedCo')
+        self.items = [
+            InventoryItem.objects.create(name=f'Item {i}', sku=f'SKU-{i}', category='medicine', unit='box')
+            for i in range(3)
+        ]
+        self.counter = itertools.count()
+
+    def payload(self, lines):
+        return {
+            'order_number': f'PO-{next(self.counter)}', 'supplier': self.supplier.pk, 'order_date': date.today().isoformat(),
+            'items': lines,
+        }
+
+    def post(self, lines):
+        return self.client.post('/api/orders/', self.payload(lines), format='json')
+
+    def test_create_totals_lines_in_constant_queries(self):
+        lines = [{'inventory_item': item.pk, 'quantity': 4, 'unit_price': '2.50'} for item in self.items]
+        response = self.post(lines)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total_amount'], '30.00')
+        self.assertEqual([line['total_price'] for line in response.data['items']], ['10.00'] * 3)
+        self.assertEqual(response.data['items'][0]['inventory_item_name'], 'Item 0')
+
+        counts = []
+        for size in (5, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post(lines[:1] * size).status_code, 201)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unknown_inventory_item_is_rejected_without_writes(self):
+        response = self.post([{'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '1'}, {'inventory_item': 999, 'quantity': 1, 'unit_price': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+    def test_nested_update_syncs_lines(self):
+        order = self.post([
+            {'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '1.00'},
+            {'inventory_item': self.items[1].pk, 'quantity': 1, 'unit_price': '1.00'},
+        ]).data
+        keep, drop = order['items']
+
+        response = self.client.patch(f"/api/orders/{order['id']}/", {'items': [
+            {'id': keep['id'], 'inventory_item': self.items[0].pk, 'quantity': 3, 'unit_price': '2.00'},
+            {'inventory_item': self.items[2].pk, 'quantity': 1, 'unit_price': '5.00'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['total_amount'], '11.00')
+        self.assertEqual(sorted(line['inventory_item'] for line in response.data['items']), [self.items[0].pk, self.items[2].pk])
+        self.assertFalse(OrderItem.objects.filter(pk=drop['id']).exists())
+
+        other = self.post([{'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '1'}]).data
+        response = self.client.patch(f"/api/orders/{order['id']}/", {'items': [
+            {'id': other['items'][0]['id'], 'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '1'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_new_lines_need_their_price_and_quantity(self):
+        order = self.post([{'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '1.00'}]).data
+        kept = {'id': order['items'][0]['id']}
+        for line in (
+            {'inventory_item': self.items[1].pk, 'quantity': 2},
+            {'inventory_item': self.items[1].pk, 'unit_price': '2.00'},
+            {'quantity': 2, 'unit_price': '2.00'},
+        ):
+            response = self.client.patch(f"/api/orders/{order['id']}/", {'items': [kept, line]}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('items', response.data)
+        self.assertEqual(OrderItem.objects.filter(order=order['id']).count(), 1)
+
+        # Lines with an id may still leave out what they don't change.
+        response = self.client.patch(f"/api/orders/{order['id']}/", {'items': [{**kept, 'quantity': 4}]}, format='json')
+        self.assertEqual((response.status_code, response.data['total_amount']), (200, '4.00'))
+
+    def test_repeated_line_is_rejected(self):
+        order = self.post([{'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '1.00'}]).data
+        line = {'id': order['items'][0]['id'], 'inventory_item': self.items[0].pk, 'quantity': 2, 'unit_price': '1.00'}
+        response = self.client.patch(f"/api/orders/{order['id']}/", {'items': [line, line]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PurchaseOrder.objects.get(pk=order['id']).total_amount, 1)
+
+    def test_received_lines_cannot_be_removed_or_reduced(self):
+        order = self.post([
+            {'inventory_item': self.items[0].pk, 'quantity': 5, 'unit_price': '1.00'},
+            {'inventory_item': self.items[1].pk, 'quantity': 5, 'unit_price': '1.00'},
+        ]).data
+        received, other = order['items']
+        OrderItem.objects.filter(pk=received['id']).update(received_quantity=3)
+        url = f"/api/orders/{order['id']}/"
+
+        for lines in (
+            [other],
+            [{**received, 'quantity': 2}, other],
+            [{**received, 'inventory_item': self.items[2].pk}, other],
+        ):
+            self.assertEqual(self.client.patch(url, {'items': lines}, format='json').status_code, 400)
+        self.assertEqual(OrderItem.objects.filter(order=order['id']).count(), 2)
+
+        response = self.client.patch(url, {'items': [{**received, 'quantity': 3}]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['total_amount'], '3.00')
+
+    def test_export_streams_one_row_per_line(self):
+        self.post([{'inventory_item': item.pk, 'quantity': 2, 'unit_price': '1.50'} for item in self.items])
+        self.post([{'inventory_item': self.items[0].pk, 'quantity': 1, 'unit_price': '4.00'}])
+        response = self.client.get('/api/orders/export/', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(
+            [(row['order_number'], row['sku'], row['total_price'], row['order_total']) for row in rows],
+            [('PO-0', 'SKU-0', '3.00', '9.00'), ('PO-0', 'SKU-1', '3.00', '9.00'), ('PO-0', 'SKU-2', '3.00', '9.00'), ('PO-1', 'SKU-0', '4.00', '4.00')],
+        )
+
+
+class ReceiveOrderTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='receiver', password='pw')
+        self.client.force_authenticate(self.user)
+        supplier = Supplier.objects.create(name='MedCo')
+        self.order = PurchaseOrder.objects.create(order_number='PO-1', supplier=supplier, order_date=date.today(), status='ordered')
+        self.item = InventoryItem.objects.create(name='Gloves', sku='GLV-1', category='consumable', unit='box', quantity=5)
+        self.other = InventoryItem.objects.create(name='Masks', sku='MSK-1', category='consumable', unit='box', quantity=0)
+        self.line = OrderItem.objects.create(order=self.order, inventory_item=self.item, quantity=10, unit_price=1)
+        OrderItem.objects.create(order=self.order, inventory_item=self.other, quantity=4, unit_price=1)
+        self.url = f'/api/orders/{self.order.pk}/receive/'
+
+    def test_partial_receipt_is_idempotent_and_completion_delivers(self):
+        payload = {'reference': 'GRN-1', 'lines': [{'id': self.line.pk, 'quantity': 6, 'batch_number': 'B42', 'expiry_date': '2030-01-31'}]}
+        first = self.client.post(self.url, payload, format='json')
+        self.assertEqual(first.status_code, 201, first.data)
+        retry = self.client.post(self.url, payload, format='json')
+        self.assertEqual((retry.status_code, retry.data['id']), (200, first.data['id']))
+
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.batch_number, self.item.expiry_date), (11, 'B42', date(2030, 1, 31)))
+        self.assertEqual(StockTransaction.objects.filter(transaction_type='restock').count(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'ordered')
+
+        rest = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='GRN-2')
+        self.assertEqual(rest.status_code, 201, rest.data)
+        self.assertEqual(sorted(line['quantity'] for line in rest.data['lines']), [4, 4])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'delivered')
+        self.assertEqual(InventoryItem.objects.get(pk=self.other.pk).quantity, 4)
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, 400)
+
+    def test_over_receipt_changes_nothing(self):
+        response = self.client.post(self.url, {'lines': [{'id': self.line.pk, 'quantity': 11}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(InventoryItem.objects.get(pk=self.item.pk).quantity, 5)
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_unplaced_orders_cannot_be_received(self):
+        for status in ('draft', 'pending', 'cancelled'):
+            PurchaseOrder.objects.filter(pk=self.order.pk).update(status=status)
+            self.assertEqual(self.client.post(self.url, {}, format='json').status_code, 400)
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_placed_orders_and_receipts_are_counted(self):
+        metrics.counter.reset()
+        self.addCleanup(metrics.counter.reset)
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseOrder.objects.create(order_number='PO-2', supplier=self.order.supplier, order_date=date.today(), status='ordered')
+            PurchaseOrder.objects.create(order_number='PO-3', supplier=self.order.supplier, order_date=date.today(), status='draft')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {}, format='json')
+        counts = metrics.windows()['minute']
+        self.assertEqual((counts['orders_placed'], counts['orders_received'], counts['stock_moves']), (1, 1, 2))
+
+
+class ReorderTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='pw')
+        self.client.force_authenticate(self.user)
+        self.acme = Supplier.objects.create(name='Acme', rating=5)
+        self.budget = Supplier.objects.create(name='Budget', rating=3)
+        self.cheap = Supplier.objects.create(name='Cheap', rating=5)
+
+        def item(sku, **fields):
+            return InventoryItem.objects.create(name=sku.title(), sku=sku, category='medicine', unit='box', **fields)
+
+        self.saline = item('saline', quantity=2, minimum_stock=10, maximum_stock=50, supplier=self.budget)
+        self.gauze = item('gauze', quantity=5, minimum_stock=10, supplier=self.budget, unit_price=Decimal('0.80'))
+        self.insulin = item('insulin', quantity=15, minimum_stock=10, supplier=self.acme, unit_price=Decimal('9.00'))
+        item('masks', quantity=50, minimum_stock=10, supplier=self.budget)
+        item('orphan', quantity=0, minimum_stock=5)
+        ItemForecast.objects.create(item=self.insulin, through=date.today(), model='smoothing', reorder_point=20, order_up_to=40)
+
+        # Acme and Cheap are rated alike, so the cheaper last price wins; the older Cheap price is superseded.
+        for supplier, price, age in ((self.acme, '2.00', 1), (self.cheap, '1.90', 9), (self.cheap, '1.50', 2)):
+            order = PurchaseOrder.objects.create(
+                order_number=f'H-{supplier.pk}-{age}', supplier=supplier, order_date=date.today() - timedelta(days=age), status='delivered',
+            )
+            OrderItem.objects.create(order=order, inventory_item=self.saline, quantity=1, unit_price=Decimal(price))
+        pending = PurchaseOrder.objects.create(order_number='P-1', supplier=self.budget, order_date=date.today())
+        OrderItem.objects.create(order=pending, inventory_item=self.gauze, quantity=3, unit_price=Decimal('0.80'))
+
+    def drafts(self):
+        return sorted(
+            (line.order.supplier.name, line.inventory_item.sku, line.quantity, line.unit_price)
+            for line in OrderItem.objects.filter(order__status='draft').select_related('order__supplier', 'inventory_item')
+        )
+
+    def test_drafts_follow_levels_forecasts_and_supplier_choice(self):
+        dry = self.client.post('/api/orders/reorder/', {'dry_run': True}, format='json')
+        self.assertEqual(dry.status_code, 200)
+        self.assertEqual((dry.data['items'], dry.data['unsourced_items'], len(dry.data['orders'])), (3, 1, 3))
+        self.assertEqual(self.drafts(), [])
+
+        response = self.client.post('/api/orders/reorder/', {}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.drafts(), [
+            ('Acme', 'insulin', 25, Decimal('9.00')),
+            ('Budget', 'gauze', 12, Decimal('0.80')),
+            ('Cheap', 'saline', 48, Decimal('1.50')),
+        ])
+        order = PurchaseOrder.objects.get(status='draft', supplier=self.cheap)
+        self.assertEqual((order.total_amount, order.created_by), (Decimal('72.00'), self.user))
+
+        # Drafts count as on order, so a second run finds nothing, and they are not spend yet.
+        again = self.client.post('/api/orders/reorder/', {}, format='json')
+        self.assertEqual((again.status_code, again.data['orders']), (200, []))
+        refresh_supplier_spend()
+        self.assertFalse(OrderSpend.objects.filter(order_id=order.pk).exists())
+
+    def test_runs_from_a_hospital_only_draft_its_items(self):
+        mary = Hospital.objects.create(name='St. Mary')
+        supplier = Supplier.objects.create(name='Ward supplies', hospital=mary)
+        InventoryItem.objects.create(
+            name='Gowns', sku='gowns', category='consumable', unit='box', quantity=0, minimum_stock=5, supplier=supplier, hospital=mary,
+        )
+        self.client.force_authenticate(User.objects.create_user(username='mary-buyer', password='pw', hospital=mary))
+
+        response = self.client.post('/api/orders/reorder/', {}, format='json')
+        self.assertEqual([order['supplier_name'] for order in response.data['orders']], ['Ward supplies'])
+        self.assertEqual(PurchaseOrder.objects.get(status='draft').hospital, mary)
+        self.assertEqual([order['order_number'] for order in self.client.get('/api/orders/').data], [response.data['orders'][0]['order_number']])
+
+        # Nor can its orders use another hospital's items or suppliers.
+        gowns = InventoryItem.objects.get(sku='gowns')
+        for supplier, item, error in ((supplier, self.saline, 'items'), (self.acme, gowns, 'supplier')):
+            response = self.client.post('/api/orders/', {
+                'order_number': 'PO-X', 'supplier': supplier.pk, 'order_date': date.today().isoformat(),
+                'items': [{'inventory_item': item.pk, 'quantity': 1, 'unit_price': '1'}],
+            }, format='json')
+            self.assertEqual((response.status_code, list(response.data)), (400, [error]))
+
+    def test_concurrent_run_is_refused(self):
+        cache.add(RUN_LOCK, 'other')
+        self.addCleanup(cache.delete, RUN_LOCK)
+        self.assertEqual(self.client.post('/api/orders/reorder/', {}, format='json').status_code, 409)
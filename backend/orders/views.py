@@ -1,11 +1,84 @@
-from rest_framework import viewsets, permissions
-from .models import PurchaseOrder
-from .serializers import PurchaseOrderSerializer
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from core.cache import CachedResponseMixin, generations
+from core.conditional import WatermarkMixin
+from core.export import CSVRenderer, XLSXRenderer, export_response
+from core.tenancy import TenantScopedMixin, for_tenant
+from inventory.models import InventoryItem, Supplier, Tombstone
+from .models import PurchaseOrder, OrderItem
+from .serializers import PurchaseOrderSerializer, ReceiveOrderSerializer, OrderReceiptSerializer
+from . import replenishment, services
 
-class PurchaseOrderViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseOrder.objects.all().order_by('-created_at')
+class PurchaseOrderViewSet(TenantScopedMixin, WatermarkMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = PurchaseOrder.objects.select_related('supplier', 'created_by', 'approved_by').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('inventory_item').only(
+            'id', 'order_id', 'quantity', 'received_quantity', 'unit_price', 'total_price', 'inventory_item__name', 'inventory_item__sku',
+        ))
+    ).order_by('-created_at')
     serializer_class = PurchaseOrderSerializer
+    cache_dependencies = (PurchaseOrder, OrderItem, InventoryItem, Supplier)
+    tombstone_model = Tombstone
     permission_classes = [permissions.IsAuthenticated]
+    # One row per order line, led by its order's columns.
+    export_columns = [
+        ('order_id', 'order_id'), ('order_number', 'order__order_number'), ('status', 'order__status'),
+        ('order_date', 'order__order_date'), ('expected_delivery', 'order__expected_delivery'),
+        ('supplier', 'order__supplier__name'), ('order_total', 'order__total_amount'), ('line_id', 'id'),
+        ('sku', 'inventory_item__sku'), ('item', 'inventory_item__name'), ('quantity', 'quantity'),
+        ('received_quantity', 'received_quantity'), ('unit_price', 'unit_price'), ('total_price', 'total_price'),
+    ]
+
+    def get_fingerprint_extra(self, request):
+        # Nested lines and the names they show can change without touching the order.
+        return tuple(generations([OrderItem, InventoryItem, Supplier]))
 
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        serializer.save(created_by=self.request.user, hospital_id=self.tenant_id)
+        self._reload(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self._reload(serializer)
+
+    def _reload(self, serializer):
+        # Render the response through the prefetching queryset instead of one query per line.
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, XLSXRenderer])
+    def export(self, request):
+        orders = self.filter_queryset(self.get_queryset()).order_by().values('pk')
+        lines = OrderItem.objects.filter(order__in=orders).order_by('order_id', 'pk')
+        return export_response(request, lines, self.export_columns, 'orders')
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        # Also run on a schedule by orders.tasks.generate_reorders.
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            summary = replenishment.generate_reorders(
+                user=request.user, dry_run=dry_run, items=for_tenant(InventoryItem.objects, self.tenant_id),
+            )
+        except replenishment.ReorderBusy as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+        created = not dry_run and summary['orders']
+        return Response(summary, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def receive(self, request, pk=None):
+        order = get_object_or_404(self.get_queryset().prefetch_related(None), pk=pk)
+        self.check_object_permissions(request, order)
+        serializer = ReceiveOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            receipt, created = services.receive_order(
+                order.pk,
+                lines=serializer.validated_data.get('lines'),
+                reference=serializer.validated_data.get('reference') or request.headers.get('Idempotency-Key'),
+                user=request.user,
+            )
+        except services.ReceiptError as exc:
+            return Response({'error': exc.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(OrderReceiptSerializer(receipt).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
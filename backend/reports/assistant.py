@@ -0,0 +1,353 @@
+"""Answers to inventory questions, worked out locally from live data.
+
+A question is matched to an intent by keyword rules and its parameters (a
+period, a category, a location, a count) are read off the text. Each intent
+and parameter shape compiles its ORM query to SQL once; later questions of
+the same shape only bind new values, so an answer costs one query.
+"""
+import re
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F, Sum, Window
+from django.utils import timezone
+
+from inventory.models import EXPIRY_WARNING_DAYS, InventoryItem, Warehouse
+from core.tenancy import for_tenant
+from orders.replenishment import reorder_candidates
+from .models import DailyItemMovement
+
+LOCATIONS_CACHE_KEY = 'reports:assistant-locations'
+LOCATIONS_TIMEOUT = 300
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# How many rows are named in the answer text; the rest are only in ``rows``.
+MENTIONED = 5
+
+# Checked in order, so the narrower phrasings win.
+INTENT_RULES = [
+    ('expired', re.compile(r'\bexpired\b|\bout of date\b')),
+    ('expiring', re.compile(r'\bexpir|\bgoing off\b')),
+    ('top_consumed', re.compile(r'\b(top|most|highest|fastest)\b.*\b(consum|us(e|ed|age)|demand|mov)|\bconsumption\b')),
+    ('restock', re.compile(r'\b(re-?stock|re-?order|order more|buy|run(ning)? out)')),
+    ('low_stock', re.compile(r'\blow\b|\bbelow (the )?min|\bshort\b|\bcritical\b|\bout of stock\b')),
+    ('item_stock', re.compile(r'\b(how (many|much)|stock (level )?(of|for)|do we have( any)?)\s+(?P<term>.+)')),
+    ('greeting', re.compile(r'^\W*(hi|hello|hey|good (morning|afternoon|evening))\b')),
+]
+UNITS = {'day': 1, 'week': 7, 'month': 30}
+PERIOD = re.compile(r'\b(?:in|within|next|over|last|past|for)\s+(?:the\s+)?(?:(\d+)\s+)?(day|week|month)s?\b')
+NAMED_PERIODS = {'today': 0, 'tomorrow': 1, 'this week': 7, 'this month': 30}
+LIMIT = re.compile(r'\btop\s+(\d+)\b')
+# Trailing words of a "how much X ..." question that are not part of the item name.
+TERM_FILLER = re.compile(r'(\s+(do|does|we|have|are|is|there|left|in stock|on hand|remaining)\b|\W)+$')
+
+# How each parameter is bound into a compiled plan, and the placeholder value
+# a plan is compiled with so the parameter's position can be found in it.
+KINDS = {'start': 'date', 'end': 'date', 'category': 'text', 'location': 'text', 'term': 'contains', 'hospital': 'id'}
+
+
+# Items key their warehouse by name in ``location_id``; answers call it ``location``.
+LABELS = {'location_id': 'location'}
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def _bind(kind, value):
+    if kind == 'date':
+        return connection.ops.adapt_datefield_value(value)
+    if kind == 'contains':
+        return f'%{connection.ops.prep_for_like_query(value)}%'
+    return value
+
+
+def _placeholder(kind, position):
+    if kind == 'date':
+        return date(1000, 1, 1) + timedelta(days=position)
+    if kind == 'id':
+        return -1000000 - position
+    return f'\x00param{position}'
+
+
+class Plan:
+    """A queryset compiled once, its parameters re-bound on each run."""
+
+    def __init__(self, build, names):
+        placeholders = {name: _placeholder(KINDS[name], position) for position, name in enumerate(names)}
+        queryset = build(placeholders)
+        self.compiler = queryset.query.get_compiler(using=queryset.db)
+        self.sql, params = self.compiler.as_sql()
+        query = queryset.query
+        self.columns = [LABELS.get(name, name) for name in (*query.extra_select, *query.values_select, *query.annotation_select)]
+        self.converters = self.compiler.get_converters([expression for expression, _, _ in self.compiler.select])
+        bound = {_bind(KINDS[name], value): name for name, value in placeholders.items()}
+        self.slots = [(bound.get(value), value) for value in params]
+
+    def run(self, params):
+        values = [value if name is None else _bind(KINDS[name], params[name]) for name, value in self.slots]
+        with connection.cursor() as cursor:
+            cursor.execute(self.sql, values)
+            rows = cursor.fetchall()
+        if self.converters:
+            rows = self.compiler.apply_converters(rows, self.converters)
+        return [dict(zip(self.columns, row)) for row in rows]
+
+
+_plans = {}
+
+
+def plan(intent, params, limit):
+    names = tuple(sorted(name for name in params if name in KINDS))
+    key = (intent, names, limit)
+    if key not in _plans:
+        build = QUERIES[intent]
+        _plans[key] = Plan(lambda values: build(values)[:limit], names)
+    return _plans[key]
+
+
+def _where(queryset, params, through=None):
+    # The unattached tenant has no ``hospital`` parameter and compiles to IS NULL.
+    queryset = for_tenant(queryset, params.get('hospital'), through)
+    for name, field in (('category', 'category'), ('location', 'location_id')):
+        if name in params:
+            queryset = queryset.filter(**{field: params[name]})
+    return queryset
+
+
+def _total():
+    return Window(Count('pk'))
+
+
+def _low_stock(params):
+    return _where(InventoryItem.objects.filter(is_below_minimum=True), params).annotate(
+        shortfall=F('minimum_stock') - F('quantity'), total=_total(),
+    ).order_by('-shortfall', 'pk').values_list('pk', 'name', 'sku', 'quantity', 'minimum_stock', 'location_id', 'total')
+
+
+def _expiring(params):
+    return _where(InventoryItem.objects.filter(
+        expiry_date__gte=params['start'], expiry_date__lte=params['end'], quantity__gt=0,
+    ), params).annotate(total=_total()).order_by('expiry_date', 'pk').values_list(
+        'pk', 'name', 'sku', 'quantity', 'expiry_date', 'batch_number', 'location_id', 'total',
+    )
+
+
+def _expired(params):
+    return _where(InventoryItem.objects.filter(expiry_date__lt=params['end'], quantity__gt=0), params).annotate(
+        total=_total(),
+    ).order_by('expiry_date', 'pk').values_list('pk', 'name', 'sku', 'quantity', 'expiry_date', 'location_id', 'total')
+
+
+def _top_consumed(params):
+    rows = for_tenant(DailyItemMovement.objects, params.get('hospital')).filter(
+        date__gte=params['start'], date__lte=params['end'],
+    )
+    if 'category' in params:
+        rows = rows.filter(category=params['category'])
+    if 'location' in params:
+        rows = rows.filter(item__location_id=params['location'])
+    return rows.values('item').annotate(
+        consumed=Sum('consumed'), consumed_value=Sum('consumed_value'),
+    ).filter(consumed__gt=0).order_by('-consumed', 'item')
+
+
+def _restock(params):
+    return _where(reorder_candidates(), params).annotate(total=_total()).order_by('-suggested', 'pk').values_list(
+        'pk', 'name', 'sku', 'quantity', 'reorder_level', 'on_order', 'suggested', 'total',
+    )
+
+
+def _item_stock(params):
+    return _where(InventoryItem.objects.filter(name__icontains=params['term']), params).annotate(
+        total=_total(),
+    ).order_by('name', 'pk').values_list('pk', 'name', 'sku', 'quantity', 'minimum_stock', 'unit', 'location_id', 'total')
+
+
+QUERIES = {
+    'low_stock': _low_stock,
+    'expiring': _expiring,
+    'expired': _expired,
+    'top_consumed': _top_consumed,
+    'restock': _restock,
+    'item_stock': _item_stock,
+}
+
+
+def known_locations(hospital_id=None):
+    return cache.get_or_set(f'{LOCATIONS_CACHE_KEY}:{hospital_id if hospital_id is not None else "none"}', lambda: sorted(
+        for_tenant(Warehouse.objects, hospital_id).values_list('name', flat=True), key=len, reverse=True,
+    ), LOCATIONS_TIMEOUT)
+
+
+def parse(question, today=None, hospital_id=None):
+    """``(intent, params, limit)`` for a question; the intent is None when nothing matches.
+
+    Locations are matched against ``hospital_id``'s warehouses.
+    """
+    today = today or timezone.localdate()
+    text = ' '.join(question.lower().split())
+    intent, match = next(((name, found) for name, rule in INTENT_RULES if (found := rule.search(text))), (None, None))
+    params = {}
+    if intent in (None, 'greeting'):
+        return intent, params, DEFAULT_LIMIT
+
+    days = next((value for phrase, value in NAMED_PERIODS.items() if phrase in text), None)
+    if (period := PERIOD.search(text)) is not None:
+        days = int(period.group(1) or 1) * UNITS[period.group(2)]
+    if intent == 'expiring':
+        days = EXPIRY_WARNING_DAYS if days is None else days
+        params.update(start=today, end=today + timedelta(days=days))
+    elif intent == 'expired':
+        params.update(end=today)
+    elif intent == 'top_consumed':
+        days = max(days if days is not None else 7, 1)
+        params.update(start=today - timedelta(days=days - 1), end=today)
+    elif intent == 'item_stock':
+        params['term'] = match.group('term')
+
+    for value, label in InventoryItem.CATEGORY_CHOICES:
+        if re.search(rf'\b{value}s?\b', text):
+            params['category'] = value
+            break
+    for location in known_locations(hospital_id):
+        if location.lower() in text:
+            params['location'] = location
+            if 'term' in params:
+                params['term'] = re.sub(rf'\s*\b(in|at)\s+{re.escape(location.lower())}\b', '', params['term'])
+            break
+    if 'term' in params:
+        params['term'] = TERM_FILLER.sub('', params['term']).strip()
+    limit = LIMIT.search(text)
+    return intent, params, min(max(int(limit.group(1)), 1), MAX_LIMIT) if limit else DEFAULT_LIMIT
+
+
+@contextmanager
+def query_deadline(seconds):
+    """Abort the queries run inside the block once ``seconds`` have passed, raising QueryTimeout."""
+    deadline = time.monotonic() + seconds
+    try:
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s', [max(1, int(seconds * 1000))])
+                yield
+        elif connection.vendor == 'sqlite':
+            connection.ensure_connection()
+            # Checked every thousand virtual machine instructions.
+            connection.connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+            try:
+                yield
+            finally:
+                connection.connection.set_progress_handler(None, 0)
+        else:
+            yield
+    except OperationalError as exc:
+        if time.monotonic() < deadline:
+            raise
+        raise QueryTimeout(f'Query took longer than {seconds}s') from exc
+
+
+def _names(rows, describe, total):
+    mentioned = ', '.join(describe(row) for row in rows[:MENTIONED])
+    more = total - min(len(rows), MENTIONED)
+    return f'{mentioned} and {more} more' if more > 0 else mentioned
+
+
+def _scope(params):
+    return f" {params['category']}" if 'category' in params else ''
+
+
+def _where_text(params):
+    return f" in {params['location']}" if 'location' in params else ''
+
+
+def _plural(count, word):
+    return f"{count} {word}{'' if count == 1 else 's'}"
+
+
+def _answer(intent, params, rows):
+    total = rows[0]['total'] if rows and 'total' in rows[0] else len(rows)
+    where = _where_text(params)
+    things = f'{_scope(params)} item'.strip()
+    if intent == 'low_stock':
+        if not rows:
+            return f'No{_scope(params)} items are below their minimum stock{where}.'
+        return (
+            f"{_plural(total, things)} {'is' if total == 1 else 'are'} below minimum stock{where}: "
+            + _names(rows, lambda row: f"{row['name']} ({row['quantity']} of {row['minimum_stock']})", total) + '.'
+        )
+    if intent == 'expiring':
+        window = 'today' if params['end'] == params['start'] else f"by {params['end']:%Y-%m-%d}"
+        if not rows:
+            return f'Nothing{where} expires {window}.'
+        return f"{_plural(total, things)}{where} expire {window}: " + _names(
+            rows, lambda row: f"{row['name']} ({row['quantity']}, {row['expiry_date']:%Y-%m-%d})", total,
+        ) + '.'
+    if intent == 'expired':
+        if not rows:
+            return f'No expired stock is left{where}.'
+        return f"{_plural(total, things)}{where} {'has' if total == 1 else 'have'} expired stock on hand: " + _names(
+            rows, lambda row: f"{row['name']} ({row['quantity']}, expired {row['expiry_date']:%Y-%m-%d})", total,
+        ) + '.'
+    if intent == 'top_consumed':
+        days = (params['end'] - params['start']).days + 1
+        period = 'today' if days == 1 else f'in the last {days} days'
+        if not rows:
+            return f'Nothing{_scope(params)} was consumed{where} {period}.'
+        return f'Most consumed{where} {period}: ' + _names(
+            rows, lambda row: f"{row['name']} ({row['consumed']})", len(rows),
+        ) + '.'
+    if intent == 'restock':
+        if not rows:
+            return f'Nothing{where} needs reordering; stock and open orders cover every reorder level.'
+        return f'Reorder {_plural(total, things)}{where}: ' + _names(
+            rows, lambda row: f"{row['name']} ({row['suggested']} more)", total,
+        ) + '.'
+    if not rows:
+        return f"I couldn't find an item matching \"{params['term']}\"{where}."
+    return _names(rows, lambda row: (
+        f"{row['name']}: {row['quantity']} {row['unit']} in stock (minimum {row['minimum_stock']})"
+        + (f" at {row['location']}" if row['location'] else '')
+    ), total) + '.'
+
+
+GREETING = (
+    'Hello! Ask me about low stock, what expires soon (e.g. "expiring in 7 days in Main Warehouse"), '
+    'what was consumed most this week, what to reorder, or how much of an item is in stock.'
+)
+FALLBACK = (
+    "I can answer questions about low stock, expiring or expired items, top consumed items, "
+    'what to reorder and stock of a named item.'
+)
+
+
+def _serialise(row):
+    row = {key: value for key, value in row.items() if key != 'total'}
+    if 'consumed_value' in row:
+        row['consumed_value'] = f"{row['consumed_value']:.2f}"
+    return row
+
+
+def answer(question, timeout=None, today=None, hospital_id=None):
+    """The answer to ``question`` from ``hospital_id``'s data, with its intent, parameters and the rows it was drawn from."""
+    intent, params, limit = parse(question, today, hospital_id)
+    result = {'intent': intent, 'params': {**params, 'limit': limit} if intent in QUERIES else {}, 'rows': []}
+    if intent not in QUERIES:
+        return {**result, 'answer': GREETING if intent == 'greeting' else FALLBACK}
+    scoped = params if hospital_id is None else {**params, 'hospital': hospital_id}
+    timeout = settings.ASSISTANT_QUERY_TIMEOUT if timeout is None else timeout
+    try:
+        with query_deadline(timeout):
+            rows = plan(intent, scoped, limit).run(scoped)
+    except QueryTimeout:
+        return {**result, 'timed_out': True, 'answer': 'That question took too long to answer; try narrowing it down.'}
+    if intent == 'top_consumed':
+        # Label only the rows returned rather than joining every item-day.
+        items = dict(InventoryItem.objects.filter(pk__in=[row['item'] for row in rows]).values_list('pk', 'name'))
+        for row in rows:
+            row['name'] = items.get(row['item'])
+    return {**result, 'rows': [_serialise(row) for row in rows], 'answer': _answer(intent, params, rows)}
@@ -0,0 +1,275 @@
+from datetime import date, timedelta
+from itertools import chain
+
+import numpy as np
+from django.db import connection
+from django.db.models import Count, F, Func, IntegerField, Max, Min, Q, Sum
+from django.utils import timezone
+
+from core.bulk import upsert_rows
+from core.tenancy import for_tenant
+from inventory.models import InventoryItem, StockTransaction
+from .models import DailyItemMovement, ItemForecast, RollupWatermark
+from .services import LEDGER_WATERMARK
+
+# Smoothing constants: roughly the last ten days of demand for the forecast,
+# the last fifty for the baseline it is compared against.
+SMOOTHING = 0.1
+BASELINE_SMOOTHING = 0.02
+# Items with an average of 1.32 days or more between demands are intermittent
+# (Syntetos & Boylan) and forecast with Croston's method rather than plain smoothing.
+INTERMITTENT_INTERVAL = 1.32
+LEAD_TIME_DAYS = 7
+REVIEW_DAYS = 14
+# Safety stock for a 95% cycle service level.
+SERVICE_LEVEL_Z = 1.65
+CHUNK_ITEMS = 5000
+EPOCH = date(1970, 1, 1)
+# Overall stockout risk by the share of items that run out within the lead time.
+RISK_SHARES = (('high', 0.1), ('medium', 0.02))
+
+STATE_FIELDS = ('through', 'days', 'demand_days', 'level', 'baseline', 'size', 'interval', 'since', 'error')
+COUNT_FIELDS = ('days', 'demand_days', 'since')
+DERIVED_FIELDS = ('model', 'daily_demand', 'baseline_demand', 'reorder_point', 'order_up_to')
+
+
+def complete_through():
+    """The last day whose consumption is entirely in the daily item rollups."""
+    watermark = RollupWatermark.objects.filter(name=LEDGER_WATERMARK).values_list('last_id', flat=True).first() or 0
+    pending = StockTransaction.objects.filter(pk__gt=watermark).order_by('pk').values_list('performed_at', flat=True).first()
+    yesterday = timezone.localdate() - timedelta(days=1)
+    if pending is None:
+        return yesterday
+    return min(yesterday, timezone.localdate(pending) - timedelta(days=1))
+
+
+def refresh_forecasts(through=None, chunk_size=CHUNK_ITEMS):
+    """Fold the days completed since the last run into every item's forecast.
+
+    Demand comes from ``DailyItemMovement.consumed``, which the rollup refresh
+    keeps in step with the ``consume`` rows of the ledger. Each item's models
+    carry on from the day they were last folded through, so a daily run reads
+    one day of rollups; the first run reads the whole history. Items are
+    processed ``chunk_size`` at a time as a days x items array, stepping
+    through the days with every item's update done at once. Returns the number
+    of items whose forecast moved.
+    """
+    through = through or complete_through()
+    history_start = DailyItemMovement.objects.aggregate(start=Min('date'))['start']
+    if history_start is None or history_start > through:
+        return 0
+    folded = 0
+    last = 0
+    while True:
+        items = list(
+            InventoryItem.objects.filter(pk__gt=last).order_by('pk').values_list('pk', 'created_at')[:chunk_size]
+        )
+        if not items:
+            return folded
+        last = items[-1][0]
+        folded += _refresh_chunk(items, history_start, through)
+
+
+def rebuild_forecasts(through=None):
+    ItemForecast.objects.all().delete()
+    return refresh_forecasts(through)
+
+
+def _refresh_chunk(items, history_start, through):
+    ids = np.array([pk for pk, _ in items], dtype=np.int64)
+    id_range = (items[0][0], items[-1][0])
+    stored = {
+        row[0]: row[1:]
+        for row in ItemForecast.objects.filter(pk__gte=id_range[0], pk__lte=id_range[1]).values_list('item_id', *STATE_FIELDS)
+    }
+    state = _empty_state(len(ids))
+    last_folded = []
+    for index, (pk, created_at) in enumerate(items):
+        if pk in stored:
+            day, *values = stored[pk]
+            for name, value in zip(STATE_FIELDS[1:], values):
+                state[name][index] = value
+        else:
+            # A new item's series starts when it was added, or when the history does.
+            day = max(timezone.localdate(created_at), history_start) - timedelta(days=1)
+        last_folded.append(day)
+
+    pending = np.array([day < through for day in last_folded])
+    if not pending.any():
+        return 0
+    window_start = min(day for day, due in zip(last_folded, pending) if due) + timedelta(days=1)
+    days = (through - window_start).days + 1
+    begin = np.array([(day - window_start).days + 1 for day in last_folded])
+
+    fold(state, _demand(ids, id_range, window_start, through, days), begin)
+    derived = derive(state)
+
+    index = np.flatnonzero(pending)
+    ops = connection.ops
+    columns = [
+        ids[index].tolist(),
+        [ops.adapt_datefield_value(through)] * len(index),
+        *(state[name][index].astype(np.int64 if name in COUNT_FIELDS else float).tolist() for name in STATE_FIELDS[1:]),
+        *(derived[name][index].tolist() for name in DERIVED_FIELDS),
+        [ops.adapt_datetimefield_value(timezone.now())] * len(index),
+    ]
+    upsert_rows(ItemForecast, ['item', *STATE_FIELDS, *DERIVED_FIELDS, 'updated_at'], list(zip(*columns)), ['item'])
+    return len(index)
+
+
+def _empty_state(count):
+    return {name: np.zeros(count) for name in STATE_FIELDS[1:]}
+
+
+class EpochDay(Func):
+    """Days since 1970-01-01 as an integer, so dates come back without per-row parsing."""
+    template = "(%(expressions)s - DATE '1970-01-01')"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(TO_DAYS(%(expressions)s) - 719528)', **extra_context)
+
+
+def _demand(ids, id_range, start, end, days):
+    """Units consumed per day and item; ``ids`` must be sorted."""
+    rows = DailyItemMovement.objects.filter(
+        item__gte=id_range[0], item__lte=id_range[1], date__range=(start, end), consumed__gt=0,
+    ).annotate(day=EpochDay('date')).values_list('item_id', 'consumed', 'day').order_by()
+    # Straight off the cursor into one array: two years of rollups can be
+    # millions of rows, too many to build model values for.
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        fetched = cursor.fetchall()
+    fetched = np.fromiter(chain.from_iterable(fetched), dtype=np.int64, count=3 * len(fetched)).reshape(-1, 3)
+    # Days by items, so each day's step reads one contiguous row.
+    demand = np.zeros((days, len(ids)))
+    demand[fetched[:, 2] - (start - EPOCH).days, np.searchsorted(ids, fetched[:, 0])] = fetched[:, 1]
+    return demand
+
+
+def fold(state, demand, begin):
+    """Advance ``state`` in place through ``demand``, a days x items array.
+
+    Item ``i`` is folded from day ``begin[i]`` on. The level and baseline
+    are exponentially smoothed demand, ``error`` the smoothed squared
+    one-step-ahead error, ``since`` the days since the last demand, and
+    ``size``/``interval`` Croston's smoothed demand size and days between
+    demands, updated only on days with demand.
+    """
+    days, demand_days, since = state['days'], state['demand_days'], state['since']
+    level, baseline, error = state['level'], state['baseline'], state['error']
+    size, interval = state['size'], state['interval']
+    # How much of the level's weight its history has built up: 1 - (1 - SMOOTHING) ** days.
+    weight = 1 - (1 - SMOOTHING) ** days
+    for day, y in enumerate(demand):
+        live = begin <= day
+        if not live.any():
+            continue
+        step = live * SMOOTHING
+        # The first day has no forecast to be wrong about.
+        forecast = np.divide(level, weight, out=np.zeros_like(level), where=weight > 0)
+        error += (step * (weight > 0)) * ((y - forecast) ** 2 - error)
+        level += step * (y - level)
+        baseline += live * BASELINE_SMOOTHING * (y - baseline)
+        weight += step * (1 - weight)
+        days += live
+        since += live
+
+        hit = np.flatnonzero(live & (y > 0))
+        if len(hit):
+            # Plain running means until there are enough demands for the
+            # smoothing to take over; the first interval is not a full one.
+            demand_days[hit] += 1
+            size[hit] += np.maximum(SMOOTHING, 1 / demand_days[hit]) * (y[hit] - size[hit])
+            spaced = hit[demand_days[hit] > 1]
+            interval[spaced] += np.maximum(SMOOTHING, 1 / (demand_days[spaced] - 1)) * (since[spaced] - interval[spaced])
+            since[hit] = 0
+
+
+def derive(state, lead_time=LEAD_TIME_DAYS, review=REVIEW_DAYS):
+    """Daily demand, reorder point and order-up-to level from the smoothed state.
+
+    Smoothing started from zero, so the averages are scaled up by the weight
+    their history has accumulated so far. Intermittent items use the
+    Syntetos-Boylan correction of Croston's size over interval.
+    """
+    days, demand_days = state['days'], state['demand_days']
+    weight = 1 - (1 - SMOOTHING) ** days
+    seen = days > 0
+    smoothed = np.divide(state['level'], weight, out=np.zeros_like(weight), where=seen)
+    # With a single demand so far, the interval is at least the days watched.
+    interval = np.where(state['interval'] > 0, state['interval'], days)
+    croston = np.divide((1 - SMOOTHING / 2) * state['size'], interval, out=np.zeros_like(weight), where=demand_days > 0)
+    intermittent = days >= INTERMITTENT_INTERVAL * demand_days
+    rate = np.where(demand_days == 0, 0.0, np.where(intermittent, croston, smoothed))
+    sigma = np.sqrt(np.divide(state['error'], 1 - (1 - SMOOTHING) ** (days - 1), out=np.zeros_like(weight), where=days > 1))
+    return {
+        'model': np.where(demand_days == 0, 'none', np.where(intermittent, 'croston', 'smoothing')),
+        'daily_demand': rate,
+        'reorder_point': np.ceil(rate * lead_time + SERVICE_LEVEL_Z * sigma * np.sqrt(lead_time)).astype(np.int64),
+        'order_up_to': np.ceil(
+            rate * (lead_time + review) + SERVICE_LEVEL_Z * sigma * np.sqrt(lead_time + review)
+        ).astype(np.int64),
+        'baseline_demand': np.divide(
+            state['baseline'], 1 - (1 - BASELINE_SMOOTHING) ** days, out=np.zeros_like(weight), where=seen,
+        ),
+    }
+
+
+def stock_forecast(limit=20, item=None, today=None, hospital_id=None):
+    """Demand trend, stockout risk and what to reorder, from the stored forecasts and live stock.
+
+    Only ``hospital_id``'s items are considered. Items at or below their
+    reorder point are listed soonest stockout first, each with the quantity
+    that brings it back up to its order-up-to level.
+    """
+    today = today or timezone.localdate()
+    forecasts = for_tenant(ItemForecast.objects, hospital_id, through='item').filter(daily_demand__gt=0)
+    cover = F('item__quantity') / F('daily_demand')
+    totals = forecasts.aggregate(
+        items=Count('pk'), demand=Sum('daily_demand'), baseline=Sum('baseline_demand'),
+        high=Count('pk', filter=Q(item__quantity__lte=F('daily_demand') * LEAD_TIME_DAYS)),
+        through=Max('through'),
+    )
+    rows = forecasts.filter(item=item) if item else forecasts.filter(item__quantity__lte=F('reorder_point'))
+    rows = list(rows.annotate(cover=cover).order_by('cover', 'item_id').values(
+        'item_id', 'item__sku', 'item__name', 'item__quantity', 'item__maximum_stock',
+        'model', 'daily_demand', 'reorder_point', 'order_up_to', 'cover',
+    )[:limit])
+    reorder = forecasts.filter(item__quantity__lte=F('reorder_point')).count()
+
+    share = totals['high'] / totals['items'] if totals['items'] else 0
+    risk = next((level for level, threshold in RISK_SHARES if share >= threshold), 'low')
+    if rows and not item:
+        first = rows[0]
+        recommendation = (
+            f"Reorder {reorder} item{'s' if reorder != 1 else ''} now; {first['item__name']} runs out first, "
+            f"in about {int(first['cover'])} days."
+        )
+    else:
+        recommendation = f'Stock covers forecast demand for the next {LEAD_TIME_DAYS} days.'
+    return {
+        'as_of': totals['through'],
+        'demandChange': round((totals['demand'] / totals['baseline'] - 1) * 100) if totals['baseline'] else 0,
+        'stockoutRisk': risk,
+        'recommendation': recommendation,
+        'reorder_count': reorder,
+        'items': [_forecast_row(row, today) for row in rows],
+    }
+
+
+def _forecast_row(row, today):
+    quantity, ceiling = row['item__quantity'], row['item__maximum_stock']
+    order = max(0, row['order_up_to'] - quantity)
+    if ceiling is not None:
+        order = max(0, min(order, ceiling - quantity))
+    return {
+        'item_id': row['item_id'], 'sku': row['item__sku'], 'name': row['item__name'], 'quantity': quantity,
+        'model': row['model'], 'daily_demand': round(row['daily_demand'], 2),
+        'stockout_date': today + timedelta(days=max(0, int(row['cover']))),
+        'reorder_point': row['reorder_point'], 'order_quantity': order,
+    }
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory import cold_ledger
+from reports.services import archive_ledger
+
+
+class Command(BaseCommand):
+    help = 'Move closed ledger months before the audit window into the cold archive, then list the archived months.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hot-months', type=int, default=settings.LEDGER_HOT_MONTHS, help='Months kept in the ledger table.')
+
+    def handle(self, hot_months, **options):
+        for month, rows in archive_ledger(hot_months=hot_months):
+            self.stdout.write(f'Archived {month:%Y-%m}: {rows:,} rows')
+        for segment in cold_ledger.segments():
+            self.stdout.write(f'{segment.month:%Y-%m}  {segment.rows:>12,} rows  {segment.size() / 2**20:>8.1f} MiB  {segment.path}')
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, Warehouse
+from reports.models import DailyItemMovement
+from users.models import User
+
+QUESTIONS = [
+    'Low stock items?',
+    'Which medicines are low in Ward 7?',
+    'Expiring soon?',
+    'expiring in 7 days in Ward 3',
+    'Anything expired still on the shelves?',
+    'top consumed this week',
+    'top 20 consumed consumables in the last 30 days',
+    'What should I restock?',
+    'how many Item 4242 do we have?',
+    'hello',
+]
+
+
+class Command(BenchmarkCommand):
+    help = 'Time representative assistant questions against a large catalogue and a month of consumption rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--consumed-items', type=int, default=10000, help='Items with consumption on each day.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def run_benchmark(self, items, days, consumed_items, repeat, **options):
+        today = timezone.localdate()
+        categories = [value for value, _ in InventoryItem.CATEGORY_CHOICES]
+        Warehouse.objects.bulk_create(Warehouse(name=f'Ward {i}') for i in range(40))
+        InventoryItem.objects.bulk_create(
+            (
+                InventoryItem(
+                    name=f'Item {i}', sku=f'BENCH-{i:06d}', category=categories[i % 3], unit='pcs', quantity=(i * 7) % 60,
+                    minimum_stock=20, is_below_minimum=(i * 7) % 60 < 20, location_id=f'Ward {i % 40}',
+                    expiry_date=today + timedelta(days=i % 400 - 20) if i % 4 else None,
+                )
+                for i in range(items)
+            ),
+            batch_size=5000,
+        )
+        item_ids = list(InventoryItem.objects.order_by('pk').values_list('pk', flat=True))
+        DailyItemMovement.objects.bulk_create(
+            (
+                DailyItemMovement(
+                    item_id=item_ids[(n * 7919 + day) % items], category=categories[(n * 7919 + day) % items % 3],
+                    date=today - timedelta(days=day), transactions=1, consumed=1 + n % 17, consumed_value=1 + n % 17,
+                )
+                for day in range(days) for n in range(consumed_items)
+            ),
+            batch_size=5000,
+        )
+
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        everything = []
+        for question in QUESTIONS:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.post('/api/ai/query/', {'question': question}, format='json')
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200 and not response.data.get('timed_out'), response.data
+            # The first ask compiles the plan; the rest only bind values.
+            self.stdout.write(f'{question!r}: first {samples[0] * 1000:.1f} ms -> {response.data["answer"][:90]}')
+            self.report_latencies(f'  {response.data["intent"]}', samples[1:])
+            everything.extend(samples[1:])
+        self.report_latencies('all questions', everything)
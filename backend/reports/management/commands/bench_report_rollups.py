@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem, StockTransaction
+from reports.services import rebuild_rollups, refresh_rollups
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Seed a large stock ledger, then time a full rollup rebuild, an incremental refresh, the '
+        'report endpoints, and the same consumption report computed straight from the ledger.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=10000000)
+        parser.add_argument('--items', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--requests', type=int, default=50)
+
+    def run_benchmark(self, transactions, items, days, requests, **options):
+        categories = [choice for choice, _ in InventoryItem.CATEGORY_CHOICES]
+        InventoryItem.objects.bulk_create(
+            InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:06d}', category=categories[i % 3], unit='pcs', quantity=1000, unit_price=i % 50 + 1)
+            for i in range(items)
+        )
+        item_ids = list(InventoryItem.objects.values_list('pk', flat=True))
+        now = timezone.now()
+        with self.timer(f'seed {transactions} ledger rows', rows=transactions):
+            self.seed_ledger(item_ids, transactions, now - timedelta(days=days), now - timedelta(minutes=5))
+
+        with self.timer('full rebuild', rows=transactions):
+            rebuild_rollups(settle=timedelta(0))
+        added = 10000
+        self.seed_ledger(item_ids, added, now - timedelta(minutes=1), now)
+        with self.timer(f'incremental refresh after {added} new rows', rows=added):
+            refresh_rollups(settle=timedelta(0))
+
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        start = (now - timedelta(days=90)).date().isoformat()
+        for label, url, params in (
+            ('consumption by category, 90 days', '/api/reports/consumption/', {'start': start}),
+            ('consumption by item, 90 days', '/api/reports/consumption/', {'start': start, 'group_by': 'item'}),
+            ('valuation, 30 days', '/api/reports/valuation/', {}),
+            ('supplier spend, 90 days', '/api/reports/supplier-spend/', {'start': start}),
+        ):
+            samples = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(url, params)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.content[:200]
+            self.report_latencies(label, samples)
+
+        with self.timer('consumption by category, 90 days, straight from the ledger'):
+            list(StockTransaction.objects.filter(performed_at__gte=now - timedelta(days=90)).values(
+                category=F('inventory_item__category'),
+            ).annotate(n=Count('pk'), consumed=Sum('quantity_change', filter=Q(transaction_type='consume'))))
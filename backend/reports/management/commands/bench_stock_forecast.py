@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.benchmark import BenchmarkCommand
+from inventory.models import InventoryItem
+from reports.forecasting import refresh_forecasts
+from reports.models import DailyItemMovement
+from users.models import User
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Seed daily consumption rollups for many items, then time the first full forecast build, '
+        'the next day\'s incremental fold and the forecast endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=730)
+        parser.add_argument('--requests', type=int, default=20)
+
+    def seed_days(self, item_ids, days, rng):
+        """Insert one rollup row per item and day with demand; a quarter each of daily, weekly-ish and rare items."""
+        table = connection.ops.quote_name(DailyItemMovement._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} (item_id, category, date, transactions, consumed, restocked, expired, adjusted, '
+            'consumed_value) VALUES (%s, %s, %s, 1, %s, 0, 0, 0, 0)'
+        )
+        ids = np.array(item_ids)
+        chance = np.array([0.6, 0.15, 0.05, 0.02])[ids % 4]
+        size = 1 + ids % 12
+        rows = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for day in days:
+                hit = rng.random(len(ids)) < chance
+                consumed = rng.poisson(size[hit]) + 1
+                date = day.isoformat()
+                cursor.executemany(sql, [
+                    (int(pk), 'medicine', date, int(quantity)) for pk, quantity in zip(ids[hit], consumed)
+                ])
+                rows += int(hit.sum())
+        return rows
+
+    def run_benchmark(self, items, days, requests, **options):
+        today = timezone.localdate()
+        InventoryItem.objects.bulk_create(
+            (
+                InventoryItem(name=f'Item {i}', sku=f'BENCH-{i:06d}', category='medicine', unit='pcs', quantity=1 + i % 400)
+                for i in range(items)
+            ),
+            batch_size=5000,
+        )
+        InventoryItem.objects.update(created_at=timezone.now() - timedelta(days=days + 1))
+        item_ids = list(InventoryItem.objects.order_by('pk').values_list('pk', flat=True))
+        rng = np.random.default_rng(7)
+        history = [today - timedelta(days=offset) for offset in range(days, 1, -1)]
+        started = time.perf_counter()
+        rows = self.seed_days(item_ids, history, rng)
+        self.stdout.write(f'seeded {rows} item-days with demand in {time.perf_counter() - started:.1f}s')
+
+        with self.timer(f'first build, {items} items x {len(history)} days', rows=rows):
+            refresh_forecasts(through=today - timedelta(days=2))
+        added = self.seed_days(item_ids, [today - timedelta(days=1)], rng)
+        with self.timer(f'incremental fold of one more day ({added} rows)'):
+            refresh_forecasts(through=today - timedelta(days=1))
+
+        user = User.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get('/api/predictions/stock-forecast/')
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        self.report_latencies('stock-forecast endpoint', samples)
+        self.stdout.write(f"{response.data['recommendation']} Demand change {response.data['demandChange']}%, risk {response.data['stockoutRisk']}.")
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from reports.services import rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the report rollup tables from the whole stock ledger and order book.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100000, help='Ledger ids folded per transaction.')
+        parser.add_argument('--incremental', action='store_true', help='Only fold in what changed since the last run.')
+
+    def handle(self, batch_size, incremental, **options):
+        # Nothing else should be writing the ledger during a manual rebuild, so fold everything.
+        build = refresh_rollups if incremental else rebuild_rollups
+        stats = build(batch_size=batch_size, settle=timedelta(0))
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in sorted(stats.items())))
@@ -0,0 +1,119 @@
+# Generated by Django 4.2.27 on 2026-10-18 11:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('inventory', '0007_inventoryitem_expiry_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategoryMovement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('transactions', models.IntegerField(default=0)),
+                ('consumed', models.BigIntegerField(default=0)),
+                ('restocked', models.BigIntegerField(default=0)),
+                ('expired', models.BigIntegerField(default=0)),
+                ('adjusted', models.BigIntegerField(default=0)),
+                ('consumed_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('category', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyItemMovement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('transactions', models.IntegerField(default=0)),
+                ('consumed', models.BigIntegerField(default=0)),
+                ('restocked', models.BigIntegerField(default=0)),
+                ('expired', models.BigIntegerField(default=0)),
+                ('adjusted', models.BigIntegerField(default=0)),
+                ('consumed_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('category', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySupplierSpend',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('lines', models.IntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyValuation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(max_length=100)),
+                ('items', models.IntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('valuation', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderSpend',
+            fields=[
+                ('order_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('lines', models.IntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.supplier')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvaluation',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='valuation_date_category_uniq'),
+        ),
+        migrations.AddField(
+            model_name='dailysupplierspend',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.supplier'),
+        ),
+        migrations.AddField(
+            model_name='dailyitemmovement',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.inventoryitem'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorymovement',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='category_movement_date_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='orderspend',
+            index=models.Index(fields=['date', 'supplier'], name='order_spend_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysupplierspend',
+            constraint=models.UniqueConstraint(fields=('date', 'supplier'), name='supplier_spend_date_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyitemmovement',
+            index=models.Index(fields=['date', 'item'], name='item_movement_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyitemmovement',
+            constraint=models.UniqueConstraint(fields=('item', 'date'), name='item_movement_item_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 11:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_inventoryitem_expiry_status'),
+        ('reports', '0001_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemForecast',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='inventory.inventoryitem')),
+                ('through', models.DateField()),
+                ('days', models.IntegerField(default=0)),
+                ('demand_days', models.IntegerField(default=0)),
+                ('level', models.FloatField(default=0)),
+                ('baseline', models.FloatField(default=0)),
+                ('size', models.FloatField(default=0)),
+                ('interval', models.FloatField(default=0)),
+                ('since', models.IntegerField(default=0)),
+                ('error', models.FloatField(default=0)),
+                ('model', models.CharField(max_length=10)),
+                ('daily_demand', models.FloatField(default=0)),
+                ('baseline_demand', models.FloatField(default=0)),
+                ('reorder_point', models.IntegerField(default=0)),
+                ('order_up_to', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='dailyitemmovement',
+            name='item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.inventoryitem'),
+        ),
+    ]
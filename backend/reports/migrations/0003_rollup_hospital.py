@@ -0,0 +1,147 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:25
+
+import core.tenancy
+from django.db import migrations, models
+import django.db.models.deletion
+
+MOVEMENT_FIELDS = ('transactions', 'consumed', 'restocked', 'expired', 'adjusted', 'consumed_value')
+
+
+def attach_rollups(apps, schema_editor):
+    # With one hospital every existing rollup row is its. With several, item and order rows take their
+    # item's and order's hospital, the category and supplier totals are summed again from those, and
+    # valuation snapshots, which cannot be split, are dropped; the next refresh takes today's.
+    hospitals = list(apps.get_model('users', 'Hospital').objects.values_list('pk', flat=True)[:2])
+    if len(hospitals) < 2:
+        for name in ('DailyItemMovement', 'DailyCategoryMovement', 'DailyValuation', 'OrderSpend', 'DailySupplierSpend'):
+            apps.get_model('reports', name).objects.update(hospital_id=hospitals[0] if hospitals else None)
+        return
+    items = apps.get_model('reports', 'DailyItemMovement')
+    items.objects.update(hospital_id=models.Subquery(
+        apps.get_model('inventory', 'InventoryItem').objects.filter(pk=models.OuterRef('item_id')).values('hospital_id')[:1],
+    ))
+    spend = apps.get_model('reports', 'OrderSpend')
+    spend.objects.update(hospital_id=models.Subquery(
+        apps.get_model('inventory', 'Supplier').objects.filter(pk=models.OuterRef('supplier_id')).values('hospital_id')[:1],
+    ))
+    spend.objects.filter(order_id__in=apps.get_model('orders', 'PurchaseOrder').objects.values('pk')).update(
+        hospital_id=models.Subquery(
+            apps.get_model('orders', 'PurchaseOrder').objects.filter(pk=models.OuterRef('order_id')).values('hospital_id')[:1],
+        ),
+    )
+    categories = apps.get_model('reports', 'DailyCategoryMovement')
+    categories.objects.all().delete()
+    categories.objects.bulk_create(
+        categories(**row) for row in items.objects.values('hospital_id', 'date', 'category').order_by()
+        .annotate(**{field: models.Sum(field) for field in MOVEMENT_FIELDS})
+    )
+    suppliers = apps.get_model('reports', 'DailySupplierSpend')
+    suppliers.objects.all().delete()
+    suppliers.objects.bulk_create(
+        suppliers(**row) for row in spend.objects.values('hospital_id', 'date', 'supplier_id').order_by()
+        .annotate(orders=models.Count('pk'), lines=models.Sum('lines'), spend=models.Sum('spend'))
+    )
+    apps.get_model('reports', 'DailyValuation').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_hospital'),
+        ('reports', '0002_item_forecast'),
+        ('inventory', '0011_tombstone_hospital'),
+        ('orders', '0007_purchaseorder_hospital'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailycategorymovement',
+            name='category_movement_date_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyitemmovement',
+            name='item_movement_item_date_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailysupplierspend',
+            name='supplier_spend_date_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyvaluation',
+            name='valuation_date_category_uniq',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyitemmovement',
+            name='item_movement_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='orderspend',
+            name='order_spend_date_idx',
+        ),
+        migrations.AddField(
+            model_name='dailycategorymovement',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.hospital'),
+        ),
+        migrations.AddField(
+            model_name='dailyitemmovement',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.hospital'),
+        ),
+        migrations.AddField(
+            model_name='dailysupplierspend',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.hospital'),
+        ),
+        migrations.AddField(
+            model_name='dailyvaluation',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.hospital'),
+        ),
+        migrations.AddField(
+            model_name='orderspend',
+            name='hospital',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.hospital'),
+        ),
+        migrations.RunPython(attach_rollups, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dailycategorymovement',
+            index=models.Index(fields=['hospital', 'date', 'category'], name='category_movement_tenant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyitemmovement',
+            index=models.Index(fields=['hospital', 'date', 'item'], name='item_movement_tenant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyitemmovement',
+            index=models.Index(fields=['item', 'date'], name='item_movement_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysupplierspend',
+            index=models.Index(fields=['hospital', 'date', 'supplier'], name='supplier_spend_tenant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvaluation',
+            index=models.Index(fields=['hospital', 'date', 'category'], name='valuation_tenant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderspend',
+            index=models.Index(fields=['hospital', 'date', 'supplier'], name='order_spend_tenant_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorymovement',
+            constraint=models.UniqueConstraint(core.tenancy.TenantKey(), models.F('date'), models.F('category'), name='category_movement_tenant_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyitemmovement',
+            constraint=models.UniqueConstraint(core.tenancy.TenantKey(), models.F('item'), models.F('date'), name='item_movement_tenant_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysupplierspend',
+            constraint=models.UniqueConstraint(core.tenancy.TenantKey(), models.F('date'), models.F('supplier'), name='supplier_spend_tenant_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvaluation',
+            constraint=models.UniqueConstraint(core.tenancy.TenantKey(), models.F('date'), models.F('category'), name='valuation_tenant_uniq'),
+        ),
+    ]
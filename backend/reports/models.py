@@ -1,3 +1,138 @@
 from django.db import models
 
-# Create your models here.
+from core.tenancy import hospital_field, tenant_unique
+from inventory.models import InventoryItem, Supplier
+
+
+class RollupWatermark(models.Model):
+    """How far a rollup has read its source; the next refresh starts after it."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+class StockMovementRollup(models.Model):
+    """Ledger totals for one day. Quantities are positive; ``adjusted`` is the net of adjustments and transfers."""
+    hospital = hospital_field('+')
+    date = models.DateField()
+    transactions = models.IntegerField(default=0)
+    consumed = models.BigIntegerField(default=0)
+    restocked = models.BigIntegerField(default=0)
+    expired = models.BigIntegerField(default=0)
+    adjusted = models.BigIntegerField(default=0)
+    # Valued at the item's unit_price when the ledger rows were folded in.
+    consumed_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyItemMovement(StockMovementRollup):
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='+', db_index=False)
+    category = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            tenant_unique('item', 'date', name='item_movement_tenant_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['hospital', 'date', 'item'], name='item_movement_tenant_date_idx'),
+            models.Index(fields=['item', 'date'], name='item_movement_item_date_idx'),
+        ]
+
+
+class DailyCategoryMovement(StockMovementRollup):
+    category = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            tenant_unique('date', 'category', name='category_movement_tenant_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['hospital', 'date', 'category'], name='category_movement_tenant_idx'),
+        ]
+
+
+class DailyValuation(models.Model):
+    """Stock on hand per category, valued at ``quantity * unit_price``, as last seen that day."""
+    hospital = hospital_field('+')
+    date = models.DateField()
+    category = models.CharField(max_length=100)
+    items = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    valuation = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            tenant_unique('date', 'category', name='valuation_tenant_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['hospital', 'date', 'category'], name='valuation_tenant_date_idx'),
+        ]
+
+
+class OrderSpend(models.Model):
+    """One purchase order's line total. Keyed by id rather than a foreign key so a
+    deleted order's row outlives it until the next refresh subtracts it."""
+    order_id = models.BigIntegerField(primary_key=True)
+    hospital = hospital_field('+')
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    lines = models.IntegerField(default=0)
+    spend = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'date', 'supplier'], name='order_spend_tenant_date_idx'),
+        ]
+
+
+class DailySupplierSpend(models.Model):
+    hospital = hospital_field('+')
+    date = models.DateField()
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    lines = models.IntegerField(default=0)
+    spend = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            tenant_unique('date', 'supplier', name='supplier_spend_tenant_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['hospital', 'date', 'supplier'], name='supplier_spend_tenant_date_idx'),
+        ]
+
+
+class ItemForecast(models.Model):
+    """Smoothed daily demand for one item, folded forward one complete day at a time.
+
+    The state fields are everything ``reports.forecasting`` needs to carry the
+    models on from ``through``; the derived fields are refreshed alongside them.
+    """
+    item = models.OneToOneField(InventoryItem, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    through = models.DateField()
+    days = models.IntegerField(default=0)
+    demand_days = models.IntegerField(default=0)
+    level = models.FloatField(default=0)
+    baseline = models.FloatField(default=0)
+    # Croston's demand size and interval; zero until there are demands to measure.
+    size = models.FloatField(default=0)
+    interval = models.FloatField(default=0)
+    since = models.IntegerField(default=0)
+    error = models.FloatField(default=0)
+
+    model = models.CharField(max_length=10)
+    daily_demand = models.FloatField(default=0)
+    # The slow-moving average ``daily_demand`` is compared against for trends.
+    baseline_demand = models.FloatField(default=0)
+    reorder_point = models.IntegerField(default=0)
+    order_up_to = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.item_id} through {self.through}"
@@ -0,0 +1,339 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.bulk import accumulate_rows, upsert_rows
+from core.tenancy import for_tenant
+from inventory import cold_ledger
+from inventory.models import InventoryItem, StockTransaction, Tombstone
+from orders.models import OrderItem, PurchaseOrder
+from .models import (
+    DailyCategoryMovement, DailyItemMovement, DailySupplierSpend, DailyValuation, OrderSpend, RollupWatermark,
+)
+
+SUMMARY_CACHE_KEY = 'reports:inventory-summary'
+# Rebuilt every 10 minutes; a hospital left out of the rebuild falls back to an on-demand build.
+SUMMARY_TIMEOUT = 30 * 60
+LEDGER_WATERMARK = 'stock-ledger'
+ORDERS_WATERMARK = 'purchase-orders'
+MOVEMENT_FIELDS = ('transactions', 'consumed', 'restocked', 'expired', 'adjusted', 'consumed_value')
+
+
+class LedgerDay(TruncDate):
+    """``TruncDate`` that SQLite evaluates natively when dates are in UTC.
+
+    Django's SQLite version calls a Python function per row, which is most of
+    the cost of folding a large ledger.
+    """
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        if self.get_tzname() not in (None, 'UTC'):
+            return self.as_sql(compiler, connection, **extra_context)
+        sql, params = compiler.compile(self.lhs)
+        return f'date({sql})', params
+
+
+def build_inventory_summaries(expiring_days=30):
+    """Build every hospital's inventory summary with one aggregate and cache each of them.
+
+    Returns ``[(hospital_id, summary), ...]``.
+    """
+    by_hospital = {}
+    for row in _summary_rows(InventoryItem.objects.values('hospital', 'category').order_by('hospital', 'category'), expiring_days):
+        by_hospital.setdefault(row.pop('hospital'), []).append(row)
+    summaries = [(hospital_id, _summary(rows)) for hospital_id, rows in by_hospital.items()]
+    cache.set_many({summary_cache_key(hospital_id): summary for hospital_id, summary in summaries}, SUMMARY_TIMEOUT)
+    return summaries
+
+
+def build_inventory_summary(hospital_id=None, expiring_days=30):
+    """Aggregate one hospital's stock, valuation and risk counts per category and cache the result."""
+    items = for_tenant(InventoryItem.objects, hospital_id).values('category').order_by('category')
+    summary = _summary(_summary_rows(items, expiring_days))
+    cache.set(summary_cache_key(hospital_id), summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def inventory_summary(hospital_id=None):
+    return cache.get(summary_cache_key(hospital_id)) or build_inventory_summary(hospital_id)
+
+
+def summary_cache_key(hospital_id):
+    return f'{SUMMARY_CACHE_KEY}:{hospital_id if hospital_id is not None else "none"}'
+
+
+def _summary_rows(grouped, expiring_days):
+    today = timezone.localdate()
+    value = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=18, decimal_places=2))
+    return list(grouped.annotate(
+        items=Count('pk'),
+        units=Sum('quantity'),
+        valuation=Sum(value),
+        low_stock=Count('pk', filter=Q(is_below_minimum=True)),
+        expiring=Count('pk', filter=Q(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=expiring_days))),
+        expired=Count('pk', filter=Q(expiry_date__lt=today)),
+    ))
+
+
+def _summary(rows):
+    categories = [
+        {**row, 'units': row['units'] or 0, 'valuation': f"{row['valuation'] or 0:.2f}"}
+        for row in rows
+    ]
+    summary = {
+        'generated_at': timezone.now().isoformat(),
+        'totals': {
+            key: sum(row[key] for row in categories)
+            for key in ('items', 'units', 'low_stock', 'expiring', 'expired')
+        },
+        'categories': categories,
+    }
+    summary['totals']['valuation'] = f"{sum(row['valuation'] or 0 for row in rows):.2f}"
+    return summary
+
+
+def _movement_totals():
+    change = 'quantity_change'
+    return {
+        'transactions': Count('pk'),
+        'consumed': -Sum(change, filter=Q(transaction_type='consume'), default=0),
+        'restocked': Sum(change, filter=Q(transaction_type='restock'), default=0),
+        'expired': -Sum(change, filter=Q(transaction_type='expired'), default=0),
+        'adjusted': Sum(change, filter=Q(transaction_type__in=['adjust', 'transfer']), default=0),
+        'consumed_value': -Sum(
+            F(change) * F('inventory_item__unit_price'), filter=Q(transaction_type='consume'), default=0,
+            output_field=DecimalField(max_digits=16, decimal_places=2),
+        ),
+    }
+
+
+def refresh_stock_rollups(batch_size=100000, settle=timedelta(seconds=30)):
+    """Fold ledger rows past the watermark into the daily item and category rollups.
+
+    The ledger is read by primary-key range, ``batch_size`` ids per
+    transaction, and merged with ``INSERT ... SELECT ... ON CONFLICT``, so a
+    run costs only the rows added since the last one. Rows younger than
+    ``settle`` wait for the next run: an id is allocated before its transaction
+    commits, so a slow writer could still commit below ids already folded in.
+    Totals are kept per hospital, taken from the ledger rows' own hospital.
+    Returns the new watermark.
+    """
+    RollupWatermark.objects.get_or_create(name=LEDGER_WATERMARK)
+    ceiling = StockTransaction.objects.filter(performed_at__lte=timezone.now() - settle).order_by(
+        '-performed_at', '-id',
+    ).values_list('pk', flat=True).first() or 0
+
+    while True:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().get(name=LEDGER_WATERMARK)
+            low, high = watermark.last_id, min(watermark.last_id + batch_size, ceiling)
+            if high <= low:
+                return watermark.last_id
+            ledger = StockTransaction.objects.filter(pk__gt=low, pk__lte=high).order_by()
+            day = LedgerDay('performed_at')
+            accumulate_rows(
+                DailyItemMovement,
+                ledger.values('hospital', item_id=F('inventory_item_id'), date=day, category=F('inventory_item__category'))
+                .annotate(**_movement_totals()),
+                ['hospital', 'item', 'date'], MOVEMENT_FIELDS,
+            )
+            accumulate_rows(
+                DailyCategoryMovement,
+                ledger.values('hospital', date=day, category=F('inventory_item__category')).annotate(**_movement_totals()),
+                ['hospital', 'date', 'category'], MOVEMENT_FIELDS,
+            )
+            watermark.last_id = high
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def fold_cold_ledger():
+    """Fold the archived ledger months into the daily item and category rollups.
+
+    Only a rebuild needs this, as months are archived once the rollups hold
+    them. Each month is aggregated from its column files and upserted,
+    adding to any day already there. Items deleted since drop out, as their
+    rows in the table would have. Returns the number of archived rows read.
+    """
+    read = 0
+    for segment in cold_ledger.segments():
+        item_ids, days, totals = segment.daily_totals()
+        catalogue = InventoryItem.objects.only('hospital', 'category', 'unit_price').in_bulk(set(item_ids.tolist()))
+        columns = {name: values.tolist() for name, values in totals.items()}
+        zero = [0] * len(item_ids)
+        items, categories = [], {}
+        for n, (item_id, day) in enumerate(zip(item_ids.tolist(), days.tolist())):
+            item = catalogue.get(item_id)
+            if item is None:
+                continue
+            consumed = -columns.get('consume', zero)[n]
+            movement = {
+                'transactions': columns['transactions'][n],
+                'consumed': consumed,
+                'restocked': columns.get('restock', zero)[n],
+                'expired': -columns.get('expired', zero)[n],
+                'adjusted': columns.get('adjust', zero)[n] + columns.get('transfer', zero)[n],
+                'consumed_value': consumed * item.unit_price,
+            }
+            on = connection.ops.adapt_datefield_value(date.fromordinal(day))
+            items.append((item.hospital_id, item_id, on, item.category, *movement.values()))
+            totals_of_day = categories.setdefault((item.hospital_id, on, item.category), dict.fromkeys(MOVEMENT_FIELDS, 0))
+            for field, value in movement.items():
+                totals_of_day[field] += value
+        with transaction.atomic():
+            upsert_rows(
+                DailyItemMovement, ['hospital', 'item', 'date', 'category', *MOVEMENT_FIELDS], items,
+                ['hospital', 'item', 'date'], MOVEMENT_FIELDS,
+            )
+            upsert_rows(
+                DailyCategoryMovement, ['hospital', 'date', 'category', *MOVEMENT_FIELDS],
+                [(*key, *values.values()) for key, values in categories.items()], ['hospital', 'date', 'category'], MOVEMENT_FIELDS,
+            )
+        read += segment.rows
+    return read
+
+
+def archive_ledger(hot_months=None):
+    """Move closed ledger months before the audit window to the cold archive, once the rollups hold them."""
+    return cold_ledger.archive_months(refresh_stock_rollups(), hot_months=hot_months)
+
+
+def _chunks(values, size=500):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def refresh_supplier_spend(overlap=timedelta(seconds=5)):
+    """Bring per-order and daily supplier spend up to date with purchase orders.
+
+    Orders saved since the last run (by ``updated_at``, with a little overlap
+    for late commits) are re-totalled from their lines and deleted orders are
+    dropped via their tombstones, so runs must be closer together than the
+    tombstone retention. Only the days those orders fall on are re-aggregated.
+    Draft and cancelled orders count as no spend. Returns the number of orders looked at.
+    """
+    started = timezone.now()
+    RollupWatermark.objects.get_or_create(name=ORDERS_WATERMARK)
+    with transaction.atomic():
+        watermark = RollupWatermark.objects.select_for_update().get(name=ORDERS_WATERMARK)
+        orders = PurchaseOrder.objects.all()
+        deleted = []
+        if watermark.last_seen_at is not None:
+            since = watermark.last_seen_at - overlap
+            orders = orders.filter(updated_at__gt=since)
+            deleted = list(Tombstone.objects.filter(
+                model=PurchaseOrder._meta.label, deleted_at__gt=since,
+            ).values_list('object_id', flat=True))
+        changed = list(orders.values_list('pk', flat=True))
+
+        dates = set()
+        for ids in _chunks(changed + deleted):
+            stale = OrderSpend.objects.filter(order_id__in=ids)
+            dates.update(stale.values_list('date', flat=True))
+            stale.delete()
+        for ids in _chunks(changed):
+            spend = [
+                OrderSpend(**row) for row in OrderItem.objects.filter(order_id__in=ids).exclude(order__status__in=['draft', 'cancelled'])
+                .values('order_id', hospital_id=F('order__hospital_id'), supplier_id=F('order__supplier_id'), date=F('order__order_date'))
+                .annotate(lines=Count('pk'), spend=Sum('total_price')).order_by()
+            ]
+            OrderSpend.objects.bulk_create(spend)
+            dates.update(row.date for row in spend)
+
+        for days in _chunks(dates):
+            DailySupplierSpend.objects.filter(date__in=days).delete()
+            DailySupplierSpend.objects.bulk_create(
+                DailySupplierSpend(**row) for row in OrderSpend.objects.filter(date__in=days)
+                .values('hospital_id', 'date', 'supplier_id').annotate(orders=Count('pk'), lines=Sum('lines'), spend=Sum('spend')).order_by()
+            )
+        watermark.last_seen_at = started
+        watermark.save(update_fields=['last_seen_at', 'updated_at'])
+    return len(changed) + len(deleted)
+
+
+def snapshot_valuation(day=None):
+    """Record today's stock on hand and its value per hospital and category, replacing any earlier snapshot of the day."""
+    day = day or timezone.localdate()
+    value = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=18, decimal_places=2))
+    rows = list(InventoryItem.objects.values('hospital', 'category').order_by().annotate(
+        items=Count('pk'), units=Sum('quantity', default=0), valuation=Sum(value, default=0),
+    ).values_list('hospital', 'category', 'items', 'units', 'valuation'))
+    keys = {row[:2] for row in rows}
+    on = connection.ops.adapt_datefield_value(day)
+    with transaction.atomic():
+        snapshot = DailyValuation.objects.filter(date=day).values_list('pk', 'hospital', 'category')
+        DailyValuation.objects.filter(pk__in=[pk for pk, *key in snapshot if tuple(key) not in keys]).delete()
+        upsert_rows(
+            DailyValuation, ['hospital', 'date', 'category', 'items', 'units', 'valuation'],
+            [(hospital_id, on, category, *totals) for hospital_id, category, *totals in rows], ['hospital', 'date', 'category'],
+        )
+    return len(rows)
+
+
+def refresh_rollups(batch_size=100000, settle=timedelta(seconds=30)):
+    return {
+        'ledger_watermark': refresh_stock_rollups(batch_size=batch_size, settle=settle),
+        'orders': refresh_supplier_spend(),
+        'valuation_categories': snapshot_valuation(),
+    }
+
+
+def rebuild_rollups(batch_size=100000, settle=timedelta(seconds=30)):
+    """Drop every rollup and fold the whole ledger, archived months included, and order book in again."""
+    with transaction.atomic():
+        for model in (DailyItemMovement, DailyCategoryMovement, OrderSpend, DailySupplierSpend):
+            model.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+    archived = fold_cold_ledger()
+    return {**refresh_rollups(batch_size=batch_size, settle=settle), 'archived_ledger_rows': archived}
+
+
+def _totals(rows, fields):
+    return [
+        {**row, **{field: f'{row[field]:.2f}' for field in fields if field in row}}
+        for row in rows
+    ]
+
+
+def consumption_report(start, end, group_by='category', category=None, limit=100, hospital_id=None):
+    rollup = DailyItemMovement if group_by == 'item' else DailyCategoryMovement
+    rows = for_tenant(rollup.objects, hospital_id).filter(date__range=(start, end))
+    if category:
+        rows = rows.filter(category=category)
+    key = 'item_id' if group_by == 'item' else 'category'
+    rows = list(rows.values(key).annotate(**{field: Sum(field) for field in MOVEMENT_FIELDS}).order_by('-consumed', key)[:limit])
+    if group_by == 'item':
+        # Label only the rows returned rather than joining every item-day.
+        items = InventoryItem.objects.in_bulk([row['item_id'] for row in rows])
+        for row in rows:
+            item = items.get(row['item_id'])
+            row.update(name=item and item.name, sku=item and item.sku, category=item and item.category)
+    watermark = RollupWatermark.objects.filter(name=LEDGER_WATERMARK).first()
+    return {
+        'start': start, 'end': end, 'group_by': group_by,
+        'as_of': watermark.updated_at if watermark else None,
+        'rows': _totals(rows, ['consumed_value']),
+    }
+
+
+def valuation_report(start, end, hospital_id=None):
+    rows = for_tenant(DailyValuation.objects, hospital_id).filter(date__range=(start, end)).order_by('date', 'category').values(
+        'date', 'category', 'items', 'units', 'valuation',
+    )
+    return {'start': start, 'end': end, 'rows': _totals(rows, ['valuation'])}
+
+
+def supplier_spend_report(start, end, hospital_id=None):
+    rows = for_tenant(DailySupplierSpend.objects, hospital_id).filter(date__range=(start, end)).values(
+        'supplier_id', 'supplier__name',
+    ).annotate(orders=Sum('orders'), lines=Sum('lines'), spend=Sum('spend')).order_by('-spend', 'supplier_id')
+    watermark = RollupWatermark.objects.filter(name=ORDERS_WATERMARK).first()
+    return {
+        'start': start, 'end': end,
+        'as_of': watermark.updated_at if watermark else None,
+        'rows': _totals(rows, ['spend']),
+    }
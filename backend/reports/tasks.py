@@ -0,0 +1,23 @@
+from celery import shared_task
+
+from . import forecasting, services
+
+
+@shared_task
+def build_inventory_summary():
+    return [(hospital_id, summary['totals']) for hospital_id, summary in services.build_inventory_summaries()]
+
+
+@shared_task
+def refresh_rollups():
+    return services.refresh_rollups()
+
+
+@shared_task
+def archive_ledger():
+    return [(f'{month:%Y-%m}', rows) for month, rows in services.archive_ledger()]
+
+
+@shared_task
+def refresh_forecasts():
+    return forecasting.refresh_forecasts()
@@ -1,3 +1,331 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from core.testing import EagerTasksMixin
+from inventory.models import InventoryItem, StockTransaction, Supplier, Warehouse
+from inventory.services import adjust_stock, bulk_adjust_stock
+from orders.models import OrderItem, PurchaseOrder
+from users.models import Hospital, User
+from .assistant import QueryTimeout, parse, query_deadline
+from .forecasting import complete_through, rebuild_forecasts, refresh_forecasts
+from .models import DailyCategoryMovement, DailyItemMovement, ItemForecast, RollupWatermark
+from .services import SUMMARY_CACHE_KEY, archive_ledger, rebuild_rollups, refresh_rollups
+from .tasks import build_inventory_summary
+
+
+class InventorySummaryTests(EagerTasksMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.delete(SUMMARY_CACHE_KEY)
+        self.user = User.objects.create_user(username='manager', password='pw')
+        self.client.force_authenticate(self.user)
+        today = timezone.localdate()
+        InventoryItem.objects.create(name='Insulin', sku='INS-1', category='medicine', unit='vial', quantity=4, unit_price='12.50', expiry_date=today + timedelta(days=3))
+        InventoryItem.objects.create(name='Gauze', sku='GAU-1', category='consumable', unit='box', quantity=20, unit_price='1.25', expiry_date=today - timedelta(days=1))
+
+    def test_task_builds_summary_served_by_endpoint(self):
+        totals = build_inventory_summary.delay().get()
+        self.assertEqual(totals, [(None, {'items': 2, 'units': 24, 'low_stock': 1, 'expiring': 1, 'expired': 1, 'valuation': '75.00'})])
+
+        InventoryItem.objects.create(name='Masks', sku='MSK-1', category='consumable', unit='box', quantity=100)
+        response = self.client.get('/api/reports/inventory-summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['items'], 2)
+        self.assertEqual([row['category'] for row in response.data['categories']], ['consumable', 'medicine'])
+
+    def test_each_hospital_gets_its_own_summary(self):
+        hospital = Hospital.objects.create(name='St. Mary')
+        InventoryItem.objects.create(name='Masks', sku='MSK-1', category='consumable', unit='box', quantity=100, hospital=hospital)
+        build_inventory_summary.delay()
+
+        self.client.force_authenticate(User.objects.create_user(username='nurse', password='pw', hospital=hospital))
+        self.assertEqual(self.client.get('/api/reports/inventory-summary/').data['totals']['units'], 100)
+        self.client.force_authenticate(User.objects.create_user(username='newcomer', password='pw', hospital=Hospital.objects.create(name='General')))
+        self.assertEqual(self.client.get('/api/reports/inventory-summary/').data['totals']['items'], 0)
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='pw')
+        self.client.force_authenticate(self.user)
+        self.insulin = InventoryItem.objects.create(name='Insulin', sku='INS-1', category='medicine', unit='vial', quantity=50, unit_price='12.50')
+        self.gauze = InventoryItem.objects.create(name='Gauze', sku='GAU-1', category='consumable', unit='box', quantity=100, unit_price='1.25')
+
+    def refresh(self):
+        return refresh_rollups(settle=timedelta(0))
+
+    def test_ledger_is_folded_in_incrementally(self):
+        adjust_stock(self.insulin.pk, -5, 'consume')
+        adjust_stock(self.insulin.pk, 20, 'restock')
+        adjust_stock(self.gauze.pk, -10, 'consume')
+        self.refresh()
+
+        bulk_adjust_stock([
+            {'item': self.insulin.pk, 'quantity_change': -3, 'transaction_type': 'consume'},
+            {'item': self.insulin.pk, 'quantity_change': -2, 'transaction_type': 'expired'},
+        ])
+        self.assertEqual(self.refresh()['ledger_watermark'], StockTransaction.objects.latest('pk').pk)
+
+        row = DailyItemMovement.objects.get(item=self.insulin)
+        self.assertEqual(
+            (row.transactions, row.consumed, row.restocked, row.expired, row.consumed_value), (4, 8, 20, 2, 100),
+        )
+        response = self.client.get('/api/reports/consumption/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['category'], r['consumed'], r['consumed_value']) for r in response.data['rows']],
+            [('consumable', 10, '12.50'), ('medicine', 8, '100.00')],
+        )
+        by_item = self.client.get('/api/reports/consumption/', {'group_by': 'item', 'category': 'medicine'}).data['rows']
+        self.assertEqual([(r['sku'], r['transactions']) for r in by_item], [('INS-1', 4)])
+
+        # Folding again finds nothing new and must not double count.
+        self.refresh()
+        self.assertEqual(DailyCategoryMovement.objects.get(category='medicine').consumed, 8)
+
+    def test_rebuild_matches_incremental(self):
+        for change in (-1, -2, 5):
+            adjust_stock(self.gauze.pk, change, 'consume' if change < 0 else 'restock')
+            self.refresh()
+        incremental = list(DailyCategoryMovement.objects.values())
+        rebuild_rollups(settle=timedelta(0))
+        self.assertEqual(
+            [dict(row, id=None) for row in DailyCategoryMovement.objects.values()],
+            [dict(row, id=None) for row in incremental],
+        )
+        self.assertEqual(RollupWatermark.objects.count(), 2)
+
+    def test_rebuild_reads_archived_months(self):
+        directory = tempfile.mkdtemp(prefix='cold-ledger-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.enterContext(override_settings(LEDGER_COLD_DIR=directory))
+        for item, change, kind in ((self.insulin, -5, 'consume'), (self.insulin, 20, 'restock'), (self.gauze, -10, 'consume'), (self.gauze, -1, 'expired')):
+            adjust_stock(item.pk, change, kind)
+        StockTransaction.objects.update(performed_at=timezone.now() - timedelta(days=400))
+        adjust_stock(self.gauze.pk, -2, 'consume')
+
+        self.assertEqual([rows for _, rows in archive_ledger(hot_months=12)], [4])
+        self.assertEqual(StockTransaction.objects.count(), 1)
+        self.refresh()
+        folded = list(DailyItemMovement.objects.order_by('date', 'item').values())
+        categories = list(DailyCategoryMovement.objects.order_by('date', 'category').values())
+        self.assertEqual(rebuild_rollups(settle=timedelta(0))['archived_ledger_rows'], 4)
+        self.assertEqual([dict(row, id=None) for row in DailyItemMovement.objects.order_by('date', 'item').values()], [dict(row, id=None) for row in folded])
+        self.assertEqual(
+            [dict(row, id=None) for row in DailyCategoryMovement.objects.order_by('date', 'category').values()],
+            [dict(row, id=None) for row in categories],
+        )
+
+    def test_supplier_spend_follows_order_changes(self):
+        supplier = Supplier.objects.create(name='MedSupply')
+        today = timezone.localdate()
+        orders = []
+        for number, quantity in (('PO-1', 10), ('PO-2', 4)):
+            order = PurchaseOrder.objects.create(order_number=number, supplier=supplier, order_date=today)
+            OrderItem.objects.create(order=order, inventory_item=self.insulin, quantity=quantity, unit_price=Decimal('2.00'))
+            orders.append(order)
+        self.refresh()
+        rows = self.client.get('/api/reports/supplier-spend/').data['rows']
+        self.assertEqual([(r['supplier__name'], r['orders'], r['spend']) for r in rows], [('MedSupply', 2, '28.00')])
+
+        orders[0].status = 'cancelled'
+        orders[0].save()
+        orders[1].delete()
+        self.refresh()
+        self.assertEqual(self.client.get('/api/reports/supplier-spend/').data['rows'], [])
+
+    def test_reports_only_cover_the_users_hospital(self):
+        mary, general = Hospital.objects.create(name='St. Mary'), Hospital.objects.create(name='General')
+        InventoryItem.objects.filter(pk=self.insulin.pk).update(hospital=mary)
+        gloves = InventoryItem.objects.create(name='Gloves', sku='GLV-1', category='medicine', unit='box', quantity=30, unit_price='2.00', hospital=general)
+        supplier = Supplier.objects.create(name='MedSupply', hospital=mary)
+        order = PurchaseOrder.objects.create(order_number='PO-1', supplier=supplier, order_date=timezone.localdate(), hospital=mary)
+        OrderItem.objects.create(order=order, inventory_item=self.insulin, quantity=10, unit_price=Decimal('2.00'))
+        adjust_stock(self.insulin.pk, -5, 'consume')
+        adjust_stock(gloves.pk, -7, 'consume')
+        self.refresh()
+
+        self.client.force_authenticate(User.objects.create_user(username='nurse', password='pw', hospital=mary))
+        consumption = self.client.get('/api/reports/consumption/', {'group_by': 'item'}).data['rows']
+        self.assertEqual([(r['sku'], r['consumed']) for r in consumption], [('INS-1', 5)])
+        self.assertEqual([(r['category'], r['consumed']) for r in self.client.get('/api/reports/consumption/').data['rows']], [('medicine', 5)])
+        self.assertEqual([(r['category'], r['units']) for r in self.client.get('/api/reports/valuation/').data['rows']], [('medicine', 45)])
+        self.assertEqual([r['supplier__name'] for r in self.client.get('/api/reports/supplier-spend/').data['rows']], ['MedSupply'])
+
+        self.client.force_authenticate(User.objects.create_user(username='outsider', password='pw', hospital=general))
+        self.assertEqual([r['sku'] for r in self.client.get('/api/reports/consumption/', {'group_by': 'item'}).data['rows']], ['GLV-1'])
+        self.assertEqual([(r['category'], r['units']) for r in self.client.get('/api/reports/valuation/').data['rows']], [('medicine', 23)])
+        self.assertEqual(self.client.get('/api/reports/supplier-spend/').data['rows'], [])
+
+        # The unattached tenant keeps its own gauze.
+        self.client.force_authenticate(self.user)
+        self.assertEqual([r['category'] for r in self.client.get('/api/reports/valuation/').data['rows']], ['consumable'])
+
+    def test_valuation_snapshot_and_date_validation(self):
+        self.refresh()
+        rows = self.client.get('/api/reports/valuation/').data['rows']
+        self.assertEqual([(r['category'], r['units'], r['valuation']) for r in rows], [('consumable', 100, '125.00'), ('medicine', 50, '625.00')])
+        self.assertEqual(self.client.get('/api/reports/valuation/', {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/consumption/', {'group_by': 'supplier'}).status_code, 400)
+
+
+class ForecastTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='pw')
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+        self.steady = InventoryItem.objects.create(name='Gloves', sku='GLV-1', category='consumable', unit='box', quantity=24)
+        self.sporadic = InventoryItem.objects.create(name='Antivenom', sku='ANT-1', category='medicine', unit='vial', quantity=50, maximum_stock=60)
+        self.idle = InventoryItem.objects.create(name='Splint', sku='SPL-1', category='equipment', unit='pcs', quantity=5)
+        InventoryItem.objects.update(created_at=timezone.now() - timedelta(days=60))
+
+    def consume(self, item, days_ago, quantity):
+        DailyItemMovement.objects.create(
+            item=item, category=item.category, date=self.today - timedelta(days=days_ago), transactions=1, consumed=quantity,
+        )
+
+    def test_forecasts_fold_incrementally_and_drive_the_endpoint(self):
+        for days_ago in range(2, 41):
+            self.consume(self.steady, days_ago, 4)
+            if days_ago % 5 == 0:
+                self.consume(self.sporadic, days_ago, 10)
+        self.assertEqual(refresh_forecasts(through=self.today - timedelta(days=2)), 3)
+
+        steady = ItemForecast.objects.get(item=self.steady)
+        self.assertEqual((steady.model, round(steady.daily_demand, 2), steady.reorder_point), ('smoothing', 4.0, 28))
+        sporadic = ItemForecast.objects.get(item=self.sporadic)
+        self.assertEqual(sporadic.model, 'croston')
+        self.assertAlmostEqual(sporadic.daily_demand, 0.95 * 10 / 5, places=2)
+        self.assertEqual(ItemForecast.objects.get(item=self.idle).model, 'none')
+
+        # Only the newly completed day is folded in, and the result matches a rebuild.
+        self.consume(self.steady, 1, 4)
+        self.assertEqual(refresh_forecasts(through=self.today - timedelta(days=1)), 3)
+        self.assertEqual(refresh_forecasts(through=self.today - timedelta(days=1)), 0)
+        incremental = list(ItemForecast.objects.order_by('item').values_list('since', 'level', 'error', 'reorder_point'))
+        rebuild_forecasts(through=self.today - timedelta(days=1))
+        rebuilt = list(ItemForecast.objects.order_by('item').values_list('since', 'level', 'error', 'reorder_point'))
+        for ours, theirs in zip(incremental, rebuilt):
+            self.assertEqual(ours[0], theirs[0])
+            self.assertAlmostEqual(ours[1], theirs[1])
+            self.assertAlmostEqual(ours[2], theirs[2])
+
+        response = self.client.get('/api/predictions/stock-forecast/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['as_of'], self.today - timedelta(days=1))
+        self.assertEqual(response.data['stockoutRisk'], 'high')
+        self.assertEqual([row['sku'] for row in response.data['items']], ['GLV-1'])
+        row = response.data['items'][0]
+        self.assertEqual((row['stockout_date'], row['order_quantity']), (self.today + timedelta(days=6), 84 - 24))
+        self.assertIn('Gloves runs out first', response.data['recommendation'])
+
+        row = self.client.get('/api/predictions/stock-forecast/', {'item': self.sporadic.pk}).data['items'][0]
+        self.assertEqual(row['order_quantity'], 10)
+        self.assertEqual(self.client.get('/api/predictions/stock-forecast/', {'limit': 'all'}).status_code, 400)
+
+        self.client.force_authenticate(User.objects.create_user(username='outsider', password='pw', hospital=Hospital.objects.create(name='General')))
+        response = self.client.get('/api/predictions/stock-forecast/')
+        self.assertEqual((response.data['items'], response.data['reorder_count']), ([], 0))
+
+    def test_days_still_being_rolled_up_are_not_folded(self):
+        self.assertEqual(complete_through(), self.today - timedelta(days=1))
+        adjust_stock(self.steady.pk, -1, 'consume')
+        StockTransaction.objects.update(performed_at=timezone.now() - timedelta(days=3))
+        self.assertEqual(complete_through(), self.today - timedelta(days=4))
+        refresh_rollups(settle=timedelta(0))
+        self.assertEqual(complete_through(), self.today - timedelta(days=1))
+
+
+class AssistantTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='nurse', password='pw')
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+        main, east = Warehouse.objects.bulk_create([Warehouse(name='Main Warehouse'), Warehouse(name='East Wing Storage')])
+        self.insulin = InventoryItem.objects.create(
+            name='Insulin', sku='INS-1', category='medicine', unit='vial', quantity=3, minimum_stock=10,
+            location=main, expiry_date=self.today + timedelta(days=5),
+        )
+        self.gauze = InventoryItem.objects.create(
+            name='Gauze', sku='GAU-1', category='consumable', unit='box', quantity=1, minimum_stock=20,
+            location=east, expiry_date=self.today + timedelta(days=3),
+        )
+        self.saline = InventoryItem.objects.create(
+            name='Saline', sku='SAL-1', category='medicine', unit='bag', quantity=80, minimum_stock=10,
+            location=main, expiry_date=self.today + timedelta(days=20),
+        )
+
+    def ask(self, question):
+        response = self.client.post('/api/ai/query/', {'question': question}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_questions_are_parsed_into_intents_and_parameters(self):
+        self.assertEqual(parse('Expiring in 7 days in Main Warehouse?', self.today), (
+            'expiring', {'start': self.today, 'end': self.today + timedelta(days=7), 'location': 'Main Warehouse'}, 10,
+        ))
+        intent, params, limit = parse('top 3 consumed medicines this week', self.today)
+        self.assertEqual((intent, params['start'], params['category'], limit), (
+            'top_consumed', self.today - timedelta(days=6), 'medicine', 3,
+        ))
+        self.assertEqual(parse('How many insulin do we have in Main Warehouse?', self.today)[1], {
+            'term': 'insulin', 'location': 'Main Warehouse',
+        })
+        # Other hospitals' warehouse names are not locations here.
+        hospital = Hospital.objects.create(name='St. Mary')
+        self.assertNotIn('location', parse('Expiring in 7 days in Main Warehouse?', self.today, hospital.pk)[1])
+        self.assertEqual(parse('hello there')[0], 'greeting')
+        self.assertIsNone(parse('what is the weather')[0])
+
+    def test_answers_come_from_live_data(self):
+        data = self.ask('Low stock items?')
+        self.assertEqual(data['intent'], 'low_stock')
+        self.assertEqual([row['sku'] for row in data['rows']], ['GAU-1', 'INS-1'])
+        self.assertEqual(data['answer'], '2 items are below minimum stock: Gauze (1 of 20), Insulin (3 of 10).')
+
+        data = self.ask('Expiring in 7 days in Main Warehouse')
+        self.assertEqual([row['sku'] for row in data['rows']], ['INS-1'])
+        self.assertIn('1 item in Main Warehouse expire by', data['answer'])
+        # The same shape with other values reuses the compiled plan.
+        self.assertEqual([row['sku'] for row in self.ask('expiring within 30 days in Main Warehouse')['rows']], ['INS-1', 'SAL-1'])
+
+        for days_ago, item, quantity in ((1, self.saline, 30), (2, self.gauze, 12), (10, self.insulin, 99)):
+            DailyItemMovement.objects.create(
+                item=item, category=item.category, date=self.today - timedelta(days=days_ago), transactions=1,
+                consumed=quantity, consumed_value=Decimal(quantity),
+            )
+        data = self.ask('Top consumed this week')
+        self.assertEqual([(row['item'], row['consumed']) for row in data['rows']], [(self.saline.pk, 30), (self.gauze.pk, 12)])
+        self.assertEqual(data['answer'], 'Most consumed in the last 7 days: Saline (30), Gauze (12).')
+
+        data = self.ask('What should I restock?')
+        self.assertEqual([(row['sku'], row['suggested']) for row in data['rows']], [('GAU-1', 39), ('INS-1', 17)])
+        self.assertIn('Saline: 80 bag in stock', self.ask('how much saline is left?')['answer'])
+        self.assertIn('low stock', self.ask('Hi!')['answer'])
+        self.assertEqual(self.client.post('/api/ai/query/', {'question': ' '}, format='json').status_code, 400)
+
+    def test_answers_only_cover_the_users_hospital(self):
+        mary, general = Hospital.objects.create(name='St. Mary'), Hospital.objects.create(name='General')
+        InventoryItem.objects.filter(pk=self.gauze.pk).update(hospital=mary)
+        for username, hospital, expected in (('mary', mary, ['GAU-1']), ('general', general, []), ('nurse', None, ['INS-1'])):
+            self.client.force_authenticate(User.objects.get_or_create(username=username, defaults={'hospital': hospital})[0])
+            self.assertEqual([row['sku'] for row in self.ask('Low stock items?')['rows']], expected)
+            self.assertEqual([row['sku'] for row in self.ask('What should I restock?')['rows']], expected)
+
+    def test_slow_queries_are_cut_off(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Relies on the SQLite progress handler.')
+        with self.assertRaises(QueryTimeout), query_deadline(0), connection.cursor() as cursor:
+            cursor.execute(
+                'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10000000) SELECT count(*) FROM n'
+            )
+        self.assertEqual(self.ask('low stock')['intent'], 'low_stock')
@@ -1,3 +1,88 @@
-from django.shortcuts import render
+from datetime import timedelta
 
-# Create your views here.
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.tenancy import tenant_of
+from . import assistant, forecasting, services
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def inventory_summary(request):
+    # Built in the background by reports.tasks.build_inventory_summary; only the
+    # very first request after a cold cache pays for the aggregate.
+    return Response(services.inventory_summary(tenant_of(request.user)))
+
+
+def _date_range(request, days=30):
+    """``?start=``/``?end=`` as dates, defaulting to the last ``days`` days."""
+    bounds = {}
+    for name, default in (('end', timezone.localdate()), ('start', None)):
+        value = request.query_params.get(name)
+        try:
+            bounds[name] = parse_date(value) if value else default
+        except ValueError:
+            bounds[name] = None
+        if value and bounds[name] is None:
+            raise ValidationError({name: 'Expected a date (YYYY-MM-DD).'})
+    start = bounds['start'] or bounds['end'] - timedelta(days=days - 1)
+    if start > bounds['end']:
+        raise ValidationError({'start': 'Must not be after end.'})
+    return start, bounds['end']
+
+
+# The report endpoints below read only the rollup tables maintained by
+# reports.tasks.refresh_rollups, never the ledger itself.
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def consumption_report(request):
+    group_by = request.query_params.get('group_by', 'category')
+    if group_by not in ('category', 'item'):
+        raise ValidationError({'group_by': 'Expected category or item.'})
+    return Response(services.consumption_report(
+        *_date_range(request), group_by=group_by, category=request.query_params.get('category'),
+        hospital_id=tenant_of(request.user),
+    ))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def valuation_report(request):
+    return Response(services.valuation_report(*_date_range(request), hospital_id=tenant_of(request.user)))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def supplier_spend_report(request):
+    return Response(services.supplier_spend_report(*_date_range(request), hospital_id=tenant_of(request.user)))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def stock_forecast(request):
+    params = {}
+    for name, default in (('limit', 20), ('item', None)):
+        value = request.query_params.get(name)
+        try:
+            params[name] = int(value) if value else default
+        except ValueError:
+            raise ValidationError({name: 'Expected a whole number.'})
+    params['limit'] = min(max(params['limit'], 1), 500)
+    # Forecasts are folded forward by reports.tasks.refresh_forecasts; only
+    # stock on hand is read live.
+    return Response(forecasting.stock_forecast(**params, hospital_id=tenant_of(request.user)))
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def ai_query(request):
+    question = request.data.get('question', '')
+    if not isinstance(question, str) or not question.strip():
+        raise ValidationError({'question': 'Ask a question.'})
+    return Response(assistant.answer(question[:500], hospital_id=tenant_of(request.user)))
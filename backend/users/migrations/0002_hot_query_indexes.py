@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 10:29
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('hospital_name'), name='user_hospital_lower_idx'),
+        ),
+    ]
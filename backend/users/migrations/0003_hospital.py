@@ -0,0 +1,61 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+def attach_hospitals(apps, schema_editor):
+    # One hospital per distinct hospital_name, compared case-insensitively as the staff list did.
+    Hospital = apps.get_model('users', 'Hospital')
+    User = apps.get_model('users', 'User')
+    hospitals = {}
+    for pk, name in User.objects.exclude(hospital_name__isnull=True).order_by('pk').values_list('pk', 'hospital_name'):
+        name = name.strip()
+        if not name:
+            continue
+        if name.lower() not in hospitals:
+            hospitals[name.lower()] = Hospital.objects.create(name=name)
+        User.objects.filter(pk=pk).update(hospital=hospitals[name.lower()])
+
+
+def detach_hospitals(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for user in User.objects.filter(hospital__isnull=False).select_related('hospital'):
+        User.objects.filter(pk=user.pk).update(hospital_name=user.hospital.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hospital',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='hospital',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='hospital_name_lower_uniq'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='hospital',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='staff', to='users.hospital'),
+        ),
+        migrations.RunPython(attach_hospitals, detach_hospitals),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_hospital_lower_idx',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='hospital_name',
+        ),
+    ]
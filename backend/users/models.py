@@ -1,5 +1,32 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
+
+
+class HospitalManager(models.Manager):
+    def for_name(self, name):
+        """The hospital called ``name``, matched case-insensitively, created if there is none."""
+        name = name.strip()
+        # Looked up on lower(name) so hospital_name_lower_uniq serves it.
+        hospital = self.alias(key=Lower('name')).filter(key=name.lower()).first()
+        return hospital or self.create(name=name)
+
+
+class Hospital(models.Model):
+    """A tenant. Users, and the stock, suppliers, orders and alerts they work with, belong to one."""
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = HospitalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='hospital_name_lower_uniq'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -9,7 +36,7 @@ class User(AbstractUser):
         ('staff', 'Hospital Staff'),
     ]
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='staff')
-    hospital_name = models.CharField(max_length=255, blank=True, null=True)
+    hospital = models.ForeignKey(Hospital, on_delete=models.PROTECT, blank=True, null=True, related_name='staff')
     email_verified = models.BooleanField(default=False)
 
     def __str__(self):
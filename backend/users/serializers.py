@@ -1,7 +1,10 @@
 from rest_framework import serializers
-from .models import User
+from .models import Hospital, User
 
 class UserSerializer(serializers.ModelSerializer):
+    # The hospital is the user's tenant, so it is set at registration and never by the user afterwards.
+    hospital_name = serializers.CharField(source='hospital.name', read_only=True, default=None)
+
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'role', 'hospital_name', 'first_name', 'last_name')
@@ -9,17 +12,19 @@ class UserSerializer(serializers.ModelSerializer):
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
+    hospital_name = serializers.CharField(max_length=255, required=False, allow_blank=True, write_only=True)
 
     class Meta:
         model = User
         fields = ('username', 'password', 'email', 'role', 'hospital_name')
 
     def create(self, validated_data):
+        hospital_name = validated_data.get('hospital_name', '').strip()
         user = User.objects.create_user(
             username=validated_data['username'],
             password=validated_data['password'],
             email=validated_data.get('email', ''),
             role=validated_data.get('role', 'staff'),
-            hospital_name=validated_data.get('hospital_name', '')
+            hospital=Hospital.objects.for_name(hospital_name) if hospital_name else None,
         )
         return user
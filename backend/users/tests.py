@@ -1,3 +1,39 @@
-from django.test import TestCase
+import itertools
 
-# Create your tests here.
+from rest_framework.test import APITestCase
+
+from core.testing import QueryBudgetMixin
+from .models import Hospital, User
+
+
+class StaffListTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.hospital = Hospital.objects.create(name='St. Mary')
+        self.user = User.objects.create_user(username='head', password='pw', hospital=self.hospital)
+        self.client.force_authenticate(self.user)
+        self.counter = itertools.count()
+
+    def seed_staff(self, n):
+        for _ in range(n):
+            User.objects.create_user(username=f'staff{next(self.counter)}', password='pw', hospital=self.hospital)
+
+    def test_staff_list_shows_own_hospital(self):
+        User.objects.create_user(username='other', password='pw', hospital=Hospital.objects.create(name='General'))
+        self.seed_staff(2)
+        response = self.client.get('/api/staff-list/')
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual({row['hospital_name'] for row in response.data}, {'St. Mary'})
+
+    def test_registration_matches_hospitals_case_insensitively(self):
+        response = self.client.post('/api/register/', {'username': 'nurse', 'password': 'pw', 'hospital_name': ' st. mary '})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(User.objects.get(username='nurse').hospital, self.hospital)
+        self.assertEqual(Hospital.objects.count(), 1)
+
+    def test_users_cannot_change_their_hospital(self):
+        self.client.patch('/api/profile/', {'hospital_name': 'General'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.hospital, self.hospital)
+
+    def test_staff_list_query_budget(self):
+        self.assertConstantQueries('/api/staff-list/', self.seed_staff)
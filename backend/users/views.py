@@ -20,16 +20,9 @@ class StaffListView(generics.ListAPIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        user = self.request.user
-        h_name = getattr(user, 'hospital_name', None)
-        print(f"DEBUG: StaffListView called by {user.username} for hospital: {h_name}")
-        
-        if not h_name:
-            print("DEBUG: No hospital_name, returning empty queryset")
+        hospital_id = self.request.user.hospital_id
+        if hospital_id is None:
             return User.objects.none()
-            
-        queryset = User.objects.filter(hospital_name__iexact=h_name)
-        print(f"DEBUG: Found {queryset.count()} users in hospital '{h_name}'")
-        for u in queryset:
-            print(f"DEBUG:   - {u.username} ({u.email})")
-        return queryset
+        return User.objects.filter(hospital_id=hospital_id).select_related('hospital').only(
+            *(field for field in UserSerializer.Meta.fields if field != 'hospital_name'), 'hospital__name',
+        )
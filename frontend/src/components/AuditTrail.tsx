@@ -3,6 +3,7 @@
 import { useEffect, useState } from 'react';
 import { History, User as UserIcon, Activity } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
+import { liveSocketUrl } from '@/lib/api';
 
 interface AuditLog {
     timestamp: string;
@@ -17,7 +18,7 @@ const AuditTrail = () => {
 
     useEffect(() => {
         // Establishing a WebSocket for the audit trail
-        const socket = new WebSocket('ws://127.0.0.1:8000/ws/live/');
+        const socket = new WebSocket(liveSocketUrl());
 
         socket.onmessage = (event) => {
             const data = JSON.parse(event.data);
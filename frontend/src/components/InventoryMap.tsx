@@ -3,17 +3,20 @@
 import { useState, useEffect } from 'react';
 import { ComposableMap, Geographies, Geography, Marker } from 'react-simple-maps';
 import { Map as MapIcon, Globe } from 'lucide-react';
-import api from '@/lib/api';
+import api, { liveSocketUrl } from '@/lib/api';
 
 const geoUrl = "https://cdn.jsdelivr.net/npm/world-atlas@2/countries-110m.json";
 
 interface Warehouse {
     id: number;
     name: string;
-    lat: number;
-    lng: number;
+    lat: number | null;
+    lng: number | null;
     stockLevel: number;
     status: string;
+    items: number;
+    units: number;
+    criticalItems: number;
 }
 
 const InventoryMap = () => {
@@ -29,9 +32,49 @@ const InventoryMap = () => {
             }
         };
 
+        // Load the totals, then apply the changes the server pushes. Changes sent
+        // while the socket was down are lost, so every reconnect reloads them.
+        let socket: WebSocket | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let attempts = 0;
+        let closed = false;
+
+        const connect = () => {
+            socket = new WebSocket(liveSocketUrl());
+            socket.onopen = () => {
+                socket?.send(JSON.stringify({ action: 'watch_warehouses' }));
+                if (attempts > 0) fetchLocations();
+                attempts = 0;
+            };
+            socket.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                if (data.type === 'WAREHOUSE_STATS') {
+                    setWarehouses(prev => {
+                        const changed = new Map<number, Warehouse>(data.warehouses.map((w: Warehouse) => [w.id, w]));
+                        const known = new Set(prev.map(w => w.id));
+                        return [
+                            ...prev.map(w => changed.get(w.id) ?? w),
+                            ...data.warehouses.filter((w: Warehouse) => !known.has(w.id)),
+                        ];
+                    });
+                }
+            };
+            socket.onclose = () => {
+                if (closed) return;
+                // Exponential backoff with jitter, capped at 30 seconds.
+                const delay = Math.min(30000, 1000 * 2 ** attempts) * (0.5 + Math.random() / 2);
+                attempts += 1;
+                retryTimer = setTimeout(connect, delay);
+            };
+        };
+
         fetchLocations();
-        const interval = setInterval(fetchLocations, 10000);
-        return () => clearInterval(interval);
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            socket?.close();
+        };
     }, []);
 
     return (
@@ -62,8 +105,8 @@ const InventoryMap = () => {
                             ))
                         }
                     </Geographies>
-                    {warehouses.map((warehouse) => (
-                        <Marker key={warehouse.id} coordinates={[warehouse.lng, warehouse.lat]}>
+                    {warehouses.filter((warehouse) => warehouse.lat !== null && warehouse.lng !== null).map((warehouse) => (
+                        <Marker key={warehouse.id} coordinates={[warehouse.lng as number, warehouse.lat as number]}>
                             <circle
                                 r={6}
                                 className={warehouse.status === 'critical' ? 'fill-rose-500 animate-pulse' : 'fill-emerald-500'}
@@ -3,6 +3,7 @@
 import { useEffect, useState } from 'react';
 import { Bell, ShieldAlert } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
+import { alertStreamUrl } from '@/lib/api';
 
 interface Alert {
     id: number;
@@ -14,11 +15,11 @@ interface Alert {
 
 const LiveAlerts = () => {
     const [alerts, setAlerts] = useState<Alert[]>([]);
+    const [missed, setMissed] = useState(false);
 
     useEffect(() => {
         // Subscribe to alert events
-        const baseURL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api';
-        const eventSource = new EventSource(`${baseURL}/alerts/stream/`);
+        const eventSource = new EventSource(alertStreamUrl());
 
         eventSource.onmessage = (event) => {
             const alert = JSON.parse(event.data);
@@ -32,6 +33,9 @@ const LiveAlerts = () => {
             }
         };
 
+        // Sent when more alerts were raised while disconnected than the server replays.
+        eventSource.addEventListener('truncated', () => setMissed(true));
+
         return () => eventSource.close();
     }, []);
 
@@ -47,6 +51,9 @@ const LiveAlerts = () => {
                     <span className="relative inline-flex rounded-full h-3 w-3 bg-rose-500"></span>
                 </span>
             </div>
+            {missed && (
+                <p className="text-xs text-amber-600 mb-3">Some alerts raised while you were offline are not shown.</p>
+            )}
             <div className="space-y-3">
                 <AnimatePresence>
                     {alerts.map((alert) => (
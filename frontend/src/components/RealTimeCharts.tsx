@@ -9,8 +9,7 @@ const RealTimeCharts = () => {
     const [data, setData] = useState<any[]>([]);
 
     useEffect(() => {
-        // Polling mock analytics since WebSocket for this needs extra backend work
-        // In a production app, we would use a WebSocket here
+        // Each poll returns event counts over the last minute; hourly totals come back under `windows`.
         const interval = setInterval(async () => {
             try {
                 const response = await api.get('metrics/live/');
@@ -53,4 +53,15 @@ api.interceptors.response.use(
     }
 );
 
+// WebSocket handshakes cannot carry an Authorization header, so the access token rides in the query string.
+export const liveSocketUrl = () => {
+    const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null;
+    return `ws://127.0.0.1:8000/ws/live/${token ? `?token=${encodeURIComponent(token)}` : ''}`;
+};
+
+export const alertStreamUrl = () => {
+    const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null;
+    return `${api.defaults.baseURL}/alerts/stream/${token ? `?token=${encodeURIComponent(token)}` : ''}`;
+};
+
 export default api;